@@ -1,8 +1,12 @@
 # isort: skip_file
 # Needs to be first to set up django environment
 from .helpers import *
+import base64
+import gzip
+import json
 from datetime import timedelta
 from typing import List, Tuple
+import lzstring
 from ee.clickhouse.materialized_columns.analyze import (
     backfill_materialized_columns,
     get_materialized_columns,
@@ -23,6 +27,10 @@ from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.filter import Filter
 from posthog.models.property import PropertyName, TableWithProperties
 from posthog.constants import FunnelCorrelationType
+from posthog.client import _prepare_query, _strip_comments_cached, ch_client
+from posthog.models.cohort.util import format_filter_query
+from posthog.models.entity import Entity
+from posthog.utils import decompress
 
 MATERIALIZED_PROPERTIES: List[Tuple[TableWithProperties, PropertyName]] = [
     ("events", "$host"),
@@ -659,3 +667,195 @@ class QuerySuite:
             )
             cohort.calculate_people_ch(pending_version=0)
         self.cohort = cohort
+
+
+# Long enough IN-lists to make query preparation show up in profiles
+EMAILS = [f"user{index}@posthog.com" for index in range(10_000)]
+HOSTS = [f"app{index}.posthog.com" for index in range(1_000)]
+
+
+class PrepareQuerySuite:
+    """
+    Python-side cost of preparing (rendering and stripping comments from) some of the largest queries we generate.
+    Doesn't send anything to clickhouse.
+    """
+
+    version = "v001"
+
+    def setup(self):
+        # :TRICKY: Data in benchmark servers has ID=2
+        team = Team.objects.filter(id=2).first()
+        if team is None:
+            organization = Organization.objects.create()
+            team = Team.objects.create(id=2, organization=organization, name="The Bakery")
+
+        properties = [
+            {"key": "email", "operator": "exact", "value": EMAILS, "type": "person"},
+            {"key": "$host", "operator": "is_not", "value": HOSTS},
+        ]
+
+        funnel_filter = Filter(
+            data={
+                "insight": "FUNNELS",
+                "events": [{"id": f"step {index}", "order": index, "properties": properties} for index in range(5)],
+                **DATE_RANGE,
+            },
+            team=team,
+        )
+        funnel = ClickhouseFunnel(funnel_filter, team)
+        self.funnel_query = (funnel.get_query(), funnel.params)
+
+        trends_filter = Filter(data={"events": [{"id": "$pageview"}], "properties": properties, **DATE_RANGE})
+        trends_sql, trends_params, _ = Trends()._get_sql_for_entity(
+            trends_filter, team, Entity({"id": "$pageview", "type": "events"})
+        )
+        self.trends_query = (trends_sql, trends_params)
+
+        cohort = Cohort(team=team, name="benchmarking large cohort", groups=[{"properties": properties}])
+        self.cohort_query = format_filter_query(cohort)
+
+    def time_prepare_funnel_query(self):
+        _prepare_query(ch_client, *self.funnel_query)
+
+    def time_prepare_trends_query(self):
+        _prepare_query(ch_client, *self.trends_query)
+
+    def time_prepare_cohort_query(self):
+        _prepare_query(ch_client, *self.cohort_query)
+
+    def time_prepare_funnel_query_uncached(self):
+        _strip_comments_cached.cache_clear()
+        _prepare_query(ch_client, *self.funnel_query)
+
+
+class FilterSuite:
+    """
+    Python-side cost of creating, simplifying and serializing a complex funnel filter, which happens for every
+    insight request and cache key calculation. Doesn't send anything to clickhouse.
+    """
+
+    version = "v001"
+
+    def setup(self):
+        # :TRICKY: Data in benchmark servers has ID=2
+        team = Team.objects.filter(id=2).first()
+        if team is None:
+            organization = Organization.objects.create()
+            team = Team.objects.create(id=2, organization=organization, name="The Bakery")
+        self.team = team
+
+        properties = [
+            {"key": "email", "operator": "icontains", "value": ".com", "type": "person"},
+            {"key": "$browser", "operator": "exact", "value": ["Chrome", "Safari", "Firefox"]},
+        ]
+        self.funnel_data = {
+            "insight": "FUNNELS",
+            "events": [{"id": f"step {index}", "order": index, "properties": properties} for index in range(5)],
+            "exclusions": [{"id": "exclusion", "type": "events", "funnel_from_step": 0, "funnel_to_step": 4}],
+            "breakdown": "$browser",
+            "breakdown_type": "event",
+            "funnel_window_interval": 7,
+            "funnel_window_interval_unit": "day",
+            **DATE_RANGE,
+        }
+        self.filter = Filter(data=self.funnel_data, team=team)
+
+    def time_filter_construction(self):
+        Filter(data=self.funnel_data, team=self.team)
+
+    def time_filter_simplify(self):
+        Filter(data=self.funnel_data).simplify(self.team)
+
+    def time_filter_to_dict(self):
+        self.filter.to_dict()
+
+    def time_filter_to_json(self):
+        Filter(data=self.funnel_data, team=self.team).toJSON()
+
+
+def _js_event(index: int) -> dict:
+    return {
+        "event": "$autocapture" if index % 2 else "$pageview",
+        "properties": {
+            "$os": "Mac OS X",
+            "$browser": "Chrome",
+            "$device_type": "Desktop",
+            "$current_url": f"https://app.example.com/insights/{index}?insight=TRENDS&interval=day",
+            "$host": "app.example.com",
+            "$pathname": f"/insights/{index}",
+            "$browser_version": 104,
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "$lib": "web",
+            "$lib_version": "1.30.0",
+            "$insert_id": f"insert-{index}",
+            "$time": 1661430000.123 + index,
+            "distinct_id": "1829a6fb8a1b5d-0f2e3b4f5e6a7b-1c525635-1fa400-1829a6fb8a2d0f",
+            "$device_id": "1829a6fb8a1b5d-0f2e3b4f5e6a7b-1c525635-1fa400-1829a6fb8a2d0f",
+            "$referrer": "$direct",
+            "$referring_domain": "$direct",
+            "$active_feature_flags": ["flag-one", "flag-two"],
+            "$event_type": "click",
+            "$elements": [
+                {
+                    "tag_name": "button",
+                    "classes": ["btn", "btn-primary"],
+                    "attr__class": "btn btn-primary",
+                    "nth_child": 2,
+                }
+            ],
+            "token": "phc_benchmarktoken",
+            "$session_id": "1829a6fb8a3e1a-0b5a3c1d2e3f4a-1c525635-1fa400-1829a6fb8a4f2b",
+            "$window_id": "1829a6fb8a5a3c-0c6b4d2e3f4a5b-1c525635-1fa400-1829a6fb8a6b4d",
+        },
+        "timestamp": "2022-08-25T12:20:00.123Z",
+    }
+
+
+class CapturePayloadDecodingSuite:
+    """
+    Decoding payloads in the shapes posthog-js and posthog-python send them to /capture and /batch.
+    Doesn't need clickhouse or postgres.
+    """
+
+    version = "v001"
+
+    def setup(self):
+        js_batch = json.dumps([_js_event(index) for index in range(50)])
+        python_batch = json.dumps(
+            {
+                "api_key": "phc_benchmarktoken",
+                "batch": [
+                    {
+                        "event": "order completed",
+                        "distinct_id": f"user-{index}",
+                        "properties": {"$lib": "posthog-python", "$lib_version": "2.1.0", "revenue": 42.5, "items": 3},
+                        "timestamp": "2022-08-25T12:20:00.123456+00:00",
+                        "type": "capture",
+                        "library": "posthog-python",
+                    }
+                    for index in range(100)
+                ],
+            }
+        )
+
+        self.js_gzip = gzip.compress(js_batch.encode())
+        self.js_lz64 = lzstring.LZString().compressToBase64(js_batch)
+        self.js_base64 = base64.b64encode(json.dumps(_js_event(0)).encode()).decode()
+        self.python_json = python_batch.encode()
+        self.python_gzip = gzip.compress(self.python_json)
+
+    def time_posthog_js_gzip_batch(self):
+        decompress(self.js_gzip, "gzip-js")
+
+    def time_posthog_js_lz64_batch(self):
+        decompress(self.js_lz64, "lz64")
+
+    def time_posthog_js_base64_event(self):
+        decompress(self.js_base64, "")
+
+    def time_posthog_python_batch(self):
+        decompress(self.python_json, "")
+
+    def time_posthog_python_gzip_batch(self):
+        decompress(self.python_gzip, "gzip")
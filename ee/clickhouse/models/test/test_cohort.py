@@ -9,7 +9,12 @@ from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
 from posthog.models.cohort import Cohort
 from posthog.models.cohort.sql import GET_COHORTPEOPLE_BY_COHORT_ID
-from posthog.models.cohort.util import format_filter_query, get_person_ids_by_cohort_id
+from posthog.models.cohort.util import (
+    cohort_lookup_scope,
+    format_filter_query,
+    get_cohort,
+    get_person_ids_by_cohort_id,
+)
 from posthog.models.filters import Filter
 from posthog.models.organization import Organization
 from posthog.models.person import Person
@@ -887,6 +892,56 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         results = self._get_cohortpeople(cohort1)
         self.assertEqual(len(results), 1)
 
+    def test_incremental_calculation_only_reevaluates_changed_persons(self):
+        with freeze_time("2022-01-01T11:00:00Z"):
+            p1 = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"$some_prop": "something"})
+            p2 = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"], properties={"$some_prop": "other"})
+            cohort1 = Cohort.objects.create(
+                team=self.team,
+                groups=[{"properties": [{"key": "$some_prop", "value": "something", "type": "person"}]}],
+                name="cohort1",
+            )
+
+        with freeze_time("2022-01-01T12:00:00Z"):
+            cohort1.calculate_people_ch(pending_version=0)
+        self.assertEqual([r[0] for r in self._get_cohortpeople(cohort1)], [p1.uuid])
+        self.assertEqual(cohort1.last_full_calculation, datetime(2022, 1, 1, 12, tzinfo=timezone.utc))
+        self.assertEqual(cohort1.calculation_watermark, datetime(2022, 1, 1, 11, 50, tzinfo=timezone.utc))
+
+        # Ingested before the watermark, so not picked up until the next full calculation
+        with freeze_time("2022-01-01T11:00:00Z"):
+            p3 = Person.objects.create(team_id=self.team.pk, distinct_ids=["3"], properties={"$some_prop": "something"})
+
+        with freeze_time("2022-01-01T13:00:00Z"):
+            p1.delete()
+            p2.properties = {"$some_prop": "something"}
+            p2.version = 1
+            p2.save()
+
+        with freeze_time("2022-01-01T13:15:00Z"):
+            self.assertTrue(cohort1.can_calculate_incrementally)
+            cohort1.calculate_people_ch(pending_version=1, incremental=True)
+        self.assertEqual([r[0] for r in self._get_cohortpeople(cohort1)], [p2.uuid])
+        self.assertEqual(cohort1.last_full_calculation, datetime(2022, 1, 1, 12, tzinfo=timezone.utc))
+        self.assertEqual(cohort1.calculation_watermark, datetime(2022, 1, 1, 13, 5, tzinfo=timezone.utc))
+
+        with freeze_time("2022-01-02T13:15:00Z"):
+            self.assertFalse(cohort1.can_calculate_incrementally)
+            cohort1.calculate_people_ch(pending_version=2, incremental=True)
+        self.assertCountEqual([r[0] for r in self._get_cohortpeople(cohort1)], [p2.uuid, p3.uuid])
+        self.assertEqual(cohort1.last_full_calculation, datetime(2022, 1, 2, 13, 15, tzinfo=timezone.utc))
+
+    def test_incremental_calculation_of_behavioral_cohort_is_full(self):
+        cohort1 = Cohort.objects.create(
+            team=self.team,
+            groups=[{"action_id": _create_action(team=self.team, name="$pageview").pk, "days": 3}],
+            name="cohort1",
+            calculation_watermark=timezone.now(),
+            last_full_calculation=timezone.now(),
+        )
+
+        self.assertFalse(cohort1.can_calculate_incrementally)
+
     def test_cohort_versioning(self):
         Person.objects.create(
             team_id=self.team.pk, distinct_ids=["1"], properties={"$some_prop": "something"},
@@ -914,3 +969,31 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         # Should have p1 in this cohort even if version is different
         results = self._get_cohortpeople(cohort1)
         self.assertEqual(len(results), 1)
+
+    def test_nested_cohorts_are_loaded_once_per_scope(self):
+        cohort_c = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "$some_prop", "value": "something", "type": "person"}]}],
+        )
+        cohort_b = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "id", "value": cohort_c.pk, "type": "cohort"}]}],
+        )
+        cohort_a = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "id", "value": cohort_b.pk, "type": "cohort"}]}],
+        )
+        filter = Filter(data={"properties": [{"key": "id", "value": cohort_a.pk, "type": "cohort"}]}, team=self.team)
+        query_outside_scope, _ = parse_prop_grouped_clauses(team_id=self.team.pk, property_group=filter.property_groups)
+
+        with cohort_lookup_scope():
+            # One query per level of nesting
+            with self.assertNumQueries(3):
+                self.assertEqual(get_cohort(cohort_a.pk), cohort_a)
+            with self.assertNumQueries(0):
+                self.assertEqual(get_cohort(cohort_b.pk, team_id=self.team.pk), cohort_b)
+                self.assertEqual(get_cohort(str(cohort_c.pk), team_id=self.team.pk), cohort_c)
+            query, _ = parse_prop_grouped_clauses(team_id=self.team.pk, property_group=filter.property_groups)
+
+            other_team = Team.objects.create(organization=self.organization)
+            with self.assertRaises(Cohort.DoesNotExist):
+                get_cohort(cohort_c.pk, team_id=other_team.pk)
+
+        self.assertEqual(query, query_outside_scope)
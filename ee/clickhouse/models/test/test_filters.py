@@ -103,6 +103,27 @@ class TestFilters(PGTestFilters):
                 },
             )
 
+    def test_simplify_cohorts_with_test_account_filters(self):
+        self.team.test_account_filters = [
+            {"key": "email", "value": "@posthog.com", "operator": "not_icontains", "type": "person"}
+        ]
+        self.team.save()
+        cohort = Cohort.objects.create(
+            team=self.team,
+            groups=[{"properties": [{"key": "email", "operator": "icontains", "value": ".com", "type": "person"}]}],
+        )
+
+        filter = Filter(
+            data={"properties": [{"type": "cohort", "key": "id", "value": cohort.pk}], FILTER_TEST_ACCOUNTS: True},
+            team=self.team,
+        )
+
+        self.assertEqual(
+            [(prop.type, prop.key, prop.operator) for prop in filter.property_groups.flat],
+            [("person", "email", "not_icontains"), ("person", "email", "icontains")],
+        )
+        self.assertFalse(filter.filter_test_accounts)
+
     def test_simplify_static_cohort(self):
         cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
         filter = Filter(data={"properties": [{"type": "cohort", "key": "id", "value": cohort.pk}]})
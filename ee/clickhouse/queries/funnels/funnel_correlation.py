@@ -11,6 +11,7 @@ from typing import (
     cast,
 )
 
+import numpy as np
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.column_optimizer import EnterpriseColumnOptimizer
@@ -22,19 +23,31 @@ from posthog.models import Team
 from posthog.models.element.element import chain_to_elements
 from posthog.models.event.util import ElementSerializer
 from posthog.models.filters import Filter
+from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.property.util import get_property_string_expr
 from posthog.queries.funnels.utils import get_funnel_order_actor_class
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
 from posthog.queries.person_query import PersonQuery
 
 
+MAX_UINT64 = 2 ** 64 - 1
+# Standard normal quantile for 95% confidence intervals
+Z_95 = 1.959964
+
+
 class EventDefinition(TypedDict):
     event: str
     properties: Dict[str, Any]
     elements: list
 
 
-class EventOddsRatio(TypedDict):
+class OddsRatioConfidenceInterval(TypedDict, total=False):
+    # Only when sampling actors, see `FunnelCorrelation.sample_rate`
+    odds_ratio_lower_bound: float
+    odds_ratio_upper_bound: float
+
+
+class EventOddsRatio(OddsRatioConfidenceInterval):
     event: str
 
     success_count: int
@@ -44,7 +57,7 @@ class EventOddsRatio(TypedDict):
     correlation_type: Literal["success", "failure"]
 
 
-class EventOddsRatioSerialized(TypedDict):
+class EventOddsRatioSerialized(OddsRatioConfidenceInterval):
     event: EventDefinition
 
     success_count: int
@@ -57,7 +70,11 @@ class EventOddsRatioSerialized(TypedDict):
     correlation_type: Literal["success", "failure"]
 
 
-class FunnelCorrelationResponse(TypedDict):
+class SampledFunnelCorrelationResponse(TypedDict, total=False):
+    sample_rate: float
+
+
+class FunnelCorrelationResponse(SampledFunnelCorrelationResponse):
     """
     The structure that the diagnose response will be returned in.
     NOTE: TypedDict is used here to comply with existing formats from other
@@ -98,6 +115,8 @@ class FunnelCorrelation:
     MIN_PERSON_COUNT = 25
     MIN_PERSON_PERCENTAGE = 0.02
     PRIOR_COUNT = 1
+    # With `funnel_correlation_sample_rate=auto`, about this many actors are sampled from larger funnels
+    AUTO_SAMPLE_ACTOR_COUNT = 100_000
 
     def __init__(
         self,
@@ -147,9 +166,12 @@ class FunnelCorrelation:
             filter.aggregation_group_type_index
         ] if self.query_group_properties else []
 
+        self._funnel_actors_generator = self._get_funnel_actors_generator(filter)
+
+    def _get_funnel_actors_generator(self, filter: Filter, actor_sample_hash_bound: Optional[int] = None):
         funnel_order_actor_class = get_funnel_order_actor_class(filter)
 
-        self._funnel_actors_generator = funnel_order_actor_class(
+        return funnel_order_actor_class(
             filter,
             self._team,
             # NOTE: we want to include the latest timestamp of the `target_step`,
@@ -161,6 +183,7 @@ class FunnelCorrelation:
             include_preceding_timestamp=False,
             include_person_properties=self.query_person_properties,
             include_group_properties=self.include_funnel_group_properties,
+            actor_sample_hash_bound=actor_sample_hash_bound,
         )
 
     def support_autocapture_elements(self) -> bool:
@@ -171,6 +194,50 @@ class FunnelCorrelation:
             return True
         return False
 
+    @cached_property
+    def sample_rate(self) -> Optional[float]:
+        """
+        Share of funnel actors that correlations are computed over, `None` when they're computed over all of them.
+        """
+        sample_rate = self._filter.correlation_sample_rate
+        if sample_rate == "auto":
+            estimated_actor_count = self.estimate_actor_count()
+            sample_rate = self.AUTO_SAMPLE_ACTOR_COUNT / estimated_actor_count if estimated_actor_count else 1
+
+        if sample_rate is None or sample_rate >= 1:
+            return None
+        return sample_rate
+
+    def estimate_actor_count(self) -> int:
+        """
+        Roughly counts the actors who performed any of the funnel steps, at least as many as the funnel actors.
+        """
+        funnel_filter = self._funnel_actors_generator._filter
+        aggregation_target = (
+            "distinct_id"
+            if self._filter.aggregation_group_type_index is None
+            else f"$group_{self._filter.aggregation_group_type_index}"
+        )
+        date_from = funnel_filter.date_from
+        query = f"""
+            SELECT uniq({aggregation_target})
+            FROM events
+            WHERE team_id = %(team_id)s
+                AND event IN %(funnel_step_names)s
+                {"AND timestamp >= toDateTime(%(date_from)s)" if date_from else ""}
+                AND timestamp < toDateTime(%(date_to)s)
+        """
+        result = sync_execute(
+            query,
+            {
+                "team_id": self._team.pk,
+                "funnel_step_names": self._get_funnel_step_names(),
+                "date_from": date_from.strftime("%Y-%m-%d %H:%M:%S") if date_from else None,
+                "date_to": funnel_filter.date_to.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+        )
+        return result[0][0] if result else 0
+
     def get_contingency_table_query(self) -> Tuple[str, Dict[str, Any]]:
         """
         Returns a query string and params, which are used to generate the contingency table.
@@ -186,7 +253,7 @@ class FunnelCorrelation:
 
     def get_event_query(self) -> Tuple[str, Dict[str, Any]]:
 
-        funnel_persons_query, funnel_persons_params = self.get_funnel_actors_cte()
+        funnel_persons_query, funnel_persons_params = self.get_funnel_actors_cte(sample=True)
 
         event_join_query = self._get_events_join_query()
 
@@ -253,7 +320,7 @@ class FunnelCorrelation:
         if not self._filter.correlation_event_names:
             raise ValidationError("Event Property Correlation expects atleast one event name to run correlation on")
 
-        funnel_persons_query, funnel_persons_params = self.get_funnel_actors_cte()
+        funnel_persons_query, funnel_persons_params = self.get_funnel_actors_cte(sample=True)
 
         event_join_query = self._get_events_join_query()
 
@@ -333,7 +400,7 @@ class FunnelCorrelation:
         if not self._filter.correlation_property_names:
             raise ValidationError("Property Correlation expects atleast one Property to run correlation on")
 
-        funnel_actors_query, funnel_actors_params = self.get_funnel_actors_cte()
+        funnel_actors_query, funnel_actors_params = self.get_funnel_actors_cte(sample=True)
 
         person_prop_query, person_prop_params = self._get_properties_prop_clause()
 
@@ -467,8 +534,23 @@ class FunnelCorrelation:
 
                 -- Exclude funnel steps
                 AND event.event NOT IN funnel_step_names
+
+                {self._get_actor_sample_condition()}
         """
 
+    def _get_actor_sample_condition(self) -> str:
+        "Discards the events of actors left out of the sample before they're joined on `funnel_actors`"
+        if self.actor_sample_hash_bound is None:
+            return ""
+
+        if self._filter.aggregation_group_type_index is not None:
+            actor_id = f"events.$group_{self._filter.aggregation_group_type_index}"
+        elif self._team.actor_on_events_querying_enabled:
+            actor_id = "event.person_id"
+        else:
+            actor_id = "pdi.person_id"
+        return f"AND cityHash64(toString({actor_id})) <= %(actor_sample_hash_bound)s"
+
     def _get_aggregation_join_query(self):
         if self._team.actor_on_events_querying_enabled:
             return "", {}
@@ -633,11 +715,26 @@ class FunnelCorrelation:
         if success_total / failure_total > 10 or failure_total / success_total > 10:
             skewed_totals = True
 
-        odds_ratios = [
-            get_entity_odds_ratio(event_stats, FunnelCorrelation.PRIOR_COUNT)
+        significant_contingency_tables = [
+            event_stats
             for event_stats in event_contingency_tables
             if not FunnelCorrelation.are_results_insignificant(event_stats)
         ]
+        odds_ratios = [
+            get_entity_odds_ratio(event_stats, FunnelCorrelation.PRIOR_COUNT)
+            for event_stats in significant_contingency_tables
+        ]
+
+        if self.sample_rate:
+            # Odds ratios are as good as the sample they're computed from, so scale only the counts back up
+            confidence_intervals = get_odds_ratio_confidence_intervals(
+                significant_contingency_tables, FunnelCorrelation.PRIOR_COUNT
+            )
+            for odds_ratio, (lower_bound, upper_bound) in zip(odds_ratios, confidence_intervals):
+                odds_ratio["success_count"] = round(odds_ratio["success_count"] / self.sample_rate)
+                odds_ratio["failure_count"] = round(odds_ratio["failure_count"] / self.sample_rate)
+                odds_ratio["odds_ratio_lower_bound"] = float(lower_bound)
+                odds_ratio["odds_ratio_upper_bound"] = float(upper_bound)
 
         positively_correlated_events = sorted(
             [odds_ratio for odds_ratio in odds_ratios if odds_ratio["correlation_type"] == "success"],
@@ -755,10 +852,13 @@ class FunnelCorrelation:
 
     def format_results(self, results: Tuple[List[EventOddsRatio], bool]) -> FunnelCorrelationResponse:
         odds_ratios, skewed_totals = results
-        return {
+        response: FunnelCorrelationResponse = {
             "events": [self.serialize_event_odds_ratio(odds_ratio=odds_ratio) for odds_ratio in odds_ratios],
             "skewed": skewed_totals,
         }
+        if self.sample_rate:
+            response["sample_rate"] = self.sample_rate
+        return response
 
     def run(self) -> FunnelCorrelationResponse:
         if not self._filter.entities:
@@ -801,7 +901,18 @@ class FunnelCorrelation:
             failure_total,
         )
 
-    def get_funnel_actors_cte(self) -> Tuple[str, Dict[str, Any]]:
+    @property
+    def actor_sample_hash_bound(self) -> Optional[int]:
+        """
+        Actors are sampled by the hash of their id, so that all their events are kept or none are. The funnel and
+        correlation events queries discard the events of the actors left out before joining anything on them.
+        """
+        return int(self.sample_rate * MAX_UINT64) if self.sample_rate else None
+
+    def get_funnel_actors_cte(self, sample: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        With `sample`, only keeps the share of actors given by `sample_rate`, see `actor_sample_hash_bound`.
+        """
         extra_fields = ["steps", "final_timestamp", "first_timestamp"]
         if self.query_person_properties:
             extra_fields.append("person_properties")
@@ -809,7 +920,13 @@ class FunnelCorrelation:
             for group_index in self.include_funnel_group_properties:
                 extra_fields.append(f"group{group_index}_properties")
 
-        return self._funnel_actors_generator.actor_query(limit_actors=False, extra_fields=extra_fields)
+        funnel_actors_generator = self._funnel_actors_generator
+        if sample and self.actor_sample_hash_bound is not None:
+            funnel_actors_generator = self._get_funnel_actors_generator(
+                funnel_actors_generator._filter, self.actor_sample_hash_bound
+            )
+
+        return funnel_actors_generator.actor_query(limit_actors=False, extra_fields=extra_fields)
 
     @staticmethod
     def are_results_insignificant(event_contingency_table: EventContingencyTable) -> bool:
@@ -829,7 +946,7 @@ class FunnelCorrelation:
 
     def serialize_event_odds_ratio(self, odds_ratio: EventOddsRatio) -> EventOddsRatioSerialized:
         event_definition = self.serialize_event_with_property(event=odds_ratio["event"])
-        return {
+        serialized: EventOddsRatioSerialized = {
             "success_count": odds_ratio["success_count"],
             "success_people_url": self.construct_people_url(success=True, event_definition=event_definition),
             "failure_count": odds_ratio["failure_count"],
@@ -838,6 +955,10 @@ class FunnelCorrelation:
             "correlation_type": odds_ratio["correlation_type"],
             "event": event_definition,
         }
+        if "odds_ratio_lower_bound" in odds_ratio:
+            serialized["odds_ratio_lower_bound"] = odds_ratio["odds_ratio_lower_bound"]
+            serialized["odds_ratio_upper_bound"] = odds_ratio["odds_ratio_upper_bound"]
+        return serialized
 
     def serialize_event_with_property(self, event: str) -> EventDefinition:
         """
@@ -879,6 +1000,35 @@ def get_entity_odds_ratio(event_contingency_table: EventContingencyTable, prior_
     )
 
 
+def get_odds_ratio_confidence_intervals(
+    event_contingency_tables: List[EventContingencyTable], prior_counts: int
+) -> np.ndarray:
+    """
+    Returns the lower and upper bounds of the 95% confidence intervals of the odds ratios of `get_entity_odds_ratio`,
+    from the standard error of their logarithm. See https://en.wikipedia.org/wiki/Odds_ratio#Statistical_inference
+    """
+    # Columns of visited and not visited successes, then visited and not visited failures
+    counts = (
+        np.array(
+            [
+                [
+                    table.visited.success_count,
+                    table.success_total - table.visited.success_count,
+                    table.visited.failure_count,
+                    table.failure_total - table.visited.failure_count,
+                ]
+                for table in event_contingency_tables
+            ],
+            dtype=float,
+        ).reshape(-1, 4)
+        + prior_counts
+    )
+    log_counts = np.log(counts)
+    log_odds_ratios = log_counts[:, 0] + log_counts[:, 3] - log_counts[:, 1] - log_counts[:, 2]
+    standard_errors = np.sqrt((1 / counts).sum(axis=1))
+    return np.exp(log_odds_ratios[:, np.newaxis] + np.outer(standard_errors, [-Z_95, Z_95]))
+
+
 def build_selector(elements: List[Dict[str, Any]]) -> str:
     # build a CSS select given an "elements_chain"
     # NOTE: my source of what this should be doing is
@@ -1,8 +1,14 @@
+import math
 import unittest
 
 from rest_framework.exceptions import ValidationError
 
-from ee.clickhouse.queries.funnels.funnel_correlation import EventContingencyTable, EventStats, FunnelCorrelation
+from ee.clickhouse.queries.funnels.funnel_correlation import (
+    EventContingencyTable,
+    EventStats,
+    FunnelCorrelation,
+    get_odds_ratio_confidence_intervals,
+)
 from ee.clickhouse.queries.funnels.funnel_correlation_persons import FunnelCorrelationActors
 from posthog.constants import INSIGHT_FUNNELS
 from posthog.models.action import Action
@@ -1429,6 +1435,116 @@ class TestClickhouseFunnelCorrelation(ClickhouseTestMixin, APIBaseTest):
             6,
         )
 
+    def test_funnel_correlation_with_sampled_actors(self):
+        filters = {
+            "events": [
+                {"id": "user signed up", "type": "events", "order": 0},
+                {"id": "paid", "type": "events", "order": 1},
+            ],
+            "insight": INSIGHT_FUNNELS,
+            "date_from": "2020-01-01",
+            "date_to": "2020-01-14",
+            "funnel_correlation_type": "events",
+            "funnel_correlation_sample_rate": 0.5,
+        }
+
+        filter = Filter(data=filters)
+        correlation = FunnelCorrelation(filter, self.team)
+
+        for i in range(100):
+            _create_person(distinct_ids=[f"user_{i}"], team_id=self.team.pk)
+            _create_event(
+                team=self.team, event="user signed up", distinct_id=f"user_{i}", timestamp="2020-01-02T14:00:00Z",
+            )
+            if i < 50:
+                _create_event(
+                    team=self.team,
+                    event="positively_related",
+                    distinct_id=f"user_{i}",
+                    timestamp="2020-01-03T14:00:00Z",
+                )
+                _create_event(
+                    team=self.team, event="paid", distinct_id=f"user_{i}", timestamp="2020-01-04T14:00:00Z",
+                )
+
+        result = correlation.run()
+
+        self.assertEqual(result["sample_rate"], 0.5)
+        self.assertEqual(len(result["events"]), 1)
+        event = result["events"][0]
+        self.assertEqual(event["event"]["event"], "positively_related")
+        self.assertEqual(event["correlation_type"], "success")
+        self.assertEqual(event["failure_count"], 0)
+        # Only about half the actors are sampled, then counted twice
+        self.assertEqual(event["success_count"] % 2, 0)
+        self.assertAlmostEqual(event["success_count"], 50, delta=30)
+        self.assertLess(event["odds_ratio_lower_bound"], event["odds_ratio"])
+        self.assertGreater(event["odds_ratio_upper_bound"], event["odds_ratio"])
+        self.assertGreater(event["odds_ratio_lower_bound"], 1)
+
+        # Without sampling, counts are exact and there are no confidence intervals
+        result = FunnelCorrelation(filter.with_data({"funnel_correlation_sample_rate": 1}), self.team).run()
+        self.assertNotIn("sample_rate", result)
+        self.assertEqual(result["events"][0]["success_count"], 50)
+        self.assertNotIn("odds_ratio_lower_bound", result["events"][0])
+
+    def test_funnel_correlation_samples_actors_when_scanning_events(self):
+        filter = Filter(
+            data={
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-14",
+                "funnel_correlation_type": "events",
+                "funnel_correlation_sample_rate": 0.5,
+            }
+        )
+
+        query, params = FunnelCorrelation(filter, self.team).get_contingency_table_query()
+
+        # Both the funnel steps and the correlated events are filtered by the sample, not the actors they produce
+        self.assertEqual(query.count("cityHash64(toString(pdi.person_id)) <= %(actor_sample_hash_bound)s"), 2)
+        self.assertEqual(params["actor_sample_hash_bound"], int(0.5 * (2 ** 64 - 1)))
+
+    def test_funnel_correlation_auto_sample_rate(self):
+        filter = Filter(
+            data={
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-14",
+                "funnel_correlation_type": "events",
+                "funnel_correlation_sample_rate": "auto",
+            }
+        )
+        for i in range(4):
+            _create_person(distinct_ids=[f"user_{i}"], team_id=self.team.pk)
+            _create_event(
+                team=self.team, event="user signed up", distinct_id=f"user_{i}", timestamp="2020-01-02T14:00:00Z",
+            )
+        flush_persons_and_events()
+
+        self.assertEqual(FunnelCorrelation(filter, self.team).estimate_actor_count(), 4)
+        self.assertIsNone(FunnelCorrelation(filter, self.team).sample_rate)
+
+        FunnelCorrelation.AUTO_SAMPLE_ACTOR_COUNT = 2
+        try:
+            self.assertEqual(FunnelCorrelation(filter, self.team).sample_rate, 0.5)
+        finally:
+            FunnelCorrelation.AUTO_SAMPLE_ACTOR_COUNT = 100_000
+
+    def test_funnel_correlation_invalid_sample_rate(self):
+        filter = Filter(data={"insight": INSIGHT_FUNNELS, "funnel_correlation_sample_rate": 2})
+
+        with self.assertRaises(ValidationError):
+            filter.correlation_sample_rate
+
 
 class TestCorrelationFunctions(unittest.TestCase):
     def test_are_results_insignificant(self):
@@ -1519,3 +1635,23 @@ class TestCorrelationFunctions(unittest.TestCase):
             if not FunnelCorrelation.are_results_insignificant(contingency_table)
         ]
         self.assertEqual(len(result), 0)
+
+    def test_odds_ratio_confidence_intervals(self):
+        contingency_tables = [
+            EventContingencyTable(
+                event="event1", visited=EventStats(success_count=5, failure_count=0), success_total=5, failure_total=5,
+            ),
+            EventContingencyTable(
+                event="event2", visited=EventStats(success_count=3, failure_count=3), success_total=5, failure_total=5,
+            ),
+        ]
+
+        intervals = get_odds_ratio_confidence_intervals(contingency_tables, prior_counts=1)
+
+        # log odds ratio of log(6 * 6 / (1 * 1)) give or take 1.96 standard errors of sqrt(1/6 + 1 + 1 + 1/6)
+        standard_error = math.sqrt(1 / 6 + 1 + 1 + 1 / 6)
+        self.assertAlmostEqual(intervals[0][0], math.exp(math.log(36) - 1.959964 * standard_error))
+        self.assertAlmostEqual(intervals[0][1], math.exp(math.log(36) + 1.959964 * standard_error))
+        # Same odds either way, so the interval is centered on an odds ratio of 1
+        self.assertAlmostEqual(intervals[1][0] * intervals[1][1], 1)
+        self.assertEqual(get_odds_ratio_confidence_intervals([], prior_counts=1).shape, (0, 2))
@@ -1,19 +1,36 @@
 import datetime
-from unittest.mock import patch
+import threading
+from unittest.mock import call, patch
+from uuid import UUID
 
 import fakeredis
+import sqlparse
 from clickhouse_driver.errors import ServerException
 from django.test import TestCase
 from freezegun import freeze_time
 
 from posthog import client
-from posthog.client import CACHE_TTL, _deserialize, _key_hash, cache_sync_execute, sync_execute
+from posthog.client import (
+    CACHE_TTL,
+    _deserialize,
+    _key_hash,
+    _prepare_query,
+    _serialize,
+    cache_sync_execute,
+    ch_client,
+    local_result_cache,
+    stream_execute,
+    stream_query_with_columns,
+    strip_comments,
+    sync_execute,
+)
 from posthog.test.base import ClickhouseTestMixin
 
 
 class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
     def setUp(self):
         self.redis_client = fakeredis.FakeStrictRedis()
+        local_result_cache.clear()
 
     def test_caching_client(self):
         ts_start = datetime.datetime.now()
@@ -48,6 +65,95 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
             exists = self.redis_client.exists(_key_hash(query, args=args))
             self.assertFalse(exists)
 
+    def test_cache_serialization_preserves_types(self):
+        result = [
+            (datetime.datetime(2022, 1, 1, 12, tzinfo=datetime.timezone.utc), UUID(int=1), "foo", 1.5, [1, 2]),
+            (datetime.date(2022, 1, 2), UUID(int=2), None, 0, []),
+        ]
+        self.assertEqual(_deserialize(_serialize(result)), result)
+        # large results are compressed
+        self.assertEqual(_deserialize(_serialize(result * 1000)), result * 1000)
+
+    def test_cache_reads_legacy_json_results(self):
+        self.assertEqual(_deserialize(b'[[1, "a"], [2, "b"]]'), [(1, "a"), (2, "b")])
+
+    def test_caching_client_round_trips_results(self):
+        result = [(datetime.datetime(2022, 1, 1, 12, tzinfo=datetime.timezone.utc), UUID(int=1), "foo")] * 1000
+
+        with patch("posthog.client.sync_execute", return_value=result) as sync_execute_mock:
+            self.assertEqual(cache_sync_execute("select 1", redis_client=self.redis_client), result)
+            # from the local cache
+            self.assertEqual(cache_sync_execute("select 1", redis_client=self.redis_client), result)
+            # from redis
+            local_result_cache.clear()
+            self.assertEqual(cache_sync_execute("select 1", redis_client=self.redis_client), result)
+
+        sync_execute_mock.assert_called_once()
+
+    @patch("posthog.client.sync_execute", return_value=[(1,)])
+    def test_caching_client_uses_local_cache_before_redis(self, sync_execute_mock):
+        cache_sync_execute("select 1", redis_client=self.redis_client)
+
+        with patch.object(self.redis_client, "get") as redis_get:
+            res = cache_sync_execute("select 1", redis_client=self.redis_client)
+
+        self.assertEqual(res, [(1,)])
+        redis_get.assert_not_called()
+        sync_execute_mock.assert_called_once()
+
+    @patch("posthog.client.CACHE_WAIT_INTERVAL", 0.01)
+    @patch("posthog.client.sync_execute", return_value=[(2,)])
+    def test_caching_client_waits_for_query_already_running(self, sync_execute_mock):
+        key = _key_hash("select 1", args=None)
+        # another worker is running the query
+        self.redis_client.set(key + b":lock", b"1")
+        threading.Timer(0.05, lambda: self.redis_client.set(key, _serialize([(1,)]))).start()
+
+        res = cache_sync_execute("select 1", redis_client=self.redis_client)
+
+        self.assertEqual(res, [(1,)])
+        sync_execute_mock.assert_not_called()
+
+    @patch("posthog.client.CACHE_WAIT_INTERVAL", 0.01)
+    @patch("posthog.client.incr")
+    @patch("posthog.client.sync_execute", return_value=[(2,)])
+    def test_caching_client_runs_query_if_other_worker_fails(self, sync_execute_mock, incr):
+        key = _key_hash("select 1", args=None)
+        self.redis_client.set(key + b":lock", b"1")
+        threading.Timer(0.05, lambda: self.redis_client.delete(key + b":lock")).start()
+
+        res = cache_sync_execute("select 1", redis_client=self.redis_client)
+
+        self.assertEqual(res, [(2,)])
+        sync_execute_mock.assert_called_once()
+        self.assertFalse(self.redis_client.exists(key + b":lock"))
+        self.assertNotIn(call("clickhouse_result_cache", tags={"result": "wait_timeout"}), incr.call_args_list)
+
+    @patch("posthog.client.CACHE_WAIT_INTERVAL", 0.01)
+    @patch("posthog.client.incr")
+    @patch("posthog.client.sync_execute", return_value=[(2,)])
+    def test_caching_client_runs_query_if_other_worker_times_out(self, sync_execute_mock, incr):
+        key = _key_hash("select 1", args=None)
+        self.redis_client.set(key + b":lock", b"1", ex=1)
+
+        res = cache_sync_execute("select 1", redis_client=self.redis_client, wait_timeout=0.05)
+
+        self.assertEqual(res, [(2,)])
+        incr.assert_any_call("clickhouse_result_cache", tags={"result": "wait_timeout"})
+
+    def test_caching_client_does_not_release_lock_taken_by_another_worker(self):
+        key = _key_hash("select 1", args=None)
+
+        def run_query(*args, **kwargs):
+            # Our lock expired while running the query, and another worker took it
+            self.redis_client.set(key + b":lock", b"other worker")
+            return [(1,)]
+
+        with patch("posthog.client.sync_execute", side_effect=run_query):
+            cache_sync_execute("select 1", redis_client=self.redis_client)
+
+        self.assertEqual(self.redis_client.get(key + b":lock"), b"other worker")
+
     def test_async_query_client(self):
         query = "SELECT 1+1"
         team_id = 2
@@ -160,3 +266,54 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
             # Make sure it still includes the "annotation" comment that includes
             # request routing information for debugging purposes
             self.assertIn("/* request:1 */", first_query)
+
+    def test_strip_comments_matches_sqlparse(self):
+        queries = [
+            "SELECT 1",
+            "SELECT 1   \n  FROM events  \n WHERE team_id = %(team_id)s  ",
+            "-- comment\nSELECT 1",
+            "SELECT 1 /* comment */ FROM events",
+            "SELECT 'multiline  \n string' FROM events",
+            "SELECT '#hashtag', '--dashes' FROM events",
+        ]
+        for query in queries:
+            self.assertEqual(strip_comments(query), sqlparse.format(query, strip_comments=True))
+
+    def test_prepare_query_strips_comments_before_substitution(self):
+        query = """
+            -- values can't be mistaken for comments
+            SELECT %(value)s -%(negative)s FROM events WHERE event = %(event)s
+        """
+        prepared_sql, prepared_args, _ = _prepare_query(
+            client=ch_client, query=query, args={"value": 1, "negative": -1, "event": "-- not a comment"}
+        )
+
+        self.assertIsNone(prepared_args)
+        self.assertNotIn("values can't be mistaken", prepared_sql)
+        self.assertIn("SELECT 1 --1 FROM events WHERE event = '-- not a comment'", prepared_sql)
+
+    def test_stream_execute(self):
+        rows = stream_execute("SELECT number FROM numbers(25)", block_size=10)
+
+        self.assertEqual(list(rows), [(number,) for number in range(25)])
+
+    def test_stream_execute_with_column_types(self):
+        rows = list(stream_execute("SELECT number FROM numbers(%(count)s)", {"count": 3}, with_column_types=True))
+
+        self.assertEqual(rows, [[("number", "UInt64")], (0,), (1,), (2,)])
+
+    def test_stream_query_with_columns(self):
+        rows = stream_query_with_columns(
+            "SELECT number, [number] AS numbers, 1 AS one FROM numbers(2)",
+            columns_to_remove=["one"],
+            columns_to_rename={"number": "n"},
+        )
+
+        self.assertEqual(list(rows), [{"n": 0, "numbers": "0"}, {"n": 1, "numbers": "1"}])
+
+    def test_stream_execute_closed_early_leaves_connection_usable(self):
+        rows = stream_execute("SELECT number FROM numbers(100000)", block_size=10)
+        self.assertEqual(next(rows), (0,))
+        rows.close()
+
+        self.assertEqual(sync_execute("SELECT 1"), [(1,)])
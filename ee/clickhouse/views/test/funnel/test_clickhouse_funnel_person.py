@@ -91,15 +91,16 @@ class TestFunnelPerson(ClickhouseTestMixin, APIBaseTest):
         people = j["results"][0]["people"]
         next = j["next"]
         self.assertEqual(100, len(people))
-        self.assertNotEqual(None, next)
+        self.assertIn("cursor=", next)
 
         response = self.client.get(next)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         j = response.json()
-        people = j["results"][0]["people"]
+        next_people = j["results"][0]["people"]
         next = j["next"]
-        self.assertEqual(10, len(people))
+        self.assertEqual(10, len(next_people))
         self.assertEqual(None, j["next"])
+        self.assertEqual(len({person["id"] for person in people + next_people}), 110)
 
     def test_breakdown_basic_pagination(self):
         cache.clear()
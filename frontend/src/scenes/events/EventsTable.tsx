@@ -454,7 +454,7 @@ export function EventsTable({
                                     placement="topRight"
                                     title={
                                         <>
-                                            Exporting by csv is limited to 3,500 events.
+                                            Exporting by csv is limited to 100,000 events.
                                             <br />
                                             To return more, please use{' '}
                                             <a href="https://posthog.com/docs/api/events">the API</a>. Do you want to
@@ -787,7 +787,7 @@ describe('eventsTableLogic', () => {
                 })
                 expect(triggerExport).toHaveBeenCalledWith({
                     export_context: {
-                        max_limit: 3500,
+                        max_limit: 100000,
                         path: `/api/projects/${MOCK_TEAM_ID}/events?properties=%5B%5D&orderBy=%5B%22-timestamp%22%5D`,
                     },
                     export_format: 'text/csv',
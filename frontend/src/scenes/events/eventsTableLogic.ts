@@ -295,7 +295,7 @@ export const eventsTableLogic = kea<eventsTableLogicType>({
                 export_format: ExporterFormat.CSV,
                 export_context: {
                     path: values.eventsUrl(),
-                    max_limit: 3500,
+                    max_limit: 100000,
                 },
             })
         },
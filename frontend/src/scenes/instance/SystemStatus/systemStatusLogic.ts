@@ -55,6 +55,7 @@ const EDITABLE_INSTANCE_SETTINGS = [
     'SLACK_APP_CLIENT_SECRET',
     'SLACK_APP_SIGNING_SECRET',
     'PARALLEL_DASHBOARD_ITEM_CACHE',
+    'PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM',
 ]
 
 export const systemStatusLogic = kea<systemStatusLogicType>({
@@ -1,3 +1,4 @@
+from itertools import islice
 from typing import Any, Dict, List, Optional, cast
 
 from dateutil.relativedelta import relativedelta
@@ -18,15 +19,15 @@ from posthog.api.shared import UserBasicSerializer
 from posthog.api.utils import get_target_entity
 from posthog.auth import JwtAuthentication, PersonalAPIKeyAuthentication, TemporaryTokenAuthentication
 from posthog.client import sync_execute
-from posthog.constants import TREND_FILTER_TYPE_EVENTS
+from posthog.constants import CSV_EXPORT_LIMIT, TREND_FILTER_TYPE_EVENTS
 from posthog.event_usage import report_user_action
-from posthog.models import Action, ActionStep, Filter, Person
+from posthog.models import Action, ActionStep, Filter
 from posthog.models.action.util import format_action_filter
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
+from posthog.queries.actor_base_query import SerializedPerson
 from posthog.queries.trends.person import TrendsActors
 
 from .forbid_destroy_model import ForbidDestroyModel
-from .person import get_person_name
 from .tagged_item import TaggedItemSerializerMixin, TaggedItemViewSetMixin
 
 
@@ -190,6 +191,27 @@ class ActionViewSet(TaggedItemViewSetMixin, StructuredViewSetMixin, ForbidDestro
         filter = Filter(request=request, team=self.team)
         entity = get_target_entity(filter)
 
+        if request.accepted_renderer.format == "csv":
+            # Up to CSV_EXPORT_LIMIT actors rather than a page of them, as for person exports. They're loaded a batch
+            # at a time, and the rest of the result isn't read. The renderer needs all the rows for the CSV header.
+            content = []
+            actors_stream = TrendsActors(team, entity, filter).stream_serialized_actors()
+            for actor in islice(actors_stream, CSV_EXPORT_LIMIT):
+                if actor["type"] != "person":
+                    continue
+                person = cast(SerializedPerson, actor)
+                content.append(
+                    {
+                        "Name": person["name"],
+                        "Distinct ID": person["distinct_ids"][0] if person["distinct_ids"] else "",
+                        "Internal ID": str(person["uuid"]),
+                        "Email": person["properties"].get("email"),
+                        "Properties": person["properties"],
+                    }
+                )
+            actors_stream.close()
+            return Response(content)
+
         actors, serialized_actors = TrendsActors(team, entity, filter).get_actors()
 
         current_url = request.get_full_path()
@@ -206,20 +228,6 @@ class ActionViewSet(TaggedItemViewSetMixin, StructuredViewSetMixin, ForbidDestro
         else:
             next_url = None
 
-        if request.accepted_renderer.format == "csv":
-            content = [
-                {
-                    "Name": get_person_name(person),
-                    "Distinct ID": person.distinct_ids[0] if person.distinct_ids else "",
-                    "Internal ID": str(person.uuid),
-                    "Email": person.properties.get("email"),
-                    "Properties": person.properties,
-                }
-                for person in actors
-                if isinstance(person, Person)
-            ]
-            return Response(content)
-
         return Response(
             {
                 "results": [{"people": serialized_actors[0:100], "count": len(serialized_actors[0:100])}],
@@ -28,10 +28,10 @@ from posthog.helpers.session_recording import (
     get_session_recording_events_for_object_storage,
     preprocess_session_recording_events_for_clickhouse,
 )
-from posthog.kafka_client.client import KafkaProducer
+from posthog.kafka_client.client import KafkaProduceBatch, KafkaProducer
 from posthog.kafka_client.topics import KAFKA_DEAD_LETTER_QUEUE
 from posthog.logging.timing import timed
-from posthog.models.feature_flag import get_active_feature_flags
+from posthog.models.feature_flag import get_active_feature_flags_for_distinct_ids
 from posthog.models.utils import UUIDT
 from posthog.settings import (
     KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC,
@@ -82,13 +82,13 @@ def parse_kafka_recording_for_object_storage_event_data(
     return (headers, recording_event.recording_event_data_chunk)
 
 
-def log_event(data: Dict, event_name: str, partition_key: str) -> None:
+def log_event(data: Dict, event_name: str, partition_key: str, producer: Optional[KafkaProduceBatch] = None) -> None:
     if settings.DEBUG:
         print(f"Logging event {event_name} to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC}")
 
     # TODO: Handle Kafka being unavailable with exponential backoff retries
     try:
-        KafkaProducer().produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=partition_key)
+        (producer or KafkaProducer()).produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=partition_key)
         statsd.incr("posthog_cloud_plugin_server_ingestion")
     except Exception as e:
         statsd.incr("capture_endpoint_log_event_error")
@@ -96,11 +96,13 @@ def log_event(data: Dict, event_name: str, partition_key: str) -> None:
         raise e
 
 
-def log_session_recording_event(headers: List[Tuple[str, str]], data: str, partition_key: str) -> None:
+def log_session_recording_event(
+    headers: List[Tuple[str, str]], data: str, partition_key: str, producer: Optional[KafkaProduceBatch] = None
+) -> None:
     if settings.DEBUG:
         print(f"Logging recording event to Kafka topic {KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION_TOPIC}")
     try:
-        KafkaProducer().produce(
+        (producer or KafkaProducer()).produce(
             topic=KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION_TOPIC,
             headers=headers,
             data=data,
@@ -208,11 +210,26 @@ def get_distinct_id(data: Dict[str, Any]) -> str:
 
 
 def _ensure_web_feature_flags_in_properties(
-    event: Dict[str, Any], ingestion_context: EventIngestionContext, distinct_id: str
+    events: List[Tuple[Dict[str, Any], str]], ingestion_context: EventIngestionContext
 ):
-    """If the event comes from web, ensure that it contains property $active_feature_flags."""
-    if event["properties"].get("$lib") == "web" and "$active_feature_flags" not in event["properties"]:
-        flags = get_active_feature_flags(team_id=ingestion_context.team_id, distinct_id=distinct_id)
+    """
+    If an event comes from web, ensure that it contains property $active_feature_flags.
+
+    Flags are evaluated once for all distinct_ids in the batch rather than once per event.
+    """
+    events_missing_flags = [
+        (event, distinct_id)
+        for event, distinct_id in events
+        if event["properties"].get("$lib") == "web" and "$active_feature_flags" not in event["properties"]
+    ]
+    if not events_missing_flags:
+        return
+
+    flags_by_distinct_id = get_active_feature_flags_for_distinct_ids(
+        ingestion_context.team_id, (distinct_id for _, distinct_id in events_missing_flags)
+    )
+    for event, distinct_id in events_missing_flags:
+        flags = flags_by_distinct_id.get(distinct_id, {})
         event["properties"]["$active_feature_flags"] = list(flags.keys())
         for k, v in flags.items():
             event["properties"][f"$feature/{k}"] = v
@@ -272,6 +289,9 @@ def get_event(request):
     else:
         events = [data]
 
+    # Everything this request produces is sent without waiting, delivery is checked once at the end
+    producer = KafkaProduceBatch(KafkaProducer(), name="capture")
+
     try:
         if ingestion_context and should_write_recordings_to_object_storage(ingestion_context.team_id):
             session_recording_events = get_session_recording_events_for_object_storage(events)
@@ -285,6 +305,7 @@ def get_event(request):
                     partition_key=hashlib.sha256(
                         f"{ingestion_context.team_id}:{recording_event.session_id}".encode()
                     ).hexdigest(),
+                    producer=producer,
                 )
         events = preprocess_session_recording_events_for_clickhouse(events)
     except ValueError as e:
@@ -326,22 +347,26 @@ def get_event(request):
             continue
 
         try:
-            capture_internal(event, distinct_id, ip, site_url, now, sent_at, ingestion_context.team_id, event_uuid)  # type: ignore
+            capture_internal(
+                event,
+                distinct_id,
+                ip,
+                site_url,
+                now,
+                sent_at,
+                ingestion_context.team_id,  # type: ignore
+                event_uuid,
+                producer=producer,
+            )
         except Exception as e:
             capture_exception(e, {"data": data})
-            statsd.incr(
-                "posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture",},
-            )
-            return cors_response(
-                request,
-                generate_exception_response(
-                    "capture",
-                    "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
-                    code="server_error",
-                    type="server_error",
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                ),
-            )
+            return _unable_to_store_event_response(request)
+
+    try:
+        producer.flush()
+    except Exception as e:
+        capture_exception(e, {"data": data})
+        return _unable_to_store_event_response(request)
 
     statsd.incr(
         "posthog_cloud_raw_endpoint_success", tags={"endpoint": "capture",},
@@ -349,7 +374,24 @@ def get_event(request):
     return cors_response(request, JsonResponse({"status": 1}))
 
 
+def _unable_to_store_event_response(request):
+    statsd.incr(
+        "posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture",},
+    )
+    return cors_response(
+        request,
+        generate_exception_response(
+            "capture",
+            "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
+            code="server_error",
+            type="server_error",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        ),
+    )
+
+
 def validate_events(events, ingestion_context):
+    validated_events = []
     for event in events:
         event_uuid = UUIDT()
         distinct_id = get_distinct_id(event)
@@ -365,7 +407,14 @@ def validate_events(events, ingestion_context):
         if not event:
             continue
 
-        yield event, event_uuid, distinct_id
+        validated_events.append((event, event_uuid, distinct_id))
+
+    if ingestion_context:
+        _ensure_web_feature_flags_in_properties(
+            [(event, distinct_id) for event, _, distinct_id in validated_events], ingestion_context
+        )
+
+    yield from validated_events
 
 
 def parse_event(event, distinct_id, ingestion_context):
@@ -380,13 +429,12 @@ def parse_event(event, distinct_id, ingestion_context):
         scope.set_tag("library", event["properties"].get("$lib", "unknown"))
         scope.set_tag("library.version", event["properties"].get("$lib_version", "unknown"))
 
-    if ingestion_context:
-        _ensure_web_feature_flags_in_properties(event, ingestion_context, distinct_id)
-
     return event
 
 
-def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id, event_uuid=UUIDT()) -> None:
+def capture_internal(
+    event, distinct_id, ip, site_url, now, sent_at, team_id, event_uuid=UUIDT(), producer=None
+) -> None:
     parsed_event = parse_kafka_event_data(
         distinct_id=distinct_id,
         ip=ip,
@@ -398,4 +446,4 @@ def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id, ev
         event_uuid=event_uuid,
     )
     partition_key = hashlib.sha256(f"{team_id}:{distinct_id}".encode()).hexdigest()
-    log_event(parsed_event, event["event"], partition_key=partition_key)
+    log_event(parsed_event, event["event"], partition_key=partition_key, producer=producer)
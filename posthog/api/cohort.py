@@ -17,11 +17,11 @@ from rest_framework_csv import renderers as csvrenderers
 from sentry_sdk.api import capture_exception
 
 from posthog.api.forbid_destroy_model import ForbidDestroyModel
-from posthog.api.person import get_funnel_actor_class, should_paginate
+from posthog.api.person import get_funnel_actor_class, get_persons_page_urls, should_paginate
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.api.shared import UserBasicSerializer
 from posthog.api.utils import get_target_entity
-from posthog.client import sync_execute
+from posthog.client import stream_execute, sync_execute
 from posthog.constants import (
     CSV_EXPORT_LIMIT,
     INSIGHT_FUNNELS,
@@ -51,7 +51,6 @@ from posthog.tasks.calculate_cohort import (
     calculate_cohort_from_list,
     insert_cohort_from_insight_filter,
 )
-from posthog.utils import format_query_params_absolute_url
 
 
 class CohortSerializer(serializers.ModelSerializer):
@@ -214,14 +213,9 @@ class CohortViewSet(StructuredViewSetMixin, ForbidDestroyModel, viewsets.ModelVi
         actor_ids = [row[0] for row in raw_result]
         actors, serialized_actors = get_people(team.pk, actor_ids)
 
-        _should_paginate = should_paginate(actors, filter.limit)
-        next_url = format_query_params_absolute_url(request, filter.offset + filter.limit) if _should_paginate else None
-        previous_url = (
-            format_query_params_absolute_url(request, filter.offset - filter.limit)
-            if filter.offset - filter.limit >= 0
-            else None
+        next_url, previous_url = get_persons_page_urls(
+            request, filter, raw_result, has_next=should_paginate(actors, filter.limit)
         )
-
         return Response({"results": serialized_actors, "next": next_url, "previous": previous_url})
 
 
@@ -259,13 +253,13 @@ def will_create_loops(cohort: Cohort) -> bool:
 
 
 def insert_cohort_people_into_pg(cohort: Cohort):
-    ids = sync_execute(
+    ids = stream_execute(
         "SELECT person_id FROM {} where team_id = %(team_id)s AND cohort_id = %(cohort_id)s".format(
             PERSON_STATIC_COHORT_TABLE
         ),
         {"cohort_id": cohort.pk, "team_id": cohort.team.pk},
     )
-    cohort.insert_users_list_by_uuid(items=[str(id[0]) for id in ids])
+    cohort.insert_users_list_by_uuid(items=(str(id[0]) for id in ids))
 
 
 def insert_cohort_actors_into_ch(cohort: Cohort, filter_data: Dict):
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict, cast
+from typing import Any, Dict, Set, cast
 
 from django.db.models import Prefetch, QuerySet
 from django.shortcuts import get_object_or_404
@@ -19,6 +19,8 @@ from posthog.helpers import create_dashboard_from_template
 from posthog.models import Dashboard, DashboardTile, Insight, Team
 from posthog.models.user import User
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
+from posthog.tasks.update_cache import update_dashboard_insight_caches
+from posthog.utils import get_safe_cache_many, should_refresh
 
 
 class CanEditDashboard(BasePermission):
@@ -184,6 +186,27 @@ class DashboardSerializer(TaggedItemSerializerMixin, serializers.ModelSerializer
             .order_by("insight__order")
         )
 
+        for tile in tiles:
+            # Make sure all items have an insight set
+            if tile.insight and not tile.insight.filters.get("insight"):
+                tile.insight.filters["insight"] = INSIGHT_TRENDS
+                tile.insight.save(update_fields=["filters"])
+
+        refreshing_insight_ids: Set[int] = set()
+        if should_refresh(self.context["request"]):
+            refreshing_insight_ids = update_dashboard_insight_caches(
+                dashboard, [tile.insight for tile in tiles if tile.insight and tile.insight.filters]
+            )
+            # Reload the tiles to get their new filters hashes and last refresh times
+            tiles = tiles.all()
+            self.context.update({"refreshed_by_dashboard": True})
+
+        # Get the cached results of all the tiles at once, rather than one by one
+        cache_keys = {tile.filters_hash for tile in tiles if tile.filters_hash} | {
+            tile.insight.filters_hash for tile in tiles if tile.insight and tile.insight.filters_hash
+        }
+        self.context.update({"cached_results": get_safe_cache_many(cache_keys)})
+
         insights = []
         for tile in tiles:
             if tile.insight:
@@ -195,15 +218,13 @@ class DashboardSerializer(TaggedItemSerializerMixin, serializers.ModelSerializer
 
                 color = tile.color
 
-                # Make sure all items have an insight set
-                if not insight.filters.get("insight"):
-                    insight.filters["insight"] = INSIGHT_TRENDS
-                    insight.save(update_fields=["filters"])
-
                 self.context.update({"filters_hash": tile.filters_hash})
                 insight_data = InsightSerializer(insight, many=False, context=self.context).data
                 insight_data["layouts"] = layouts
                 insight_data["color"] = color
+                if insight.pk in refreshing_insight_ids:
+                    # Still being refreshed in the background, so this is the previously cached result
+                    insight_data["refreshing"] = True
                 insights.append(insight_data)
 
         return insights
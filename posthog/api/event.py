@@ -1,9 +1,8 @@
 import json
 import urllib
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Optional, Union
 
-from django.db.models.query import Prefetch
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 from rest_framework import mixins, request, response, serializers, viewsets
@@ -18,12 +17,15 @@ from sentry_sdk import capture_exception
 from posthog.api.documentation import PropertiesSerializer, extend_schema
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.client import query_with_columns, sync_execute
-from posthog.models import Element, Filter, Person
-from posthog.models.event.query_event_list import parse_order_by, query_events_list
+from posthog.models import Element, Filter
+from posthog.models.event.query_event_list import (
+    get_events_people,
+    parse_order_by,
+    query_events_list,
+    query_events_list_in_windows,
+)
 from posthog.models.event.sql import GET_CUSTOM_EVENTS, SELECT_ONE_EVENT_SQL
 from posthog.models.event.util import ClickhouseEventSerializer
-from posthog.models.person.util import get_persons_by_distinct_ids
-from posthog.models.team import Team
 from posthog.models.utils import UUIDT
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
 from posthog.queries.property_values import get_property_values_for_key
@@ -59,8 +61,13 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
     CSV_EXPORT_DEFAULT_LIMIT = 3_500
     CSV_EXPORT_MAXIMUM_LIMIT = 100_000
 
-    def _build_next_url(self, request: request.Request, last_event_timestamp: datetime) -> str:
+    def _build_next_url(
+        self, request: request.Request, last_event_timestamp: datetime, scan_window: Optional[int] = None
+    ) -> str:
         params = request.GET.dict()
+        if scan_window is not None:
+            # The next page is likely as sparse as this one, so it starts scanning from the same time window
+            params["scan_window"] = str(scan_window)
         reverse = "-timestamp" in parse_order_by(request.GET.get("orderBy"))
         timestamp = last_event_timestamp.astimezone().isoformat()
         if reverse:
@@ -69,6 +76,12 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
             params["after"] = timestamp
         return request.build_absolute_uri(f"{request.path}?{urllib.parse.urlencode(params)}")
 
+    def _get_scan_window(self, request: request.Request) -> int:
+        try:
+            return int(request.GET.get("scan_window", 0))
+        except ValueError:
+            return 0
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -104,50 +117,41 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
             team = self.team
             filter = Filter(request=request, team=self.team)
 
-            query_result = query_events_list(
-                filter=filter,
-                team=team,
-                limit=limit,
-                request_get_query_dict=request.GET.dict(),
-                order_by=parse_order_by(request.GET.get("orderBy")),
-                action_id=request.GET.get("action_id"),
-            )
-
-            # Retry the query without the 1 day optimization
-            if len(query_result) < limit and not request.GET.get("after"):
+            order_by = parse_order_by(request.GET.get("orderBy"))
+            scan_window: Optional[int] = None
+            if order_by[0] == "-timestamp" and not request.GET.get("after"):
+                query_result, scan_window = query_events_list_in_windows(
+                    filter=filter,
+                    team=team,
+                    limit=limit,
+                    request_get_query_dict=request.GET.dict(),
+                    action_id=request.GET.get("action_id"),
+                    scan_window=self._get_scan_window(request),
+                )
+            else:
                 query_result = query_events_list(
                     filter=filter,
                     team=team,
-                    long_date_from=True,
+                    long_date_from=not request.GET.get("after"),
                     limit=limit,
                     request_get_query_dict=request.GET.dict(),
-                    order_by=parse_order_by(request.GET.get("orderBy")),
+                    order_by=order_by,
                     action_id=request.GET.get("action_id"),
                 )
 
             result = ClickhouseEventSerializer(
-                query_result[0:limit], many=True, context={"people": self._get_people(query_result, team),},
+                query_result[0:limit], many=True, context={"people": get_events_people(query_result, team),},
             ).data
 
             next_url: Optional[str] = None
             if not is_csv_request and len(query_result) > limit:
-                next_url = self._build_next_url(request, query_result[limit - 1]["timestamp"])
+                next_url = self._build_next_url(request, query_result[limit - 1]["timestamp"], scan_window)
 
             return response.Response({"next": next_url, "results": result})
         except Exception as ex:
             capture_exception(ex)
             raise ex
 
-    def _get_people(self, query_result: List[Dict], team: Team) -> Dict[str, Any]:
-        distinct_ids = [event["distinct_id"] for event in query_result]
-        persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
-        persons = persons.prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
-        return distinct_to_person
-
     def retrieve(
         self, request: request.Request, pk: Optional[Union[int, str]] = None, *args: Any, **kwargs: Any
     ) -> response.Response:
@@ -164,7 +168,7 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
 
         query_context = {}
         if request.query_params.get("include_person", False):
-            query_context["people"] = self._get_people(query_result, self.team)
+            query_context["people"] = get_events_people(query_result, self.team)
 
         res = ClickhouseEventSerializer(query_result[0], many=False, context=query_context).data
         return response.Response(res)
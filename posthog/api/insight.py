@@ -322,7 +322,7 @@ class InsightSerializer(InsightBasicSerializer):
 
         dashboard = self.context.get("dashboard", None)
 
-        if should_refresh(self.context["request"]):
+        if self._should_refresh():
             return synchronously_update_insight_cache(insight, dashboard)
 
         cache_key = insight.filters_hash
@@ -339,22 +339,33 @@ class InsightSerializer(InsightBasicSerializer):
                     cache_key = generated_filters_hash
 
         self.context.update({"filters_hash": cache_key})
-        result = get_safe_cache(cache_key)
+        result = self._get_cached_result(cache_key)
         if not result or result.get("task_id", None):
             return None
         # Data might not be defined if there is still cached results from before moving from 'results' to 'data'
         return result.get("result")
 
     def get_timezone(self, insight: Insight):
-        if should_refresh(self.context["request"]):
+        if self._should_refresh():
             return insight.team.timezone
-        result = get_safe_cache(insight.filters_hash)
+        result = self._get_cached_result(insight.filters_hash)
         if not result or result.get("task_id", None):
             return None
         return result.get("timezone")
 
+    def _should_refresh(self) -> bool:
+        # Dashboards refresh all their insights up front, see `DashboardSerializer.get_items`
+        return should_refresh(self.context["request"]) and not self.context.get("refreshed_by_dashboard", False)
+
+    def _get_cached_result(self, cache_key: str):
+        # Dashboards get the cached results of all their insights at once, see `DashboardSerializer.get_items`
+        cached_results = self.context.get("cached_results", {})
+        if cache_key in cached_results:
+            return cached_results[cache_key]
+        return get_safe_cache(cache_key)
+
     def get_last_refresh(self, insight: Insight):
-        if should_refresh(self.context["request"]):
+        if self._should_refresh():
             return now()
 
         dashboard_tile = self.dashboard_tile_from_context(insight, self.context.get("dashboard", None))
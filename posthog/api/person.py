@@ -29,7 +29,7 @@ from statshog.defaults.django import statsd
 from posthog.api.capture import capture_internal
 from posthog.api.documentation import PersonPropertiesSerializer, extend_schema
 from posthog.api.routing import PKorUUIDViewSet, StructuredViewSetMixin
-from posthog.api.utils import format_paginated_url, get_pk_or_uuid, get_target_entity
+from posthog.api.utils import format_page_url, format_paginated_url, get_pk_or_uuid, get_target_entity
 from posthog.client import sync_execute
 from posthog.constants import (
     CSV_EXPORT_LIMIT,
@@ -127,6 +127,18 @@ def should_paginate(results, limit: Union[str, int]) -> bool:
     return len(results) > int(limit) - 1
 
 
+def get_persons_page_urls(
+    request: request.Request, filter: Filter, rows: List[Tuple], has_next: bool
+) -> Tuple[Optional[str], Optional[str]]:
+    "Returns the URLs of the next and previous pages of a paginated `PersonQuery` that returned `rows`"
+    offset = int(filter.cursor.get("offset", 0)) if filter.cursor else filter.offset
+    next_url = (
+        format_page_url(request, cursor=PersonQuery.get_next_cursor(rows, offset + len(rows))) if has_next else None
+    )
+    previous_url = format_page_url(request, offset=offset - filter.limit) if offset - filter.limit >= 0 else None
+    return next_url, previous_url
+
+
 def get_funnel_actor_class(filter: Filter) -> Callable:
     funnel_actor_class: Type[ActorBaseQuery]
 
@@ -203,14 +215,9 @@ class PersonViewSet(PKorUUIDViewSet, StructuredViewSetMixin, viewsets.ModelViewS
         actor_ids = [row[0] for row in raw_result]
         actors, serialized_actors = get_people(team.pk, actor_ids)
 
-        _should_paginate = should_paginate(actor_ids, filter.limit)
-        next_url = format_query_params_absolute_url(request, filter.offset + filter.limit) if _should_paginate else None
-        previous_url = (
-            format_query_params_absolute_url(request, filter.offset - filter.limit)
-            if filter.offset - filter.limit >= 0
-            else None
+        next_url, previous_url = get_persons_page_urls(
+            request, filter, raw_result, has_next=should_paginate(actor_ids, filter.limit)
         )
-
         return Response({"results": serialized_actors, "next": next_url, "previous": previous_url})
 
     def destroy(self, request: request.Request, pk=None, **kwargs):  # type: ignore
@@ -273,9 +280,14 @@ class PersonViewSet(PKorUUIDViewSet, StructuredViewSetMixin, viewsets.ModelViewS
 
         funnel_actor_class = get_funnel_actor_class(filter)
 
-        actors, serialized_actors = funnel_actor_class(filter, self.team).get_actors()
-        _should_paginate = should_paginate(actors, filter.limit)
-        next_url = format_query_params_absolute_url(request, filter.offset + filter.limit) if _should_paginate else None
+        actors, serialized_actors, next_cursor = funnel_actor_class(filter, self.team).get_actors_page()
+        next_url = None
+        if should_paginate(actors, filter.limit):
+            next_url = (
+                format_page_url(request, cursor=next_cursor)
+                if next_cursor
+                else format_query_params_absolute_url(request, filter.offset + filter.limit)
+            )
         initial_url = format_query_params_absolute_url(request, 0)
 
         # cached_function expects a dict with the key result
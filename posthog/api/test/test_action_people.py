@@ -1,4 +1,5 @@
 import json
+from unittest.mock import patch
 from uuid import uuid4
 
 from freezegun import freeze_time
@@ -545,6 +546,22 @@ class TestActionPeople(ClickhouseTestMixin, APIBaseTest):
         self.assertEqual(resp[1], "Distinct ID,Email,Internal ID,Name,Properties.name")
         self.assertEqual(resp[2].split(",")[0], "person1")
 
+    @patch("posthog.api.action.CSV_EXPORT_LIMIT", 2)
+    def test_people_csv_is_limited(self):
+        self._create_multiple_people()
+        people = self.client.get(
+            f"/api/projects/{self.team.id}/actions/people.csv",
+            data={
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-07",
+                ENTITY_TYPE: "events",
+                ENTITY_ID: "watched movie",
+                "events": json.dumps([{"id": "watched movie", "type": "events"}]),
+            },
+        )
+        resp = people.content.decode("utf-8").split("\r\n")
+        self.assertEqual(len(resp), 4)  # header, 2 people, empty line
+
     def test_breakdown_by_cohort_people_endpoint(self):
         person1, _, _, _ = self._create_multiple_people()
         cohort = _create_cohort(
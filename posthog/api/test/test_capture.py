@@ -16,7 +16,7 @@ from freezegun import freeze_time
 from rest_framework import status
 
 from posthog.api.test.mock_sentry import mock_sentry_context_for_tagging
-from posthog.models import PersonalAPIKey
+from posthog.models import Person, PersonalAPIKey
 from posthog.models.feature_flag import FeatureFlag
 from posthog.settings import KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC
 from posthog.settings.data_stores import KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION
@@ -927,6 +927,25 @@ class TestCapture(BaseTest):
         statsd_incr_first_call = statsd_incr.call_args_list[0]
         self.assertEqual(statsd_incr_first_call.args[0], "invalid_event_uuid")
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_capture_returns_503_when_delivery_fails(self, kafka_produce) -> None:
+        failed_future = MagicMock()
+        failed_future.get.side_effect = Exception("Kafka is down")
+        kafka_produce.return_value = failed_future
+
+        response = self.client.post(
+            "/track/",
+            data={
+                "data": json.dumps([{"event": "purchase", "properties": {"distinct_id": "xxx"}} for _ in range(3)]),
+                "api_key": self.team.api_token,
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(kafka_produce.call_count, 3)
+        # all messages are produced first, then delivery of each is checked once at the end
+        self.assertEqual(failed_future.get.call_count, 3)
+
     @patch("posthog.kafka_client.client._KafkaProducer.produce")
     def test_add_feature_flags_if_missing(self, kafka_produce) -> None:
         self.assertListEqual(self.team.event_properties_numerical, [])
@@ -941,6 +960,47 @@ class TestCapture(BaseTest):
         arguments = self._to_arguments(kafka_produce)
         self.assertEqual(arguments["data"]["properties"]["$active_feature_flags"], ["test-ff"])
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_add_feature_flags_if_missing_for_batch(self, kafka_produce) -> None:
+        Person.objects.create(team=self.team, distinct_ids=["xxx"], properties={"email": "test@posthog.com"})
+        FeatureFlag.objects.create(
+            team=self.team,
+            created_by=self.user,
+            key="email-ff",
+            filters={
+                "groups": [
+                    {
+                        "properties": [
+                            {"key": "email", "type": "person", "value": "test@posthog.com", "operator": "exact"}
+                        ]
+                    }
+                ]
+            },
+        )
+        FeatureFlag.objects.create(team=self.team, created_by=self.user, key="test-ff", rollout_percentage=100)
+
+        # token lookup, flags and one person query for the whole batch
+        with self.assertNumQueries(3):
+            self.client.post(
+                "/track/",
+                data={
+                    "data": json.dumps(
+                        [
+                            {"event": "purchase", "properties": {"distinct_id": "xxx", "$lib": "web"}},
+                            {"event": "purchase", "properties": {"distinct_id": "yyy", "$lib": "web"}},
+                            {"event": "purchase", "properties": {"distinct_id": "xxx", "$lib": "web"}},
+                        ]
+                    ),
+                    "api_key": self.team.api_token,
+                },
+            )
+
+        active_flags = [
+            sorted(json.loads(produce_call[1]["data"]["data"])["properties"]["$active_feature_flags"])
+            for produce_call in kafka_produce.call_args_list
+        ]
+        self.assertEqual(active_flags, [["email-ff", "test-ff"], ["test-ff"], ["email-ff", "test-ff"]])
+
     def test_handle_lacking_event_name_field(self):
         response = self.client.post(
             "/e/",
@@ -1,8 +1,11 @@
 import json
+import threading
 from typing import Any, Dict, List, Literal, Optional, Tuple
+from unittest.mock import patch
 
 from dateutil import parser
 from django.db import connection
+from django.test import override_settings
 from django.utils import timezone
 from django.utils.timezone import now
 from freezegun import freeze_time
@@ -11,6 +14,7 @@ from rest_framework import status
 from posthog.models import Dashboard, DashboardTile, Filter, Insight, Team, User
 from posthog.models.organization import Organization
 from posthog.models.sharing_configuration import SharingConfiguration
+from posthog.tasks.update_cache import _get_dashboard_refresh_pool
 from posthog.test.base import APIBaseTest, QueryMatchingTest, snapshot_postgres_queries
 from posthog.test.db_context_capturing import capture_db_queries
 from posthog.utils import generate_cache_key
@@ -269,6 +273,105 @@ class TestDashboard(APIBaseTest, QueryMatchingTest):
             self.assertAlmostEqual(item_default.last_refresh, now(), delta=timezone.timedelta(seconds=5))
             self.assertAlmostEqual(item_trends.last_refresh, now(), delta=timezone.timedelta(seconds=5))
 
+    def test_cached_results_are_loaded_at_once(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        for order in range(3):
+            insight = Insight.objects.create(
+                filters=Filter(data={"events": [{"id": f"event {order}"}]}).to_dict(), team=self.team, order=order
+            )
+            DashboardTile.objects.create(dashboard=dashboard, insight=insight)
+        self.client.get(f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}?refresh=true")
+
+        with patch("posthog.api.insight.get_safe_cache") as get_safe_cache:
+            response = self.client.get(f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}").json()
+
+        get_safe_cache.assert_not_called()
+        self.assertEqual(len(response["items"]), 3)
+        self.assertTrue(all(item["result"] is not None for item in response["items"]))
+
+    @override_settings(DASHBOARD_REFRESH_THREADS=2, DASHBOARD_REFRESH_TIMEOUT_SECONDS=1)
+    def test_refresh_returns_tiles_still_refreshing_from_cache(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        insights = [
+            Insight.objects.create(
+                filters=Filter(data={"events": [{"id": f"event {order}"}]}).to_dict(), team=self.team, order=order
+            )
+            for order in range(2)
+        ]
+        for insight in insights:
+            DashboardTile.objects.create(dashboard=dashboard, insight=insight)
+
+        slow_insight_refreshed = threading.Event()
+
+        def update_insight_cache(insight: Insight, dashboard: Dashboard):
+            if insight.pk == insights[1].pk:
+                slow_insight_refreshed.wait(10)
+
+        try:
+            with patch(
+                "posthog.tasks.update_cache.synchronously_update_insight_cache", side_effect=update_insight_cache
+            ) as synchronously_update_insight_cache:
+                response = self.client.get(f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}?refresh=true")
+        finally:
+            slow_insight_refreshed.set()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(synchronously_update_insight_cache.call_count, 2)
+        self.assertEqual([item["refreshing"] for item in response.json()["items"]], [False, True])
+
+    @override_settings(DASHBOARD_REFRESH_THREADS=2)
+    def test_refresh_raises_errors_of_tiles(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        insight = Insight.objects.create(
+            filters=Filter(data={"events": [{"id": "$pageview"}]}).to_dict(), team=self.team, order=0
+        )
+        DashboardTile.objects.create(dashboard=dashboard, insight=insight)
+
+        with patch(
+            "posthog.tasks.update_cache.synchronously_update_insight_cache", side_effect=ValueError("refresh failed")
+        ), self.assertRaises(ValueError):
+            self.client.get(f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}?refresh=true")
+
+    @override_settings(DASHBOARD_REFRESH_THREADS=1, DASHBOARD_REFRESH_TIMEOUT_SECONDS=1)
+    def test_refresh_cancels_queued_tiles_and_skips_tiles_in_flight(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        insights = [
+            Insight.objects.create(
+                filters=Filter(data={"events": [{"id": f"event {order}"}]}).to_dict(), team=self.team, order=order
+            )
+            for order in range(2)
+        ]
+        for insight in insights:
+            DashboardTile.objects.create(dashboard=dashboard, insight=insight)
+
+        slow_insight_refreshed = threading.Event()
+
+        def update_insight_cache(insight: Insight, dashboard: Dashboard):
+            slow_insight_refreshed.wait(10)
+
+        try:
+            with patch(
+                "posthog.tasks.update_cache.synchronously_update_insight_cache", side_effect=update_insight_cache
+            ) as synchronously_update_insight_cache:
+                first_response = self.client.get(f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}?refresh=true")
+                second_response = self.client.get(
+                    f"/api/projects/{self.team.id}/dashboards/{dashboard.pk}?refresh=true"
+                )
+        finally:
+            slow_insight_refreshed.set()
+
+        # The first insight blocks the only thread, so the second never starts and the first isn't started twice
+        self.assertEqual(synchronously_update_insight_cache.call_count, 1)
+        for response in (first_response, second_response):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([item["refreshing"] for item in response.json()["items"]], [True, False])
+
+    def test_refresh_pool_follows_thread_setting(self):
+        with override_settings(DASHBOARD_REFRESH_THREADS=2):
+            self.assertEqual(_get_dashboard_refresh_pool()._max_workers, 2)
+        with override_settings(DASHBOARD_REFRESH_THREADS=3):
+            self.assertEqual(_get_dashboard_refresh_pool()._max_workers, 3)
+
     def test_dashboard_endpoints(self):
         # create
         response = self.client.post(f"/api/projects/{self.team.id}/dashboards/", {"name": "Default", "pinned": "true"},)
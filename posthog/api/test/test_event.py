@@ -1,5 +1,5 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import patch
 from urllib.parse import unquote, urlencode
 
@@ -306,13 +306,13 @@ class TestEvents(ClickhouseTestMixin, APIBaseTest):
             response = self.client.get(f"/api/projects/{self.team.id}/events/?distinct_id=1").json()
             self.assertEqual(len(response["results"]), 100)
             self.assertIn(
-                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&before=",
+                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&scan_window=4&before=",
                 unquote(response["next"]),
             )
             response = self.client.get(f"/api/projects/{self.team.id}/events/?distinct_id=1").json()
             self.assertEqual(len(response["results"]), 100)
             self.assertIn(
-                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&before=",
+                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&scan_window=4&before=",
                 unquote(response["next"]),
             )
 
@@ -330,7 +330,7 @@ class TestEvents(ClickhouseTestMixin, APIBaseTest):
             self.assertEqual(len(page2["results"]), 100)
             self.assertEqual(
                 unquote(page2["next"]),
-                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&before=2020-12-30T12:03:53.829294+00:00",
+                f"http://testserver/api/projects/{self.team.id}/events/?distinct_id=1&scan_window=4&before=2020-12-30T12:03:53.829294+00:00",
             )
 
             page3 = self.client.get(page2["next"]).json()
@@ -553,37 +553,62 @@ class TestEvents(ClickhouseTestMixin, APIBaseTest):
 
     @patch("posthog.models.event.query_event_list.query_with_columns")
     def test_optimize_query(self, patch_query_with_columns):
-        #  For ClickHouse we normally only query the last day,
-        # but if a user doesn't have many events we still want to return events that are older
-        patch_query_with_columns.return_value = [
-            {
-                "uuid": "event",
-                "event": "d",
-                "properties": "{}",
-                "timestamp": timezone.now(),
-                "team_id": "d",
-                "distinct_id": "d",
-                "elements_chain": "d",
-            }
-        ]
+        # For ClickHouse we first only query the last hour, then increasingly longer time windows,
+        # so that if a user doesn't have many events we still return events that are older
+        event = {
+            "uuid": "event",
+            "event": "d",
+            "properties": "{}",
+            "timestamp": timezone.now(),
+            "team_id": "d",
+            "distinct_id": "d",
+            "elements_chain": "d",
+        }
+        patch_query_with_columns.side_effect = [[], [], [], [], [], [event]]
         response = self.client.get(f"/api/projects/{self.team.id}/events/").json()
         self.assertEqual(len(response["results"]), 1)
-        self.assertEqual(patch_query_with_columns.call_count, 2)
+        self.assertEqual(patch_query_with_columns.call_count, 6)
+        self.assertNotIn("%(after)s", patch_query_with_columns.call_args[0][0])
 
-        patch_query_with_columns.return_value = [
-            {
-                "uuid": "event",
-                "event": "d",
-                "properties": "{}",
-                "timestamp": timezone.now(),
-                "team_id": "d",
-                "distinct_id": "d",
-                "elements_chain": "d",
-            }
-            for _ in range(0, 100)
-        ]
+        patch_query_with_columns.reset_mock()
+        patch_query_with_columns.side_effect = [[event], [event for _ in range(0, 100)]]
         response = self.client.get(f"/api/projects/{self.team.id}/events/").json()
-        self.assertEqual(patch_query_with_columns.call_count, 3)
+        self.assertEqual(len(response["results"]), 100)
+        self.assertEqual(patch_query_with_columns.call_count, 2)
+        # Only the rows still missing are queried from the next window
+        self.assertEqual(patch_query_with_columns.call_args[0][1]["limit"], 100)
+        self.assertIn("scan_window=1", response["next"])
+
+        patch_query_with_columns.reset_mock()
+        patch_query_with_columns.side_effect = [[event for _ in range(0, 101)]]
+        self.client.get(response["next"]).json()
+        self.assertEqual(patch_query_with_columns.call_count, 1)
+        after = parser.parse(patch_query_with_columns.call_args[0][1]["after"])
+        before = parser.parse(patch_query_with_columns.call_args[0][1]["before"])
+        self.assertEqual(before - after, timedelta(days=1))
+
+    def test_scanning_time_windows_includes_events_between_windows(self):
+        with freeze_time("2021-10-10T12:00:00Z"):
+            _create_person(team=self.team, distinct_ids=["1"])
+            for timestamp in ["2021-10-10T11:30:00Z", "2021-10-10T11:00:05Z", "2021-10-09T12:00:00Z"]:
+                _create_event(team=self.team, event="some event", distinct_id="1", timestamp=timestamp)
+
+            response = self.client.get(
+                f"/api/projects/{self.team.id}/events/?distinct_id=1&before=2021-10-10T12:00:05Z&limit=2"
+            ).json()
+            # The second event is right at the start of the first window, so it's found by the second one
+            self.assertEqual(
+                [parser.parse(event["timestamp"]) for event in response["results"]],
+                [parser.parse("2021-10-10T11:30:00Z"), parser.parse("2021-10-10T11:00:05Z")],
+            )
+            self.assertIn("scan_window=2", response["next"])
+
+            page2 = self.client.get(response["next"]).json()
+            self.assertEqual(
+                [parser.parse(event["timestamp"]) for event in page2["results"]],
+                [parser.parse("2021-10-09T12:00:00Z")],
+            )
+            self.assertIsNone(page2["next"])
 
     def test_filter_events_by_being_after_properties_with_date_type(self):
         journeys_for(
@@ -624,6 +624,40 @@ class TestPerson(ClickhouseTestMixin, APIBaseTest):
         created_ids.reverse()  # ids are returned in desc order
         self.assertEqual(returned_ids, created_ids, returned_ids)
 
+    def test_pagination_with_cursor(self):
+        created_ids = []
+        for index in range(0, 25):
+            created_ids.append(str(index + 100))
+            Person.objects.create(
+                team=self.team, distinct_ids=[str(index + 100)], properties={"$browser": "whatever", "$os": "Windows"},
+            )
+
+        response = self.client.get("/api/person/?limit=10").json()
+        returned_ids = [x["distinct_ids"][0] for x in response["results"]]
+        self.assertIn("cursor=", response["next"])
+        self.assertIsNone(response["previous"])
+
+        response = self.client.get(response["next"]).json()
+        returned_ids += [x["distinct_ids"][0] for x in response["results"]]
+        self.assertIn("cursor=", response["next"])
+        self.assertNotIn("cursor=", response["previous"])
+
+        response = self.client.get(response["next"]).json()
+        returned_ids += [x["distinct_ids"][0] for x in response["results"]]
+        self.assertEqual(len(response["results"]), 5)
+        self.assertIsNone(response["next"])
+
+        created_ids.reverse()
+        self.assertEqual(returned_ids, created_ids)
+
+        previous = self.client.get(response["previous"]).json()
+        self.assertEqual([x["distinct_ids"][0] for x in previous["results"]], created_ids[10:20])
+
+    def test_pagination_with_invalid_cursor(self):
+        response = self.client.get("/api/person/?limit=10&cursor=invalid")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def _get_person_activity(self, person_id: Optional[int] = None, expected_status: int = status.HTTP_200_OK):
         if person_id:
             url = f"/api/person/{person_id}/activity"
@@ -1,9 +1,20 @@
+import json
 from datetime import timedelta
+from unittest.mock import patch
 
+from django.test import override_settings
+from freezegun import freeze_time
 from rest_framework import status
 
 from posthog.jwt import PosthogJwtAudience, encode_jwt
-from posthog.models import PersonalAPIKey
+from posthog.models import PersonalAPIKey, User
+from posthog.models.personal_api_key import (
+    PERSONAL_API_KEY_LAST_USED_REDIS_KEY,
+    _usage_recorded_at,
+    flush_personal_api_key_usage,
+)
+from posthog.models.user import _handle_personal_api_key_invalidation_message
+from posthog.redis import get_client
 from posthog.test.base import APIBaseTest
 
 
@@ -79,6 +90,11 @@ class TestPersonalAPIKeysAPI(APIBaseTest):
 class TestPersonalAPIKeysAPIAuthentication(APIBaseTest):
     CONFIG_AUTO_LOGIN = False
 
+    def setUp(self):
+        super().setUp()
+        _usage_recorded_at.clear()
+        get_client().delete(PERSONAL_API_KEY_LAST_USED_REDIS_KEY)
+
     def test_no_key(self):
         response = self.client.get(f"/api/projects/{self.team.id}/dashboards/")
         self.assertEqual(response.status_code, 401)
@@ -142,3 +158,73 @@ class TestPersonalAPIKeysAPIAuthentication(APIBaseTest):
             f"/api/projects/{self.team.id}/dashboards/", HTTP_AUTHORIZATION=f"Bearer {impersonated_access_token}"
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_last_used_at_is_written_in_bulk(self):
+        key = PersonalAPIKey.objects.create(label="Test", user=self.user)
+        other_key = PersonalAPIKey.objects.create(label="Other test", user=self.user)
+
+        with freeze_time("2022-01-01T12:00:00Z"):
+            for _ in range(3):
+                self.client.get(f"/api/projects/{self.team.id}/dashboards/", HTTP_AUTHORIZATION=f"Bearer {key.value}")
+        with freeze_time("2022-01-01T12:00:10Z"):
+            self.client.get(f"/api/projects/{self.team.id}/dashboards/", HTTP_AUTHORIZATION=f"Bearer {other_key.value}")
+
+        key.refresh_from_db()
+        self.assertIsNone(key.last_used_at)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(flush_personal_api_key_usage(), 2)
+
+        key.refresh_from_db()
+        other_key.refresh_from_db()
+        self.assertEqual(key.last_used_at.isoformat(), "2022-01-01T12:00:00+00:00")  # type: ignore
+        self.assertEqual(other_key.last_used_at.isoformat(), "2022-01-01T12:00:10+00:00")  # type: ignore
+        self.assertEqual(flush_personal_api_key_usage(), 0)
+
+    @override_settings(PERSONAL_API_KEY_CACHE_TTL_SECONDS=60)
+    @patch("posthog.models.user.ensure_listening")
+    def test_key_lookups_are_reused(self, _):
+        key = PersonalAPIKey.objects.create(label="Test", user=self.user)
+
+        self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+        with self.assertNumQueries(0):
+            user = User.objects.get_from_personal_api_key(key.value)
+        self.assertEqual(user, self.user)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertIsNone(User.objects.get_from_personal_api_key(key.value))
+
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            key.delete()
+        self.assertIsNone(User.objects.get_from_personal_api_key(key.value))
+
+    @override_settings(PERSONAL_API_KEY_CACHE_TTL_SECONDS=60)
+    @patch("posthog.models.user.ensure_listening")
+    def test_key_lookups_are_evicted_by_other_processes(self, _):
+        key = PersonalAPIKey.objects.create(label="Test", user=self.user)
+        User.objects.get_from_personal_api_key(key.value)
+
+        # Another process deactivated the user, which isn't committed from the point of view of this test
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+        _handle_personal_api_key_invalidation_message(json.dumps({"user_id": self.user.pk}).encode())
+        self.assertIsNone(User.objects.get_from_personal_api_key(key.value))
+
+    @override_settings(PERSONAL_API_KEY_CACHE_TTL_SECONDS=60)
+    @patch("posthog.models.user.ensure_listening")
+    def test_key_lookups_return_a_new_user_each_time(self, _):
+        key = PersonalAPIKey.objects.create(label="Test", user=self.user)
+        first_user = User.objects.get_from_personal_api_key(key.value)
+        first_user.first_name = "Changed"  # type: ignore
+        first_user.events_column_config["active"] = ["changed"]  # type: ignore
+
+        user = User.objects.get_from_personal_api_key(key.value)
+        self.assertIsNot(user, first_user)
+        self.assertEqual(user.first_name, self.user.first_name)  # type: ignore
+        self.assertEqual(user.events_column_config, {"active": "DEFAULT"})  # type: ignore
@@ -11,13 +11,14 @@ from rest_framework import request, status
 from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
-from posthog.constants import CombinedEventType
+from posthog.constants import CURSOR, OFFSET, CombinedEventType
 from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.models import Action, Entity, EventDefinition
 from posthog.models.entity import MATH_TYPE
 from posthog.models.filters.filter import Filter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.team import Team
+from posthog.models.team.token_cache import TeamTokenCache
 from posthog.models.user import User
 from posthog.utils import cors_response, load_data_from_request
 
@@ -106,6 +107,18 @@ def format_paginated_url(request: request.Request, offset: int, page_size: int,
     return result
 
 
+def format_page_url(request: request.Request, cursor: Optional[str] = None, offset: int = 0) -> str:
+    "Returns the URL of another page of the request's results, the one at `cursor` or else at `offset`"
+    query = request.GET.copy()
+    query.pop(CURSOR, None)
+    query.pop(OFFSET, None)
+    if cursor:
+        query[CURSOR] = cursor
+    elif offset:
+        query[OFFSET] = str(offset)
+    return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+
 def get_token(data, request) -> Optional[str]:
     token = None
     if request.method == "GET":
@@ -274,8 +287,13 @@ def get_event_ingestion_context(
 def get_event_ingestion_context_for_token(token: str) -> Optional[EventIngestionContext]:
     """
     Based on a token associated with a Team, retrieve the context that is
-    required to ingest events.
+    required to ingest events. Recently retrieved contexts are reused, see
+    `posthog.models.team.token_cache`.
     """
+    return _ingestion_context_cache.get(token)
+
+
+def _load_event_ingestion_context_for_token(token: str) -> Optional[EventIngestionContext]:
     try:
         team_id, anonymize_ips = Team.objects.values_list("id", "anonymize_ips").get(api_token=token)
         # NOTE: Not sure why, but I needed to do this cast otherwise I got
@@ -287,6 +305,13 @@ def get_event_ingestion_context_for_token(token: str) -> Optional[EventIngestion
         return None
 
 
+_ingestion_context_cache: TeamTokenCache[EventIngestionContext] = TeamTokenCache(
+    "event_ingestion_context",
+    load=_load_event_ingestion_context_for_token,
+    get_team_id=lambda ingestion_context: ingestion_context.team_id,
+)
+
+
 def get_event_ingestion_context_for_personal_api_key(
     personal_api_key: str, project_id: int
 ) -> Optional[EventIngestionContext]:
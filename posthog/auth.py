@@ -6,7 +6,6 @@ from urllib.parse import urlsplit
 import jwt
 from django.apps import apps
 from django.http import HttpRequest, JsonResponse
-from django.utils import timezone
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
@@ -65,28 +64,10 @@ class PersonalAPIKeyAuthentication(authentication.BaseAuthentication):
         if not personal_api_key_with_source:
             return None
         personal_api_key, source = personal_api_key_with_source
-        PersonalAPIKey = apps.get_model(app_label="posthog", model_name="PersonalAPIKey")
-        try:
-            personal_api_key_object = (
-                PersonalAPIKey.objects.select_related("user").filter(user__is_active=True).get(value=personal_api_key)
-            )
-        except PersonalAPIKey.DoesNotExist:
+        user = User.objects.get_from_personal_api_key(personal_api_key)
+        if user is None:
             raise AuthenticationFailed(detail=f"Personal API key found in request {source} is invalid.")
-
-        now = timezone.now()
-        key_last_used_at = personal_api_key_object.last_used_at
-        # Only updating last_used_at if the hour's changed
-        # This is to avooid excessive UPDATE queries, while still presenting accurate (down to the hour) info in the UI
-        if key_last_used_at is None or (now.year, now.month, now.day, now.hour) > (
-            key_last_used_at.year,
-            key_last_used_at.month,
-            key_last_used_at.day,
-            key_last_used_at.hour,
-        ):
-            key_last_used_at = now
-            personal_api_key_object.save()
-        assert personal_api_key_object.user is not None
-        return personal_api_key_object.user, None
+        return user, None
 
     @classmethod
     def authenticate_header(cls, request) -> str:
@@ -92,6 +92,12 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
 
     sender.add_periodic_task(crontab(minute="*/15"), check_async_migration_health.s())
 
+    sender.add_periodic_task(
+        settings.PERSONAL_API_KEY_LAST_USED_INTERVAL_SECONDS,
+        flush_personal_api_key_usage.s(),
+        name="flush personal API key usage",
+    )
+
     if settings.INGESTION_LAG_METRIC_TEAM_IDS:
         sender.add_periodic_task(60, ingestion_lag.s(), name="ingestion lag")
     sender.add_periodic_task(120, clickhouse_lag.s(), name="clickhouse table lag")
@@ -452,6 +458,13 @@ def debug_task(self):
     print(f"Request: {self.request!r}")
 
 
+@app.task(ignore_result=True)
+def flush_personal_api_key_usage():
+    from posthog.models.personal_api_key import flush_personal_api_key_usage
+
+    flush_personal_api_key_usage()
+
+
 @app.task(ignore_result=True)
 def calculate_event_property_usage():
     from posthog.tasks.calculate_event_property_usage import calculate_event_property_usage
@@ -1,12 +1,19 @@
 import hashlib
 import json
+import pickle
+import threading
 import time
 import types
+import uuid
+import zlib
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache
 from time import perf_counter
 from typing import (
     Any,
     Dict,
+    Iterator,
     List,
     Optional,
     Sequence,
@@ -23,6 +30,7 @@ from dataclasses_json import dataclass_json
 from django.conf import settings as app_settings
 from django.core.cache import cache
 from django.utils.timezone import now
+from redis.exceptions import WatchError
 from sentry_sdk.api import capture_exception
 
 from posthog import redis
@@ -49,6 +57,13 @@ NonInsertParams = Dict[str, Any]
 QueryArgs = Optional[Union[InsertParams, NonInsertParams]]
 
 CACHE_TTL = 60  # seconds
+# Rows clickhouse sends per block when streaming results
+STREAM_BLOCK_SIZE = 10_000
+# How long a worker may hold the lock for computing a cached query, and how long others wait on it
+CACHE_LOCK_TTL = 60  # seconds
+CACHE_WAIT_INTERVAL = 0.05  # seconds
+# Upper bound on serialized results kept in-process in front of redis
+LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
 SLOW_QUERY_THRESHOLD_MS = 15000
 QUERY_TIMEOUT_THREAD = get_timer_thread("posthog.client", SLOW_QUERY_THRESHOLD_MS)
 
@@ -121,17 +136,137 @@ def async_execute(query, args=None, settings=None, with_column_types=False):
     return sync_execute(query, args, settings=settings, with_column_types=with_column_types)
 
 
-def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL, settings=None, with_column_types=False):
+class _LocalResultCache:
+    """
+    Process-local LRU of serialized query results, in front of redis.
+
+    Results are kept serialized so callers never share (and mutate) the same objects, and so that memory use is
+    easy to bound.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: bytes, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: bytes) -> None:
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+local_result_cache = _LocalResultCache(max_bytes=LOCAL_CACHE_MAX_BYTES)
+
+
+def cache_sync_execute(
+    query,
+    args=None,
+    redis_client=None,
+    ttl=CACHE_TTL,
+    settings=None,
+    with_column_types=False,
+    wait_timeout: float = CACHE_LOCK_TTL,
+):
+    """
+    Like sync_execute, but results are cached in-process and in redis for `ttl` seconds.
+
+    When many workers ask for the same uncached query at once, only one of them runs it while the others wait for
+    its result to appear in redis, for up to `wait_timeout` seconds.
+    """
     if not redis_client:
         redis_client = redis.get_client()
     key = _key_hash(query, args)
-    if redis_client.exists(key):
-        result = _deserialize(redis_client.get(key))
-        return result
+    if with_column_types:
+        key += b":with_column_types"
+
+    serialized = local_result_cache.get(key)
+    if serialized is not None:
+        incr("clickhouse_result_cache", tags={"result": "local_hit"})
+        return _deserialize(serialized)
+
+    serialized = redis_client.get(key)
+    if serialized is not None:
+        incr("clickhouse_result_cache", tags={"result": "hit"})
+        local_result_cache.set(key, serialized, ttl)
+        return _deserialize(serialized)
+
+    lock_key = key + b":lock"
+    # Identifies our hold of the lock, so that we never release a lock that expired and was taken by someone else
+    lock_token = uuid.uuid4().bytes
+    holds_lock = redis_client.set(lock_key, lock_token, nx=True, ex=CACHE_LOCK_TTL)
+    if not holds_lock:
+        # Someone else is already running this query, wait for their result rather than running it again
+        wait_start = perf_counter()
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_WAIT_INTERVAL)
+            serialized = redis_client.get(key)
+            if serialized is not None:
+                incr("clickhouse_result_cache", tags={"result": "wait_hit"})
+                timing("clickhouse_result_cache_wait_time", (perf_counter() - wait_start) * 1000.0)
+                local_result_cache.set(key, serialized, ttl)
+                return _deserialize(serialized)
+            if not redis_client.exists(lock_key):
+                # The query failed for whoever was running it, try ourselves
+                incr("clickhouse_result_cache", tags={"result": "wait_lock_released"})
+                break
+        else:
+            incr("clickhouse_result_cache", tags={"result": "wait_timeout"})
+        holds_lock = redis_client.set(lock_key, lock_token, nx=True, ex=CACHE_LOCK_TTL)
     else:
+        incr("clickhouse_result_cache", tags={"result": "miss"})
+
+    try:
         result = sync_execute(query, args, settings=settings, with_column_types=with_column_types)
-        redis_client.set(key, _serialize(result), ex=ttl)
-        return result
+        serialized = _serialize(result)
+        redis_client.set(key, serialized, ex=ttl)
+        local_result_cache.set(key, serialized, ttl)
+    finally:
+        if holds_lock:
+            _release_lock(redis_client, lock_key, lock_token)
+    return result
+
+
+def _release_lock(redis_client, lock_key: bytes, lock_token: bytes) -> None:
+    "Deletes the lock if it's still ours, checking and deleting in one transaction"
+    with redis_client.pipeline() as pipe:
+        try:
+            pipe.watch(lock_key)
+            if pipe.get(lock_key) == lock_token:
+                pipe.multi()
+                pipe.delete(lock_key)
+                pipe.execute()
+        except WatchError:
+            # Changed since we checked, so it isn't ours anymore
+            pass
 
 
 def sync_execute(query, args=None, settings=None, with_column_types=False, flush=True):
@@ -176,31 +311,103 @@ def sync_execute(query, args=None, settings=None, with_column_types=False, flush
     return result
 
 
+def stream_execute(query, args=None, settings=None, with_column_types=False, block_size=STREAM_BLOCK_SIZE):
+    """
+    Like sync_execute, but yields rows as clickhouse sends them, `block_size` rows at a time, instead of returning
+    the whole result at once. Memory use doesn't depend on the size of the result.
+
+    With `with_column_types`, the first item yielded is the list of column names and types.
+
+    NOTE: The connection is held until the generator is exhausted or closed.
+    """
+    if TEST:
+        try:
+            from posthog.test.base import flush_persons_and_events
+
+            flush_persons_and_events()
+        except ModuleNotFoundError:  # when we run plugin server tests it tries to run above, ignore
+            pass
+
+    with ch_pool.get_client() as client:
+        start_time = perf_counter()
+
+        prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args)
+        tags["streaming"] = True
+
+        settings = {**settings_override, "max_block_size": block_size, **(settings or {})}
+
+        try:
+            yield from client.execute_iter(
+                prepared_sql, params=prepared_args, settings=settings, with_column_types=with_column_types,
+            )
+        except GeneratorExit:
+            # Closed before reading the whole result, so the rest of it is still pending on the connection.
+            # Drop the connection rather than handing it back to the pool in that state.
+            client.disconnect()
+            raise
+        except Exception as err:
+            err = wrap_query_error(err)
+            tags["failed"] = True
+            tags["reason"] = type(err).__name__
+            incr("clickhouse_sync_execution_failure", tags=tags)
+
+            raise err
+        finally:
+            execution_time = perf_counter() - start_time
+            timing("clickhouse_sync_execution_time", execution_time * 1000.0, tags=tags)
+
+            if _request_information is not None and _request_information.get("save", False):
+                save_query(prepared_sql, execution_time)
+
+
 def query_with_columns(
     query: str,
     args: Optional[QueryArgs] = None,
     columns_to_remove: Optional[Sequence[str]] = None,
     columns_to_rename: Optional[Dict[str, str]] = None,
 ) -> List[Dict]:
-    if columns_to_remove is None:
-        columns_to_remove = []
-    if columns_to_rename is None:
-        columns_to_rename = {}
     metrics, types = sync_execute(query, args, with_column_types=True)
     type_names = [key for key, _type in types]
 
-    rows = []
-    for row in metrics:
-        result = {}
-        for type_name, value in zip(type_names, row):
-            if isinstance(value, list):
-                value = ", ".join(map(str, value))
-            if type_name not in columns_to_remove:
-                result[columns_to_rename.get(type_name, type_name)] = value
+    return [_row_to_dict(row, type_names, columns_to_remove, columns_to_rename) for row in metrics]
 
-        rows.append(result)
 
-    return rows
+def stream_query_with_columns(
+    query: str,
+    args: Optional[QueryArgs] = None,
+    columns_to_remove: Optional[Sequence[str]] = None,
+    columns_to_rename: Optional[Dict[str, str]] = None,
+    block_size: int = STREAM_BLOCK_SIZE,
+) -> Iterator[Dict]:
+    "Streaming version of query_with_columns, see stream_execute."
+    rows = stream_execute(query, args, with_column_types=True, block_size=block_size)
+    types = next(rows, None)
+    if types is None:
+        return
+    type_names = [key for key, _type in types]
+
+    for row in rows:
+        yield _row_to_dict(row, type_names, columns_to_remove, columns_to_rename)
+
+
+def _row_to_dict(
+    row: Sequence[Any],
+    type_names: List[str],
+    columns_to_remove: Optional[Sequence[str]] = None,
+    columns_to_rename: Optional[Dict[str, str]] = None,
+) -> Dict:
+    if columns_to_remove is None:
+        columns_to_remove = []
+    if columns_to_rename is None:
+        columns_to_rename = {}
+
+    result = {}
+    for type_name, value in zip(type_names, row):
+        if isinstance(value, list):
+            value = ", ".join(map(str, value))
+        if type_name not in columns_to_remove:
+            result[columns_to_rename.get(type_name, type_name)] = value
+    return result
 
 
 REDIS_STATUS_TTL = 600  # 10 minutes
@@ -429,25 +636,28 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     clickhouse_driver at this moment in time decides based on the
     below predicate.
     """
+    # Comments are stripped from the template rather than the rendered query: the template is the same for every
+    # call from a given query builder, so this is cached, while the rendered query can contain huge lists of values.
+    formatted_query = strip_comments(query)
+
     prepared_args: Any = QueryArgs
     if isinstance(args, (list, tuple, types.GeneratorType)):
         # If we get one of these it means we have an insert, let the clickhouse
         # client handle substitution here.
-        rendered_sql = query
+        formatted_sql = formatted_query
         prepared_args = args
     elif not args:
         # If `args` is not truthy then make prepared_args `None`, which the
         # clickhouse client uses to signal no substitution is desired. Expected
         # args balue are `None` or `{}` for instance
-        rendered_sql = query
+        formatted_sql = formatted_query
         prepared_args = None
     else:
         # Else perform the substitution so we can perform operations on the raw
         # non-templated SQL
-        rendered_sql = client.substitute_params(query, args)
+        formatted_sql = client.substitute_params(formatted_query, args)
         prepared_args = None
 
-    formatted_sql = sqlparse.format(rendered_sql, strip_comments=True)
     annotated_sql, tags = _annotate_tagged_query(formatted_sql, args)
 
     if app_settings.SHELL_PLUS_PRINT_SQL:
@@ -457,7 +667,50 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     return annotated_sql, prepared_args, tags
 
 
-def _deserialize(result_bytes: bytes) -> List[Tuple]:
+# Leading byte of serialized results, anything else is a result cached as JSON by an older version
+_PICKLED = b"\x01"
+_PICKLED_COMPRESSED = b"\x02"
+# Results smaller than this aren't worth the time to compress
+_COMPRESSION_THRESHOLD = 4096
+
+# Templates longer than this usually have values inlined and are unlikely to repeat. Along with the size of the cache,
+# this bounds its memory use to about 16MB per process (the template and its stripped version, 8KB each)
+MAX_CACHED_TEMPLATE_LENGTH = 8_192
+
+
+def strip_comments(query: str) -> str:
+    """
+    Equivalent to `sqlparse.format(query, strip_comments=True)`, which also strips trailing whitespace from lines.
+    """
+    if _can_skip_sqlparse(query):
+        return "\n".join(line.rstrip() for line in query.split("\n"))
+    if len(query) <= MAX_CACHED_TEMPLATE_LENGTH:
+        return _strip_comments_cached(query)
+    return sqlparse.format(query, strip_comments=True)
+
+
+@lru_cache(maxsize=1024)
+def _strip_comments_cached(query: str) -> str:
+    return sqlparse.format(query, strip_comments=True)
+
+
+def _can_skip_sqlparse(query: str) -> bool:
+    "Whether there's nothing for sqlparse to do except strip trailing whitespace of lines."
+    if "--" in query or "/*" in query or "#" in query or ";" in query or "\r" in query:
+        return False
+    # sqlparse keeps whitespace inside multiline string literals intact, so be conservative about those
+    return all(
+        line.count("'") % 2 == 0 and line.count('"') % 2 == 0 and line.count("`") % 2 == 0 for line in query.split("\n")
+    )
+
+
+def _deserialize(result_bytes: bytes) -> Any:
+    header, payload = result_bytes[:1], result_bytes[1:]
+    if header == _PICKLED:
+        return pickle.loads(payload)
+    if header == _PICKLED_COMPRESSED:
+        return pickle.loads(zlib.decompress(payload))
+
     results = []
     for x in json.loads(result_bytes):
         results.append(tuple(x))
@@ -465,7 +718,14 @@ def _deserialize(result_bytes: bytes) -> List[Tuple]:
 
 
 def _serialize(result: Any) -> bytes:
-    return json.dumps(result).encode("utf-8")
+    """
+    Pickle rather than JSON, so that datetimes, UUIDs and tuples come back as they were returned by clickhouse.
+    Only ever read back from our own redis, same as django's cache which pickles as well.
+    """
+    payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) >= _COMPRESSION_THRESHOLD:
+        return _PICKLED_COMPRESSED + zlib.compress(payload, 1)
+    return _PICKLED + payload
 
 
 def _query_hash(query: str, team_id: int, args: Any) -> str:
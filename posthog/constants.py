@@ -125,6 +125,7 @@ TARGET_ENTITY = "target_entity"
 RETURNING_ENTITY = "returning_entity"
 OFFSET = "offset"
 LIMIT = "limit"
+CURSOR = "cursor"
 PERIOD = "period"
 STICKINESS_DAYS = "stickiness_days"
 FORMULA = "formula"
@@ -152,6 +153,7 @@ FUNNEL_CORRELATION_PROPERTY_VALUES = "funnel_correlation_property_values"
 FUNNEL_CORRELATION_EVENT_NAMES = "funnel_correlation_event_names"
 FUNNEL_CORRELATION_EXCLUDE_EVENT_NAMES = "funnel_correlation_exclude_event_names"
 FUNNEL_CORRELATION_EVENT_EXCLUDE_PROPERTY_NAMES = "funnel_correlation_event_exclude_property_names"
+FUNNEL_CORRELATION_SAMPLE_RATE = "funnel_correlation_sample_rate"
 FUNNEL_CORRELATION_PERSON_ENTITY = "funnel_correlation_person_entity"
 FUNNEL_CORRELATION_PERSON_LIMIT = "funnel_correlation_person_limit"
 FUNNEL_CORRELATION_PERSON_OFFSET = "funnel_correlation_person_offset"
@@ -264,6 +264,24 @@ def get_active_segments_from_event_list(
     return active_recording_segments
 
 
+def merge_active_segments(
+    segments: List[RecordingSegment], activity_threshold_seconds=ACTIVITY_THRESHOLD_SECONDS
+) -> List[RecordingSegment]:
+    """
+    Merges active segments of a single window_id that are less than activity_threshold_seconds apart. Merging the
+    segments of separate batches of events gives the same segments as processing all the events at once.
+    """
+    merged_segments: List[RecordingSegment] = []
+    for segment in sorted(segments, key=lambda segment: segment.start_time):
+        if merged_segments and segment.start_time - merged_segments[-1].end_time <= timedelta(
+            seconds=activity_threshold_seconds
+        ):
+            merged_segments[-1].end_time = max(merged_segments[-1].end_time, segment.end_time)
+        else:
+            merged_segments.append(dataclasses.replace(segment))
+    return merged_segments
+
+
 def generate_inactive_segments_for_range(
     range_start_time: datetime,
     range_end_time: datetime,
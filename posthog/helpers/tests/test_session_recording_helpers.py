@@ -13,6 +13,7 @@ from posthog.helpers.session_recording import (
     generate_inactive_segments_for_range,
     get_active_segments_from_event_list,
     is_active_event,
+    merge_active_segments,
     paginate_list,
     preprocess_session_recording_events_for_clickhouse,
 )
@@ -297,6 +298,40 @@ def test_get_active_segments_from_no_active_events():
     assert active_segments == []
 
 
+def test_merge_active_segments_matches_processing_all_events_at_once():
+    base_time = datetime(2019, 1, 1, tzinfo=timezone.utc)
+    events = [
+        EventActivityData(timestamp=base_time + timedelta(seconds=seconds), is_active=True)
+        for seconds in [0, 5, 30, 38, 45, 100]
+    ]
+
+    all_at_once = get_active_segments_from_event_list(events, window_id="1", activity_threshold_seconds=10)
+    in_batches = merge_active_segments(
+        get_active_segments_from_event_list(events[3:], window_id="1", activity_threshold_seconds=10)
+        + get_active_segments_from_event_list(events[:3], window_id="1", activity_threshold_seconds=10),
+        activity_threshold_seconds=10,
+    )
+
+    assert in_batches == all_at_once
+    assert all_at_once == [
+        RecordingSegment(
+            start_time=base_time, end_time=base_time + timedelta(seconds=5), window_id="1", is_active=True
+        ),
+        RecordingSegment(
+            start_time=base_time + timedelta(seconds=30),
+            end_time=base_time + timedelta(seconds=45),
+            window_id="1",
+            is_active=True,
+        ),
+        RecordingSegment(
+            start_time=base_time + timedelta(seconds=100),
+            end_time=base_time + timedelta(seconds=100),
+            window_id="1",
+            is_active=True,
+        ),
+    ]
+
+
 def test_generate_inactive_segments_for_range():
     base_time = datetime(2019, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     generated_segments = generate_inactive_segments_for_range(
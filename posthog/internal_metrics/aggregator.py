@@ -0,0 +1,144 @@
+"""
+Aggregates internal metrics in-process and captures them as a few summary events per flush interval.
+
+Metrics are recorded from hot paths (e.g. every clickhouse query), so recording only updates an in-memory bucket per
+metric name and tags. A background thread turns every bucket into a single `$$<metric name>` event each
+FLUSH_INTERVAL_SECONDS. The number of buckets and the samples kept per bucket are bounded; metrics that don't fit are
+dropped and counted in statsd.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.utils import timezone
+from sentry_sdk.api import capture_exception
+from statshog.client.base import Tags
+from statshog.defaults.django import statsd
+
+FLUSH_INTERVAL_SECONDS = 60
+MAX_SERIES = 1_000
+# Samples kept per series to estimate percentiles of timings from
+MAX_SAMPLES = 200
+PERCENTILES = (50, 90, 95, 99)
+
+TIMING = "timing"
+GAUGE = "gauge"
+COUNTER = "counter"
+
+SeriesKey = Tuple[str, str, Tuple[Tuple[str, Any], ...]]
+
+
+class _Series:
+    __slots__ = ("count", "sum", "min", "max", "last", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum: float = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+        self.samples: List[float] = []
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+        # Reservoir sampling, every value has the same chance of being kept
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < MAX_SAMPLES:
+                self.samples[index] = value
+
+
+class MetricsAggregator:
+    def __init__(self) -> None:
+        self._series: Dict[SeriesKey, _Series] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+
+    def record(self, kind: str, metric_name: str, value: float, tags: Tags) -> None:
+        try:
+            key: SeriesKey = (kind, metric_name, tuple(sorted((tags or {}).items())))
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    if len(self._series) >= MAX_SERIES:
+                        statsd.incr("internal_metrics_dropped", tags={"metric": metric_name})
+                        return
+                    series = self._series[key] = _Series()
+                series.add(value)
+        except TypeError:
+            # Unhashable tag values
+            statsd.incr("internal_metrics_dropped", tags={"metric": metric_name})
+            return
+
+        self._ensure_flushing()
+
+    def flush(self) -> None:
+        "Captures an event per series recorded since the previous flush"
+        from posthog import utils
+        from posthog.api.capture import capture_internal
+        from posthog.internal_metrics.team import get_internal_metrics_team_id
+
+        with self._lock:
+            series, self._series = self._series, {}
+
+        if not series:
+            return
+
+        try:
+            team_id = get_internal_metrics_team_id()
+            if team_id is None:
+                return
+
+            now = timezone.now()
+            distinct_id = utils.get_machine_id()
+            for (kind, metric_name, tags), values in series.items():
+                event = {"event": f"$${metric_name}", "properties": {**dict(tags), **_summarize(kind, values)}}
+                capture_internal(event, distinct_id, None, None, now, now, team_id)
+        except Exception as err:
+            # Ignore errors, this is not important enough to fail on
+            capture_exception(err)
+
+    def _ensure_flushing(self) -> None:
+        # Threads don't survive forking, so check this is the process that started it
+        if self._flusher_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name="internal-metrics-flush", daemon=True).start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            self.flush()
+
+
+def _summarize(kind: str, series: _Series) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"count": series.count, "sum": series.sum, "min": series.min, "max": series.max}
+    if kind == COUNTER:
+        summary["value"] = series.sum
+    elif kind == GAUGE:
+        summary["value"] = series.last
+    else:
+        summary["value"] = series.sum / series.count
+        samples = sorted(series.samples)
+        for percentile in PERCENTILES:
+            # Nearest-rank percentile
+            summary[f"p{percentile}"] = samples[max(0, -(-percentile * len(samples) // 100) - 1)]
+    return summary
+
+
+aggregator = MetricsAggregator()
+atexit.register(aggregator.flush)
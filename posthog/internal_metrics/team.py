@@ -12,6 +12,8 @@ from posthog.models.insight import Insight
 from posthog.models.sharing_configuration import SharingConfiguration
 
 NAME = "PostHog Internal Metrics"
+# Metrics are captured as one summary event per flush interval (see `posthog.internal_metrics.aggregator`), so e.g. the
+# number of calls is the sum of `count` rather than the number of events
 CLICKHOUSE_DASHBOARD = {
     "name": "ClickHouse internal dashboard",
     "items": [
@@ -25,6 +27,8 @@ CLICKHOUSE_DASHBOARD = {
                         "type": "event",
                         "order": 0,
                         "properties": [{"key": "success", "type": "event", "value": ["true"], "operator": "exact"}],
+                        "math": "sum",
+                        "math_property": "count",
                     },
                     {
                         "id": "$$insight_load_time",
@@ -32,6 +36,8 @@ CLICKHOUSE_DASHBOARD = {
                         "type": "event",
                         "order": 1,
                         "properties": [{"key": "success", "type": "event", "value": ["false"], "operator": "exact"}],
+                        "math": "sum",
+                        "math_property": "count",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -56,21 +62,21 @@ CLICKHOUSE_DASHBOARD = {
                     },
                     {
                         "id": "$$insight_load_time",
-                        "math": "p90",
+                        "math": "avg",
                         "name": "Load time (90th percentile)",
                         "type": "event",
                         "order": 1,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p90",
                     },
                     {
                         "id": "$$insight_load_time",
-                        "math": "p95",
+                        "math": "avg",
                         "name": "Load time (95th percentile)",
                         "type": "event",
                         "order": 2,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p95",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -90,6 +96,8 @@ CLICKHOUSE_DASHBOARD = {
                         "type": "event",
                         "order": 0,
                         "properties": [],
+                        "math": "sum",
+                        "math_property": "value",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -108,7 +116,8 @@ CLICKHOUSE_DASHBOARD = {
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "event",
                         "order": 0,
-                        "math": "total",
+                        "math": "sum",
+                        "math_property": "count",
                     }
                 ],
                 "display": "ActionsLineGraph",
@@ -133,21 +142,21 @@ CLICKHOUSE_DASHBOARD = {
                     },
                     {
                         "id": "$$clickhouse_sync_execution_time",
-                        "math": "p90",
+                        "math": "avg",
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "event",
                         "order": 1,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p90",
                     },
                     {
                         "id": "$$clickhouse_sync_execution_time",
-                        "math": "p95",
+                        "math": "avg",
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "event",
                         "order": 2,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p95",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -168,7 +177,7 @@ CLICKHOUSE_DASHBOARD = {
                         "type": "event",
                         "order": 0,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "sum",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -5,6 +5,7 @@ from django.conf import settings
 from pytest_mock.plugin import MockerFixture
 
 from posthog.internal_metrics import gauge, incr, timing
+from posthog.internal_metrics.aggregator import aggregator
 from posthog.internal_metrics.team import (
     CLICKHOUSE_DASHBOARD,
     NAME,
@@ -20,6 +21,8 @@ def mock_capture_internal(mocker: MockerFixture):
     get_internal_metrics_team_id.cache_clear()
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", True)
     mocker.patch("posthog.utils.get_machine_id", return_value="machine_id")
+    mocker.patch.object(aggregator, "_ensure_flushing")
+    aggregator._series.clear()
     yield mocker.patch("posthog.api.capture.capture_internal")
 
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
@@ -31,8 +34,25 @@ def test_methods_capture_enabled(db, mock_capture_internal):
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
 
+    mock_capture_internal.assert_not_called()
+    aggregator.flush()
+
     mock_capture_internal.assert_any_call(
-        {"event": "$$foo_metric", "properties": {"value": 100, "team_id": 15}},
+        {
+            "event": "$$foo_metric",
+            "properties": {
+                "value": 100,
+                "count": 1,
+                "sum": 100,
+                "min": 100,
+                "max": 100,
+                "p50": 100,
+                "p90": 100,
+                "p95": 100,
+                "p99": 100,
+                "team_id": 15,
+            },
+        },
         "machine_id",
         None,
         None,
@@ -42,7 +62,10 @@ def test_methods_capture_enabled(db, mock_capture_internal):
     )
 
     mock_capture_internal.assert_any_call(
-        {"event": "$$bar_metric", "properties": {"value": 20, "team_id": 15}},
+        {
+            "event": "$$bar_metric",
+            "properties": {"value": 20, "count": 1, "sum": 20, "min": 20, "max": 20, "team_id": 15},
+        },
         "machine_id",
         None,
         None,
@@ -52,7 +75,7 @@ def test_methods_capture_enabled(db, mock_capture_internal):
     )
 
     mock_capture_internal.assert_any_call(
-        {"event": "$$zeta_metric", "properties": {"value": 1}},
+        {"event": "$$zeta_metric", "properties": {"value": 1, "count": 1, "sum": 1, "min": 1, "max": 1}},
         "machine_id",
         None,
         None,
@@ -62,12 +85,66 @@ def test_methods_capture_enabled(db, mock_capture_internal):
     )
 
 
+def test_metrics_are_aggregated_per_name_and_tags(db, mock_capture_internal):
+    for ms in range(1, 101):
+        timing("foo_metric", ms, tags={"kind": "request"})
+    timing("foo_metric", 1000, tags={"kind": "celery"})
+    incr("zeta_metric", 2)
+    incr("zeta_metric", 3)
+    gauge("bar_metric", 20)
+    gauge("bar_metric", 10)
+
+    aggregator.flush()
+
+    events = {
+        (call[0][0]["event"], call[0][0]["properties"].get("kind")): call[0][0]["properties"]
+        for call in mock_capture_internal.call_args_list
+    }
+    assert len(events) == 4
+    assert events[("$$foo_metric", "request")] == {
+        "kind": "request",
+        "value": 50.5,
+        "count": 100,
+        "sum": 5050,
+        "min": 1,
+        "max": 100,
+        "p50": 50,
+        "p90": 90,
+        "p95": 95,
+        "p99": 99,
+    }
+    assert events[("$$foo_metric", "celery")]["count"] == 1
+    assert events[("$$zeta_metric", None)]["value"] == 5
+    assert events[("$$bar_metric", None)]["value"] == 10
+
+    mock_capture_internal.reset_mock()
+    aggregator.flush()
+    mock_capture_internal.assert_not_called()
+
+
+def test_memory_is_bounded(db, mock_capture_internal, mocker: MockerFixture):
+    mocker.patch("posthog.internal_metrics.aggregator.MAX_SERIES", 2)
+    mocker.patch("posthog.internal_metrics.aggregator.MAX_SAMPLES", 10)
+
+    for team_id in range(3):
+        for ms in range(100):
+            timing("foo_metric", ms, tags={"team_id": team_id})
+
+    assert [len(series.samples) for series in aggregator._series.values()] == [10, 10]
+
+    aggregator.flush()
+
+    assert [call[0][0]["properties"]["team_id"] for call in mock_capture_internal.call_args_list] == [0, 1]
+    assert mock_capture_internal.call_args_list[0][0][0]["properties"]["count"] == 100
+
+
 def test_methods_capture_disabled(db, mock_capture_internal, mocker: MockerFixture):
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
 
     timing("foo_metric", 100, tags={"team_id": 15})
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
+    aggregator.flush()
 
     mock_capture_internal.assert_not_called()
 
@@ -1,10 +1,12 @@
 import json
+import time
 from enum import Enum
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import kafka.errors
 from kafka import KafkaConsumer as KC
 from kafka import KafkaProducer as KP
+from statshog.defaults.django import statsd
 from structlog import get_logger
 
 from posthog.client import async_execute, sync_execute
@@ -12,6 +14,9 @@ from posthog.kafka_client import helper
 from posthog.settings import (
     KAFKA_BASE64_KEYS,
     KAFKA_HOSTS,
+    KAFKA_PRODUCE_BATCH_TIMEOUT_SECONDS,
+    KAFKA_PRODUCER_BUFFER_MEMORY_BYTES,
+    KAFKA_PRODUCER_MAX_BLOCK_MS,
     KAFKA_SASL_MECHANISM,
     KAFKA_SASL_PASSWORD,
     KAFKA_SASL_USER,
@@ -25,12 +30,17 @@ KAFKA_PRODUCER_RETRIES = 5
 logger = get_logger(__file__)
 
 
+class TestKafkaFuture:
+    def get(self, timeout: Optional[float] = None):
+        return
+
+
 class TestKafkaProducer:
     def __init__(self):
         pass
 
     def send(self, topic: str, value: Any, key: Any = None, headers: Optional[List[Tuple[str, bytes]]] = None):
-        return
+        return TestKafkaFuture()
 
     def flush(self):
         return
@@ -84,10 +94,17 @@ class _KafkaProducer:
         if test:
             self.producer = TestKafkaProducer()
         elif KAFKA_BASE64_KEYS:
-            self.producer = helper.get_kafka_producer(retries=KAFKA_PRODUCER_RETRIES, value_serializer=lambda d: d)
+            self.producer = helper.get_kafka_producer(
+                retries=KAFKA_PRODUCER_RETRIES,
+                value_serializer=lambda d: d,
+                buffer_memory=KAFKA_PRODUCER_BUFFER_MEMORY_BYTES,
+                max_block_ms=KAFKA_PRODUCER_MAX_BLOCK_MS,
+            )
         else:
             self.producer = KP(
                 retries=KAFKA_PRODUCER_RETRIES,
+                buffer_memory=KAFKA_PRODUCER_BUFFER_MEMORY_BYTES,
+                max_block_ms=KAFKA_PRODUCER_MAX_BLOCK_MS,
                 bootstrap_servers=KAFKA_HOSTS,
                 security_protocol=KAFKA_SECURITY_PROTOCOL or _KafkaSecurityProtocol.PLAINTEXT,
                 **_sasl_params(),
@@ -114,12 +131,56 @@ class _KafkaProducer:
         encoded_headers = (
             [(header[0], header[1].encode("utf-8")) for header in headers] if headers is not None else None
         )
-        self.producer.send(topic, value=b, key=key, headers=encoded_headers)
+        try:
+            return self.producer.send(topic, value=b, key=key, headers=encoded_headers)
+        except kafka.errors.KafkaTimeoutError:
+            # The producer buffer stayed full for `max_block_ms`, i.e. kafka can't keep up with us
+            statsd.incr("kafka_produce_queue_full", tags={"topic": topic})
+            raise
 
     def close(self):
         self.producer.flush()
 
 
+class KafkaProduceBatch:
+    """
+    Produces the messages of one request without waiting on each of them, then waits once for all delivery reports.
+
+    Backpressure comes from the producer buffer (KAFKA_PRODUCER_BUFFER_MEMORY_BYTES): once it's full, `produce`
+    blocks for up to KAFKA_PRODUCER_MAX_BLOCK_MS and then fails.
+    """
+
+    def __init__(self, producer: _KafkaProducer, name: str, timeout: float = KAFKA_PRODUCE_BATCH_TIMEOUT_SECONDS):
+        self.producer = producer
+        self.name = name
+        self.timeout = timeout
+        self.futures: List[Any] = []
+        self.started_at = time.monotonic()
+
+    def produce(self, topic: str, data: Any, **kwargs) -> None:
+        self.futures.append(self.producer.produce(topic=topic, data=data, **kwargs))
+
+    def flush(self) -> None:
+        "Waits for delivery of everything produced so far, raising the first error encountered."
+        futures, self.futures = self.futures, []
+        first_error: Optional[Exception] = None
+        failed = 0
+        deadline = time.monotonic() + self.timeout
+        for future in futures:
+            try:
+                future.get(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                failed += 1
+                first_error = first_error or e
+
+        tags = {"batch": self.name}
+        statsd.timing("kafka_produce_batch_latency_ms", (time.monotonic() - self.started_at) * 1000, tags=tags)
+        statsd.gauge("kafka_produce_batch_size", len(futures), tags=tags)
+        if failed:
+            statsd.incr("kafka_produce_batch_failed_messages", failed, tags=tags)
+            raise first_error  # type: ignore
+
+
 def can_connect():
     """
     This is intended to validate if we are able to connect to kafka, without
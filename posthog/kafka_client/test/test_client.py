@@ -1,9 +1,9 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import kafka
 from django.test import TestCase
 
-from posthog.kafka_client.client import _KafkaProducer, build_kafka_consumer
+from posthog.kafka_client.client import KafkaProduceBatch, _KafkaProducer, build_kafka_consumer
 
 
 class KafkaClientTestCase(TestCase):
@@ -20,6 +20,31 @@ class KafkaClientTestCase(TestCase):
         msg = next(consumer)
         self.assertEqual(msg, "message 1 from test_topic topic")
 
+    def test_kafka_produce_batch(self):
+        producer = _KafkaProducer(test=True)
+        batch = KafkaProduceBatch(producer, name="test")
+
+        batch.produce(topic=self.topic, data=self.payload)
+        batch.produce(topic=self.topic, data=self.payload, key="key")
+        self.assertEqual(len(batch.futures), 2)
+
+        batch.flush()
+        self.assertEqual(batch.futures, [])
+
+    def test_kafka_produce_batch_raises_delivery_errors_on_flush(self):
+        producer = _KafkaProducer(test=True)
+        failed_future = MagicMock()
+        failed_future.get.side_effect = kafka.errors.KafkaTimeoutError()
+        batch = KafkaProduceBatch(producer, name="test")
+
+        with patch.object(producer.producer, "send", return_value=failed_future):
+            batch.produce(topic=self.topic, data=self.payload)
+        batch.produce(topic=self.topic, data=self.payload)
+
+        with self.assertRaises(kafka.errors.KafkaTimeoutError):
+            batch.flush()
+        failed_future.get.assert_called_once()
+
     def test_kafka_produce(self):
         producer = _KafkaProducer(test=False)
         producer.produce(topic=self.topic, data=self.payload)
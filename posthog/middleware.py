@@ -13,6 +13,7 @@ from loginas.utils import is_impersonated_session
 from posthog.api.decide import get_decide
 from posthog.internal_metrics import incr
 from posthog.models import Action, Cohort, Dashboard, FeatureFlag, Insight, Team, User
+from posthog.models.cohort.util import cohort_lookup_scope
 
 from .auth import PersonalAPIKeyAuthentication
 
@@ -171,7 +172,12 @@ class CHQueries(object):
             "id": route_id,
         }
 
-        response: HttpResponse = self.get_response(request)
+        if request.method in ("GET", "HEAD"):
+            # Cohorts are shared by all queries generated for the request, unless it could change them
+            with cohort_lookup_scope():
+                response: HttpResponse = self.get_response(request)
+        else:
+            response = self.get_response(request)
 
         if "api/" in route_id and "capture" not in route_id:
             incr("http_api_request_response", tags={"id": route_id, "status_code": response.status_code})
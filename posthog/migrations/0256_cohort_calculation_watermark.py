@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2022-08-09 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0255_user_prompt_sequence_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cohort", name="calculation_watermark", field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cohort", name="last_full_calculation", field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 3.2.14 on 2022-08-10 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0256_cohort_calculation_watermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cohort", name="last_calculation_duration_ms", field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
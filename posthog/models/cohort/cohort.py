@@ -1,6 +1,7 @@
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Literal, Optional, cast
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Literal, Optional, cast
 
 import structlog
 from django.conf import settings
@@ -19,6 +20,10 @@ from posthog.settings.base_variables import TEST
 
 logger = structlog.get_logger(__name__)
 
+# Persons are ingested with some delay, so incremental calculations also re-evaluate persons changed shortly before the
+# previous calculation started
+CALCULATION_WATERMARK_OVERLAP = timedelta(minutes=10)
+
 DELETE_QUERY = """
 DELETE FROM "posthog_cohortpeople" WHERE "cohort_id" = {cohort_id}
 """
@@ -87,6 +92,10 @@ class Cohort(models.Model):
     is_calculating: models.BooleanField = models.BooleanField(default=False)
     last_calculation: models.DateTimeField = models.DateTimeField(blank=True, null=True)
     errors_calculating: models.IntegerField = models.IntegerField(default=0)
+    # Persons changed after the watermark haven't been re-evaluated yet, see `can_calculate_incrementally`
+    calculation_watermark: models.DateTimeField = models.DateTimeField(blank=True, null=True)
+    last_full_calculation: models.DateTimeField = models.DateTimeField(blank=True, null=True)
+    last_calculation_duration_ms: models.IntegerField = models.IntegerField(blank=True, null=True)
 
     is_static: models.BooleanField = models.BooleanField(default=False)
 
@@ -176,6 +185,18 @@ class Cohort(models.Model):
                 return True
         return False
 
+    @property
+    def can_calculate_incrementally(self) -> bool:
+        """
+        Whether only the persons changed since `calculation_watermark` need re-evaluating. This holds for cohorts
+        matching on person properties alone, up to `COHORT_FULL_RECALCULATION_HOURS` after their last full calculation.
+        """
+        if self.is_static or not self.calculation_watermark or not self.last_full_calculation:
+            return False
+        if self.last_full_calculation < timezone.now() - timedelta(hours=settings.COHORT_FULL_RECALCULATION_HOURS):
+            return False
+        return all(prop.type == "person" for prop in self.properties.flat)
+
     def get_analytics_metadata(self):
         action_groups_count: int = 0
         properties_groups_count: int = 0
@@ -224,15 +245,21 @@ class Cohort(models.Model):
 
             raise err
 
-    def calculate_people_ch(self, pending_version):
+    def calculate_people_ch(self, pending_version, incremental=False):
+        """
+        With `incremental`, only re-evaluates the persons changed since the last calculation if the cohort
+        `can_calculate_incrementally`. Otherwise, or after the filters changed, the cohort is recalculated in full.
+        """
         from posthog.models.cohort.util import recalculate_cohortpeople
         from posthog.tasks.cohorts_in_feature_flag import get_cohort_ids_in_feature_flags
 
         logger.info("cohort_calculation_started", id=self.pk, current_version=self.version, new_version=pending_version)
         start_time = time.monotonic()
+        calculation_started_at = timezone.now()
+        changed_since = self.calculation_watermark if incremental and self.can_calculate_incrementally else None
 
         try:
-            count = recalculate_cohortpeople(self, pending_version)
+            count = recalculate_cohortpeople(self, pending_version, changed_since=changed_since)
 
             # only precalculate if used in feature flag
             ids = get_cohort_ids_in_feature_flags()
@@ -258,17 +285,21 @@ class Cohort(models.Model):
             self.is_calculating = False
             self.save()
 
-        # Update filter to match pending version if still valid
+        duration = time.monotonic() - start_time
+
+        # Update filter to match pending version if still valid. The watermark moves along only then, so that a newer
+        # calculation, e.g. after the filters changed, isn't followed by an incremental one from this one's watermark
         Cohort.objects.filter(pk=self.pk).filter(Q(version__lt=pending_version) | Q(version__isnull=True)).update(
-            version=pending_version, count=count
+            version=pending_version,
+            count=count,
+            last_calculation_duration_ms=int(duration * 1000),
+            calculation_watermark=calculation_started_at - CALCULATION_WATERMARK_OVERLAP,
+            **({} if changed_since else {"last_full_calculation": calculation_started_at}),
         )
         self.refresh_from_db()
 
         logger.info(
-            "cohort_calculation_completed",
-            id=self.pk,
-            version=pending_version,
-            duration=(time.monotonic() - start_time),
+            "cohort_calculation_completed", id=self.pk, version=pending_version, duration=duration,
         )
 
     def insert_users_by_list(self, items: List[str]) -> None:
@@ -315,12 +346,18 @@ class Cohort(models.Model):
             self.save()
             capture_exception(err)
 
-    def insert_users_list_by_uuid(self, items: List[str]) -> None:
+    def insert_users_list_by_uuid(self, items: Iterable[str]) -> None:
+        """
+        Items can be any iterable of uuids, e.g. streamed from clickhouse. Only `batchsize` of them are held at once.
+        """
         batchsize = 1000
         try:
             cursor = connection.cursor()
-            for i in range(0, len(items), batchsize):
-                batch = items[i : i + batchsize]
+            iterator = iter(items)
+            while True:
+                batch = list(islice(iterator, batchsize))
+                if not batch:
+                    break
                 persons_query = (
                     Person.objects.filter(team_id=self.team_id).filter(uuid__in=batch).exclude(cohort__id=self.id)
                 )
@@ -50,6 +50,34 @@ FROM cohortpeople
 WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s AND version < %(new_version)s AND sign = 1
 """
 
+# Like RECALCULATE_COHORT_BY_ID, but only persons in {changed_people} are re-evaluated, the rows of other members are kept
+RECALCULATE_COHORT_CHANGED_PEOPLE_BY_ID = """
+INSERT INTO cohortpeople
+SELECT id, %(cohort_id)s as cohort_id, %(team_id)s as team_id, 1 AS sign, %(new_version)s AS version
+FROM (
+    SELECT id, argMax(properties, person.version) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s AND id IN ({changed_people}) GROUP BY id
+) as person
+WHERE person.is_deleted = 0
+AND id IN ({cohort_filter})
+UNION ALL
+SELECT person_id, cohort_id, team_id, -1, version
+FROM cohortpeople
+WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s AND version < %(new_version)s AND sign = 1
+AND person_id IN ({changed_people})
+"""
+
+GET_PERSON_IDS_CHANGED_SINCE = """
+SELECT DISTINCT id FROM person WHERE team_id = %(team_id)s AND _timestamp > %(changed_since)s
+"""
+
+# When each team last ingested events with timestamps after %(since)s, or persons
+GET_LAST_INGESTED_AT_BY_TEAM = """
+SELECT team_id, max(_timestamp) FROM events
+WHERE team_id IN %(team_ids)s AND timestamp > %(since)s AND _timestamp >= %(ingested_since)s GROUP BY team_id
+UNION ALL
+SELECT team_id, max(_timestamp) FROM person WHERE team_id IN %(team_ids)s AND _timestamp >= %(ingested_since)s GROUP BY team_id
+"""
+
 GET_DISTINCT_ID_BY_ENTITY_SQL = """
 SELECT distinct_id FROM events WHERE team_id = %(team_id)s {date_query} AND {entity_query}
 """
@@ -1,6 +1,8 @@
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import structlog
 from dateutil import parser
@@ -20,8 +22,10 @@ from posthog.models.cohort.sql import (
     GET_DISTINCT_ID_BY_ENTITY_SQL,
     GET_PERSON_ID_BY_ENTITY_COUNT_SQL,
     GET_PERSON_ID_BY_PRECALCULATED_COHORT_ID,
+    GET_PERSON_IDS_CHANGED_SINCE,
     GET_STATIC_COHORTPEOPLE_BY_PERSON_UUID,
     RECALCULATE_COHORT_BY_ID,
+    RECALCULATE_COHORT_CHANGED_PEOPLE_BY_ID,
 )
 from posthog.models.person.sql import GET_PERSON_IDS_BY_FILTER, INSERT_PERSON_STATIC_COHORT, PERSON_STATIC_COHORT_TABLE
 from posthog.models.property import Property, PropertyGroup
@@ -33,6 +37,72 @@ TEMP_PRECALCULATED_MARKER = parser.parse("2021-06-07T15:00:00+00:00")
 logger = structlog.get_logger(__name__)
 
 
+# Cohorts looked up by id in the current `cohort_lookup_scope`, `None` for ids without a cohort
+_scoped_cohorts: ContextVar[Optional[Dict[int, Optional[Cohort]]]] = ContextVar("scoped_cohorts", default=None)
+
+
+@contextmanager
+def cohort_lookup_scope() -> Iterator[None]:
+    """
+    Shares the cohorts looked up with `get_cohort` until exiting, e.g. for the duration of a request.
+
+    Cohorts are loaded along with all the cohorts they refer to, one query per level of nesting, so generating the SQL
+    of a filter takes a few queries however many cohorts it refers to.
+    """
+    if _scoped_cohorts.get() is not None:
+        yield
+        return
+
+    token = _scoped_cohorts.set({})
+    try:
+        yield
+    finally:
+        _scoped_cohorts.reset(token)
+
+
+def get_cohort(cohort_id: Union[int, str], team_id: Optional[int] = None) -> Cohort:
+    "Same as `Cohort.objects.get(pk=cohort_id, team_id=team_id)`, reusing cohorts loaded in the `cohort_lookup_scope`"
+    scoped_cohorts = _scoped_cohorts.get()
+    if scoped_cohorts is None:
+        if team_id is None:
+            return Cohort.objects.get(pk=cohort_id)
+        return Cohort.objects.get(pk=cohort_id, team_id=team_id)
+
+    prefetch_cohorts([cohort_id])
+    cohort = scoped_cohorts.get(_to_cohort_pk(cohort_id))  # type: ignore
+    if cohort is None or (team_id is not None and cohort.team_id != team_id):
+        raise Cohort.DoesNotExist(f"Cohort {cohort_id} does not exist")
+    return cohort
+
+
+def prefetch_cohorts(cohort_ids: Iterable[Any]) -> None:
+    "Loads the given cohorts and all the cohorts they refer to into the `cohort_lookup_scope`, if in one"
+    scoped_cohorts = _scoped_cohorts.get()
+    if scoped_cohorts is None:
+        return
+
+    pending = {pk for pk in map(_to_cohort_pk, cohort_ids) if pk is not None and pk not in scoped_cohorts}
+    while pending:
+        for pk in pending:
+            scoped_cohorts[pk] = None
+
+        referenced_pks = set()
+        for cohort in Cohort.objects.filter(pk__in=pending).select_related("team"):
+            scoped_cohorts[cohort.pk] = cohort
+            for prop in cohort.properties.flat:
+                if prop.type == "cohort":
+                    referenced_pks.add(_to_cohort_pk(prop.value))
+
+        pending = {pk for pk in referenced_pks if pk is not None and pk not in scoped_cohorts}
+
+
+def _to_cohort_pk(cohort_id: Any) -> Optional[int]:
+    try:
+        return int(cohort_id)
+    except (TypeError, ValueError):
+        return None
+
+
 def format_person_query(
     cohort: Cohort, index: int, *, custom_match_field: str = "person_id"
 ) -> Tuple[str, Dict[str, Any]]:
@@ -84,7 +154,7 @@ def get_properties_cohort_subquery(cohort: Cohort, cohort_group: Dict, group_idx
     for idx, prop in enumerate(filter.property_groups.flat):
         if prop.type == "cohort":
             try:
-                prop_cohort: Cohort = Cohort.objects.get(pk=prop.value, team_id=cohort.team_id)
+                prop_cohort: Cohort = get_cohort(prop.value, team_id=cohort.team_id)
             except Cohort.DoesNotExist:
                 return "0 = 14", {}
             if prop_cohort.pk == cohort.pk:
@@ -282,7 +352,13 @@ def insert_static_cohort(person_uuids: List[Optional[uuid.UUID]], cohort_id: int
     sync_execute(INSERT_PERSON_STATIC_COHORT, persons)
 
 
-def recalculate_cohortpeople(cohort: Cohort, pending_version: int) -> Optional[int]:
+def recalculate_cohortpeople(
+    cohort: Cohort, pending_version: int, changed_since: Optional[datetime] = None
+) -> Optional[int]:
+    """
+    Recalculates the members of the cohort as `pending_version`. With `changed_since`, only persons changed since then
+    are re-evaluated, which is only correct for cohorts that `can_calculate_incrementally`.
+    """
 
     cohort_filter, cohort_params = format_person_query(cohort, 0, custom_match_field="id")
 
@@ -294,20 +370,32 @@ def recalculate_cohortpeople(cohort: Cohort, pending_version: int) -> Optional[i
             team_id=cohort.team_id,
             cohort_id=cohort.pk,
             size_before=before_count,
+            incremental=changed_since is not None,
         )
 
     cohort_filter = GET_PERSON_IDS_BY_FILTER.format(
         distinct_query="AND " + cohort_filter,
-        query="",
+        query=f"AND person.id IN ({GET_PERSON_IDS_CHANGED_SINCE})" if changed_since else "",
         offset="",
         limit="",
         GET_TEAM_PERSON_DISTINCT_IDS=get_team_distinct_ids_query(cohort.team_id),
     )
 
-    recalcluate_cohortpeople_sql = RECALCULATE_COHORT_BY_ID.format(cohort_filter=cohort_filter)
+    if changed_since:
+        recalcluate_cohortpeople_sql = RECALCULATE_COHORT_CHANGED_PEOPLE_BY_ID.format(
+            cohort_filter=cohort_filter, changed_people=GET_PERSON_IDS_CHANGED_SINCE
+        )
+    else:
+        recalcluate_cohortpeople_sql = RECALCULATE_COHORT_BY_ID.format(cohort_filter=cohort_filter)
     sync_execute(
         recalcluate_cohortpeople_sql,
-        {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id, "new_version": pending_version,},
+        {
+            **cohort_params,
+            "cohort_id": cohort.pk,
+            "team_id": cohort.team_id,
+            "new_version": pending_version,
+            "changed_since": changed_since,
+        },
     )
 
     count = get_cohort_size(cohort.pk, cohort.team_id)
@@ -319,6 +407,7 @@ def recalculate_cohortpeople(cohort: Cohort, pending_version: int) -> Optional[i
             cohort_id=cohort.pk,
             size_before=before_count,
             size=count,
+            incremental=changed_since is not None,
         )
 
     return count
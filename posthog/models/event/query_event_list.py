@@ -1,18 +1,22 @@
 import json
 from datetime import timedelta
-from typing import Dict, List, Optional, Tuple, Union
+from itertools import islice
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
 
 from dateutil.parser import isoparse
+from django.db.models.query import Prefetch
 from django.utils.timezone import now
 
 from posthog.api.utils import get_pk_or_uuid
-from posthog.client import query_with_columns
+from posthog.client import query_with_columns, stream_query_with_columns
 from posthog.models import Action, Filter, Person, Team
 from posthog.models.action.util import format_action_filter
 from posthog.models.event.sql import (
     SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL,
     SELECT_EVENT_BY_TEAM_AND_CONDITIONS_SQL,
 )
+from posthog.models.event.util import ClickhouseEventSerializer
+from posthog.models.person.util import get_persons_by_distinct_ids
 from posthog.models.property.util import parse_prop_grouped_clauses
 
 
@@ -46,6 +50,16 @@ def determine_event_conditions(
     return result, params
 
 
+# Time windows scanned back from `before` in turn by `query_events_list_in_windows`, before scanning all history
+EVENTS_LIST_SCAN_WINDOWS = [
+    timedelta(hours=1),
+    timedelta(days=1),
+    timedelta(days=7),
+    timedelta(days=30),
+    timedelta(days=365),
+]
+
+
 def query_events_list(
     filter: Filter,
     team: Team,
@@ -55,19 +69,102 @@ def query_events_list(
     long_date_from: bool = False,
     limit: int = 100,
 ) -> List:
-    limit += 1
-    limit_sql = "LIMIT %(limit)s"
-    order = "DESC" if order_by[0] == "-timestamp" else "ASC"
+    filters = _get_filters(filter, team, action_id)
+    if filters is None:
+        return []
+    return _query_events(team, filters, request_get_query_dict, order_by, long_date_from, limit)
 
-    conditions, condition_params = determine_event_conditions(
-        team,
-        {
-            "after": (now() - timedelta(days=1)).isoformat(),
-            "before": (now() + timedelta(seconds=5)).isoformat(),
-            **request_get_query_dict,
-        },
-        long_date_from,
+
+def query_events_list_in_windows(
+    filter: Filter,
+    team: Team,
+    request_get_query_dict: Dict,
+    action_id: Optional[str],
+    limit: int = 100,
+    scan_window: int = 0,
+) -> Tuple[List, int]:
+    """
+    Queries the latest events in growing time windows going back from `before`, stopping as soon as `limit` events are
+    found, so that filters matching few events don't scan the team's whole history for every page.
+
+    Every window only scans the time not covered by the previous ones. Returns the events, and the index of the window
+    scanning stopped at, for the next page to start from.
+    """
+    filters = _get_filters(filter, team, action_id)
+    if filters is None:
+        return [], scan_window
+
+    before = (
+        isoparse(request_get_query_dict["before"])
+        if request_get_query_dict.get("before")
+        else now() + timedelta(seconds=5)
     )
+    scan_window = max(0, min(scan_window, len(EVENTS_LIST_SCAN_WINDOWS)))
+
+    results: List = []
+    window_end = before
+    for index in range(scan_window, len(EVENTS_LIST_SCAN_WINDOWS) + 1):
+        conditions = {**request_get_query_dict, "before": window_end.isoformat()}
+        long_date_from = index == len(EVENTS_LIST_SCAN_WINDOWS)
+        if not long_date_from:
+            window_start = before - EVENTS_LIST_SCAN_WINDOWS[index]
+            conditions["after"] = window_start.isoformat()
+            # Both bounds are exclusive, so the next window includes events right at the start of this one
+            window_end = window_start + timedelta(microseconds=1)
+
+        results += _query_events(team, filters, conditions, ["-timestamp"], long_date_from, limit - len(results))
+        if len(results) > limit:
+            return results, index
+
+    return results, len(EVENTS_LIST_SCAN_WINDOWS)
+
+
+def stream_serialized_events(
+    filter: Filter,
+    team: Team,
+    request_get_query_dict: Dict,
+    order_by: List[str],
+    action_id: Optional[str],
+    batch_size: int = 1000,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Like query_events_list, but for all events rather than a page of them, serialized as the events API does. Events
+    are read from clickhouse as a stream and serialized `batch_size` at a time, so memory use doesn't depend on how
+    many events there are. Closing the generator stops reading the rest of the result.
+    """
+    filters = _get_filters(filter, team, action_id)
+    if filters is None:
+        return
+
+    query, params = _get_events_query(
+        team, filters, request_get_query_dict, order_by, not request_get_query_dict.get("after"), None
+    )
+    rows = stream_query_with_columns(query, params)
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            yield from ClickhouseEventSerializer(
+                batch, many=True, context={"people": get_events_people(batch, team)}
+            ).data
+    finally:
+        rows.close()
+
+
+def get_events_people(events: List[Dict], team: Team) -> Dict[str, Person]:
+    "Returns the persons of the events by distinct id, for `ClickhouseEventSerializer`"
+    persons = get_persons_by_distinct_ids(team.pk, [event["distinct_id"] for event in events])
+    persons = persons.prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
+    distinct_to_person: Dict[str, Person] = {}
+    for person in persons:
+        for distinct_id in person.distinct_ids:
+            distinct_to_person[distinct_id] = person
+    return distinct_to_person
+
+
+def _get_filters(filter: Filter, team: Team, action_id: Optional[str]) -> Optional[Tuple[str, Dict]]:
+    "Returns the property and action filters for the events, or `None` if no events can match"
     prop_filters, prop_filter_params = parse_prop_grouped_clauses(
         team_id=team.pk, property_group=filter.property_groups, has_person_id_joined=False
     )
@@ -76,24 +173,62 @@ def query_events_list(
         try:
             action = Action.objects.get(pk=action_id, team_id=team.pk)
         except Action.DoesNotExist:
-            return []
+            return None
         if action.steps.count() == 0:
-            return []
+            return None
 
         # NOTE: never accepts cohort parameters so no need for explicit person_id_joined_alias
         action_query, params = format_action_filter(team_id=team.pk, action=action)
         prop_filters += " AND {}".format(action_query)
         prop_filter_params = {**prop_filter_params, **params}
 
+    return prop_filters, prop_filter_params
+
+
+def _query_events(
+    team: Team,
+    filters: Tuple[str, Dict],
+    request_get_query_dict: Dict,
+    order_by: List[str],
+    long_date_from: bool,
+    limit: int,
+) -> List:
+    query, params = _get_events_query(team, filters, request_get_query_dict, order_by, long_date_from, limit + 1)
+    return query_with_columns(query, params)
+
+
+def _get_events_query(
+    team: Team,
+    filters: Tuple[str, Dict],
+    request_get_query_dict: Dict,
+    order_by: List[str],
+    long_date_from: bool,
+    limit: Optional[int],
+) -> Tuple[str, Dict]:
+    "Returns the query for the events, and its params. All of them without a `limit`."
+    limit_sql = "LIMIT %(limit)s" if limit is not None else ""
+    order = "DESC" if order_by[0] == "-timestamp" else "ASC"
+
+    conditions, condition_params = determine_event_conditions(
+        team,
+        {
+            "after": (now() - timedelta(days=1)).isoformat(),
+            "before": (now() + timedelta(seconds=5)).isoformat(),
+            **request_get_query_dict,
+        },
+        long_date_from,
+    )
+    prop_filters, prop_filter_params = filters
+
     if prop_filters != "":
-        return query_with_columns(
+        return (
             SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL.format(
                 conditions=conditions, limit=limit_sql, filters=prop_filters, order=order
             ),
             {"team_id": team.pk, "limit": limit, **condition_params, **prop_filter_params},
         )
     else:
-        return query_with_columns(
+        return (
             SELECT_EVENT_BY_TEAM_AND_CONDITIONS_SQL.format(conditions=conditions, limit=limit_sql, order=order),
             {"team_id": team.pk, "limit": limit, **condition_params},
         )
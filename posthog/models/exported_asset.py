@@ -1,6 +1,6 @@
 import secrets
 from datetime import timedelta
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional
 
 import structlog
 from django.conf import settings
@@ -131,12 +131,40 @@ def save_content(exported_asset: ExportedAsset, content: bytes) -> None:
         save_content_to_exported_asset(exported_asset, content)
 
 
+def save_content_parts(exported_asset: ExportedAsset, get_content_parts: Callable[[], Iterable[bytes]]) -> None:
+    """
+    Like `save_content`, for content too large to hold in memory. It's written to object storage part by part when
+    enabled. `get_content_parts` may be called again to save the content to the asset if that fails.
+    """
+    try:
+        if settings.OBJECT_STORAGE_ENABLED:
+            object_path = _object_storage_path(exported_asset)
+            object_storage.write_parts(object_path, get_content_parts())
+            exported_asset.content_location = object_path
+            exported_asset.save(update_fields=["content_location"])
+        else:
+            save_content_to_exported_asset(exported_asset, b"".join(get_content_parts()))
+    except ObjectStorageError as ose:
+        capture_exception(ose)
+        logger.error(
+            "exported_asset.object-storage-error", exported_asset_id=exported_asset.id, exception=ose, exc_info=True
+        )
+        save_content_to_exported_asset(exported_asset, b"".join(get_content_parts()))
+
+
 def save_content_to_exported_asset(exported_asset: ExportedAsset, content: bytes) -> None:
     exported_asset.content = content
     exported_asset.save(update_fields=["content"])
 
 
 def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes) -> None:
+    object_path = _object_storage_path(exported_asset)
+    object_storage.write(object_path, content)
+    exported_asset.content_location = object_path
+    exported_asset.save(update_fields=["content_location"])
+
+
+def _object_storage_path(exported_asset: ExportedAsset) -> str:
     path_parts: List[str] = [
         settings.OBJECT_STORAGE_EXPORTS_FOLDER,
         exported_asset.export_format.split("/")[1],
@@ -144,7 +172,4 @@ def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes
         f"task-{exported_asset.id}",
         str(UUIDT()),
     ]
-    object_path = f'/{"/".join(path_parts)}'
-    object_storage.write(object_path, content)
-    exported_asset.content_location = object_path
-    exported_asset.save(update_fields=["content_location"])
+    return f'/{"/".join(path_parts)}'
@@ -1,14 +1,18 @@
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
+from django.conf import settings
 from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.expressions import ExpressionWrapper, RawSQL
 from django.db.models.fields import BooleanField
 from django.db.models.query import QuerySet
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
 
@@ -21,12 +25,15 @@ from posthog.models.property import GroupTypeIndex, GroupTypeName
 from posthog.models.property.property import Property
 from posthog.models.signals import mutable_receiver
 from posthog.queries.base import match_property, properties_to_Q
+from posthog.redis import get_client
 
 from .filters import Filter
 from .person import Person, PersonDistinctId
 
 __LONG_SCALE__ = float(0xFFFFFFFFFFFFFFF)
 
+FEATURE_FLAGS_VERSION_KEY = "feature_flags_version:{team_id}"
+
 
 @dataclass(frozen=True)
 class FeatureFlagMatch:
@@ -128,6 +135,12 @@ class FeatureFlag(models.Model):
 @mutable_receiver(pre_delete, sender=Experiment)
 def delete_experiment_flags(sender, instance, **kwargs):
     FeatureFlag.objects.filter(experiment=instance).update(deleted=True)
+    invalidate_flag_set(instance.team_id)
+
+
+@mutable_receiver([post_save, post_delete], sender=FeatureFlag)
+def feature_flag_changed(sender, instance, **kwargs):
+    invalidate_flag_set(instance.team_id)
 
 
 class FeatureFlagHashKeyOverride(models.Model):
@@ -149,6 +162,170 @@ class FeatureFlagHashKeyOverride(models.Model):
     hash_key: models.CharField = models.CharField(max_length=400)
 
 
+@dataclass(frozen=True)
+class CompiledCondition:
+    properties: Tuple[Property, ...]
+    rollout_threshold: Optional[float]
+
+
+@dataclass(frozen=True)
+class CompiledFeatureFlag:
+    """
+    The parts of a feature flag that don't depend on who is being matched, parsed once instead of on every match.
+    """
+
+    conditions: Tuple[CompiledCondition, ...]
+    # Contiguous sub-domains within [0, 1], see FeatureFlagMatcher.variant_lookup_table
+    variant_lookup_table: Tuple[Dict, ...]
+
+    @classmethod
+    def from_feature_flag(cls, feature_flag: FeatureFlag) -> "CompiledFeatureFlag":
+        conditions = []
+        for condition in feature_flag.conditions:
+            properties: Tuple[Property, ...] = ()
+            if len(condition.get("properties", [])) > 0:
+                properties = tuple(Filter(data=condition).property_groups.flat)
+            rollout_percentage = condition.get("rollout_percentage")
+            conditions.append(
+                CompiledCondition(
+                    properties=properties,
+                    rollout_threshold=rollout_percentage / 100 if rollout_percentage is not None else None,
+                )
+            )
+
+        lookup_table = []
+        value_min = 0
+        for variant in feature_flag.variants:
+            value_max = value_min + variant["rollout_percentage"] / 100
+            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
+            value_min = value_max
+
+        return cls(conditions=tuple(conditions), variant_lookup_table=tuple(lookup_table))
+
+
+@dataclass(frozen=True)
+class CompiledFlagSet:
+    """
+    Snapshot of all active flags of a team, as of `version`. Shared between requests, so treat it as read-only.
+    """
+
+    team_id: int
+    version: Optional[str]
+    loaded_at: float
+    feature_flags: Tuple[FeatureFlag, ...]
+    compiled_flags: Dict[int, CompiledFeatureFlag]
+
+    @property
+    def has_experience_continuity(self) -> bool:
+        return any(feature_flag.ensure_experience_continuity for feature_flag in self.feature_flags)
+
+
+class _FlagSetCache:
+    "Process-local LRU of compiled flag sets, keyed by team_id."
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, CompiledFlagSet]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, team_id: int, version: str) -> Optional[CompiledFlagSet]:
+        with self._lock:
+            flag_set = self._entries.get(team_id)
+            if flag_set is None:
+                return None
+            if (
+                flag_set.version != version
+                or time.monotonic() - flag_set.loaded_at > settings.DECIDE_FLAG_SET_CACHE_MAX_AGE_SECONDS
+            ):
+                del self._entries[team_id]
+                return None
+            self._entries.move_to_end(team_id)
+            return flag_set
+
+    def set(self, flag_set: CompiledFlagSet) -> None:
+        with self._lock:
+            self._entries[flag_set.team_id] = flag_set
+            self._entries.move_to_end(flag_set.team_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+flag_set_cache = _FlagSetCache(max_size=settings.DECIDE_FLAG_SET_CACHE_SIZE)
+
+
+def get_flag_set_version(team_id: int) -> str:
+    client = get_client()
+    key = FEATURE_FLAGS_VERSION_KEY.format(team_id=team_id)
+    version = client.get(key)
+    if version is None:
+        # :TRICKY: Seed with the current time rather than 0, so that a flushed redis can't resurrect a version
+        # some worker still has a stale snapshot for.
+        client.set(key, time.time_ns(), nx=True)
+        version = client.get(key)
+    return version.decode("utf-8") if isinstance(version, bytes) else str(version)
+
+
+def invalidate_flag_set(team_id: int) -> None:
+    def _bump_version():
+        try:
+            get_client().incr(FEATURE_FLAGS_VERSION_KEY.format(team_id=team_id))
+        except Exception as err:
+            # Snapshots also expire after DECIDE_FLAG_SET_CACHE_MAX_AGE_SECONDS, so this only delays the update
+            capture_exception(err)
+
+    # Bump only once the change is visible to other workers, otherwise they could cache the old flags
+    # under the new version.
+    transaction.on_commit(_bump_version)
+
+
+def _load_flag_set(team_id: int, version: Optional[str]) -> CompiledFlagSet:
+    feature_flags = tuple(
+        FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
+            "id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity"
+        )
+    )
+    compiled_flags = {}
+    for feature_flag in feature_flags:
+        try:
+            compiled_flags[feature_flag.pk] = CompiledFeatureFlag.from_feature_flag(feature_flag)
+        except Exception as err:
+            # The matcher compiles this flag again at match time and handles the error per flag
+            capture_exception(err)
+    return CompiledFlagSet(
+        team_id=team_id,
+        version=version,
+        loaded_at=time.monotonic(),
+        feature_flags=feature_flags,
+        compiled_flags=compiled_flags,
+    )
+
+
+def get_compiled_flag_set(team_id: int) -> CompiledFlagSet:
+    if not settings.DECIDE_FLAG_SET_CACHE_ENABLED:
+        return _load_flag_set(team_id, None)
+
+    try:
+        version: Optional[str] = get_flag_set_version(team_id)
+    except Exception as err:
+        # Redis being down shouldn't take /decide with it, fall back to postgres
+        capture_exception(err)
+        version = None
+
+    if version is not None:
+        flag_set = flag_set_cache.get(team_id, version)
+        if flag_set is not None:
+            return flag_set
+
+    flag_set = _load_flag_set(team_id, version)
+    if version is not None:
+        flag_set_cache.set(flag_set)
+    return flag_set
+
+
 class FlagsMatcherCache:
     def __init__(self, team_id: int):
         self.team_id = team_id
@@ -172,6 +349,8 @@ class FeatureFlagMatcher:
         cache: Optional[FlagsMatcherCache] = None,
         hash_key_overrides: Dict[str, str] = {},
         property_value_overrides: Dict[str, str] = {},
+        compiled_flags: Dict[int, CompiledFeatureFlag] = {},
+        precomputed_conditions: Optional[Dict[str, bool]] = None,
     ):
         self.feature_flags = feature_flags
         self.distinct_id = distinct_id
@@ -179,6 +358,10 @@ class FeatureFlagMatcher:
         self.cache = cache or FlagsMatcherCache(self.feature_flags[0].team_id)
         self.hash_key_overrides = hash_key_overrides
         self.property_value_overrides = property_value_overrides
+        # :TRICKY: Copied, as the passed in mapping can be shared between requests
+        self.compiled_flags = {**compiled_flags}
+        # Condition results already resolved in bulk, see get_active_feature_flags_for_distinct_ids
+        self.precomputed_conditions = precomputed_conditions
 
     def get_match(self, feature_flag: FeatureFlag) -> Optional[FeatureFlagMatch]:
         # If aggregating flag by groups and relevant group type is not passed - flag is off!
@@ -205,19 +388,29 @@ class FeatureFlagMatcher:
                 capture_exception(err)
         return flags_enabled
 
+    def get_compiled(self, feature_flag: FeatureFlag) -> CompiledFeatureFlag:
+        compiled = self.compiled_flags.get(feature_flag.pk)
+        if compiled is None:
+            compiled = CompiledFeatureFlag.from_feature_flag(feature_flag)
+            self.compiled_flags[feature_flag.pk] = compiled
+        return compiled
+
     def get_matching_variant(self, feature_flag: FeatureFlag) -> Optional[str]:
-        for variant in self.variant_lookup_table(feature_flag):
-            if (
-                self.get_hash(feature_flag, salt="variant") >= variant["value_min"]
-                and self.get_hash(feature_flag, salt="variant") < variant["value_max"]
-            ):
+        lookup_table = self.variant_lookup_table(feature_flag)
+        if not lookup_table:
+            return None
+
+        variant_hash = self.get_hash(feature_flag, salt="variant")
+        for variant in lookup_table:
+            if variant_hash >= variant["value_min"] and variant_hash < variant["value_max"]:
                 return variant["key"]
         return None
 
     def is_condition_match(self, feature_flag: FeatureFlag, condition: Dict, condition_index: int):
-        rollout_percentage = condition.get("rollout_percentage")
-        if len(condition.get("properties", [])) > 0:
-            properties = Filter(data=condition).property_groups.flat
+        compiled_condition = self.get_compiled(feature_flag).conditions[condition_index]
+        rollout_threshold = compiled_condition.rollout_threshold
+        if len(compiled_condition.properties) > 0:
+            properties = list(compiled_condition.properties)
             if self.can_compute_locally(properties):
                 # :TRICKY: If overrides are enough to determine if a condition is a match,
                 # we can skip checking the query.
@@ -230,29 +423,24 @@ class FeatureFlagMatcher:
 
             if not condition_match:
                 return False
-            elif rollout_percentage is None:
+            elif rollout_threshold is None:
                 return True
 
-        if rollout_percentage is not None and self.get_hash(feature_flag) > (rollout_percentage / 100):
+        if rollout_threshold is not None and self.get_hash(feature_flag) > rollout_threshold:
             return False
 
         return True
 
     def _condition_matches(self, feature_flag: FeatureFlag, condition_index: int) -> bool:
-        return self.query_conditions.get(f"flag_{feature_flag.pk}_condition_{condition_index}", False)
+        conditions = self.precomputed_conditions if self.precomputed_conditions is not None else self.query_conditions
+        return conditions.get(f"flag_{feature_flag.pk}_condition_{condition_index}", False)
 
     # Define contiguous sub-domains within [0, 1].
     # By looking up a random hash value, you can find the associated variant key.
     # e.g. the first of two variants with 50% rollout percentage will have value_max: 0.5
     # and the second will have value_min: 0.5 and value_max: 1.0
     def variant_lookup_table(self, feature_flag: FeatureFlag):
-        lookup_table = []
-        value_min = 0
-        for variant in feature_flag.variants:
-            value_max = value_min + variant["rollout_percentage"] / 100
-            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
-            value_min = value_max
-        return lookup_table
+        return list(self.get_compiled(feature_flag).variant_lookup_table)
 
     @cached_property
     def query_conditions(self) -> Dict[str, bool]:
@@ -265,13 +453,13 @@ class FeatureFlagMatcher:
         group_fields = []
 
         for feature_flag in self.feature_flags:
-            for index, condition in enumerate(feature_flag.conditions):
+            for index, compiled_condition in enumerate(self.get_compiled(feature_flag).conditions):
                 key = f"flag_{feature_flag.pk}_condition_{index}"
                 expr: Any = None
-                if len(condition.get("properties", {})) > 0:
+                if len(compiled_condition.properties) > 0:
                     # Feature Flags don't support OR filtering yet
                     expr = properties_to_Q(
-                        Filter(data=condition).property_groups.flat,
+                        list(compiled_condition.properties),
                         team_id=team_id,
                         is_direct_query=True,
                         override_property_values=self.property_value_overrides,
@@ -362,6 +550,7 @@ def _get_active_feature_flags(
     person_id: Optional[int] = None,
     groups: Dict[GroupTypeName, str] = {},
     property_value_overrides: Dict[str, str] = {},
+    compiled_flags: Dict[int, CompiledFeatureFlag] = {},
 ) -> Dict[str, Union[bool, str]]:
     cache = FlagsMatcherCache(team_id)
 
@@ -372,7 +561,7 @@ def _get_active_feature_flags(
 
     if feature_flags:
         return FeatureFlagMatcher(
-            feature_flags, distinct_id, groups, cache, overrides, property_value_overrides
+            feature_flags, distinct_id, groups, cache, overrides, property_value_overrides, compiled_flags
         ).get_matches()
 
     return {}
@@ -387,21 +576,17 @@ def get_active_feature_flags(
     property_value_overrides: Dict[str, str] = {},
 ) -> Dict[str, Union[bool, str]]:
 
-    all_feature_flags = FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
-        "id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity"
-    )
+    flag_set = get_compiled_flag_set(team_id)
+    all_feature_flags = list(flag_set.feature_flags)
 
-    flags_have_experience_continuity_enabled = any(
-        feature_flag.ensure_experience_continuity for feature_flag in all_feature_flags
-    )
-
-    if not flags_have_experience_continuity_enabled:
+    if not flag_set.has_experience_continuity:
         return _get_active_feature_flags(
-            list(all_feature_flags),
+            all_feature_flags,
             team_id,
             distinct_id,
             groups=groups,
             property_value_overrides=property_value_overrides,
+            compiled_flags=flag_set.compiled_flags,
         )
 
     person_id = (
@@ -437,17 +622,112 @@ def get_active_feature_flags(
     # We can optimise by not going down this path when person_id doesn't exist, or
     # no flags have experience continuity enabled
     return _get_active_feature_flags(
-        list(all_feature_flags),
+        all_feature_flags,
         team_id,
         distinct_id,
         person_id,
         groups=groups,
         property_value_overrides=property_value_overrides,
+        compiled_flags=flag_set.compiled_flags,
+    )
+
+
+def get_active_feature_flags_for_distinct_ids(
+    team_id: int, distinct_ids: Iterable[str]
+) -> Dict[str, Dict[str, Union[bool, str]]]:
+    """
+    Batch version of get_active_feature_flags, for when many distinct_ids of one team need their flags at once
+    (e.g. a capture batch). Flags are loaded once and person conditions are resolved for everyone in one query.
+
+    No groups are passed in, so flags aggregated by groups are always off, same as get_active_feature_flags without groups.
+    """
+    distinct_ids = list(dict.fromkeys(distinct_ids))
+    if not distinct_ids:
+        return {}
+
+    flag_set = get_compiled_flag_set(team_id)
+    if not flag_set.feature_flags:
+        return {distinct_id: {} for distinct_id in distinct_ids}
+
+    feature_flags = list(flag_set.feature_flags)
+    cache = FlagsMatcherCache(team_id)
+    conditions_by_distinct_id = _batch_person_query_conditions(
+        team_id, feature_flags, flag_set.compiled_flags, distinct_ids
     )
 
+    overrides_by_distinct_id: Dict[str, Dict[str, str]] = {}
+    if flag_set.has_experience_continuity:
+        person_ids_by_distinct_id = dict(
+            PersonDistinctId.objects.filter(distinct_id__in=distinct_ids, team_id=team_id).values_list(
+                "distinct_id", "person_id"
+            )
+        )
+        overrides_by_person_id: Dict[int, Dict[str, str]] = {}
+        for person_id, feature_flag_key, hash_key in FeatureFlagHashKeyOverride.objects.filter(
+            person_id__in=set(person_ids_by_distinct_id.values()), team=team_id
+        ).values_list("person_id", "feature_flag_key", "hash_key"):
+            overrides_by_person_id.setdefault(person_id, {})[feature_flag_key] = hash_key
+        for distinct_id, person_id in person_ids_by_distinct_id.items():
+            overrides_by_distinct_id[distinct_id] = overrides_by_person_id.get(person_id, {})
+
+    return {
+        distinct_id: FeatureFlagMatcher(
+            feature_flags,
+            distinct_id,
+            {},
+            cache,
+            overrides_by_distinct_id.get(distinct_id, {}),
+            {},
+            flag_set.compiled_flags,
+            precomputed_conditions=conditions_by_distinct_id.get(distinct_id, {}),
+        ).get_matches()
+        for distinct_id in distinct_ids
+    }
+
+
+def _batch_person_query_conditions(
+    team_id: int,
+    feature_flags: List[FeatureFlag],
+    compiled_flags: Dict[int, CompiledFeatureFlag],
+    distinct_ids: List[str],
+) -> Dict[str, Dict[str, bool]]:
+    "Same annotations as FeatureFlagMatcher.query_conditions, but for all person flags and many distinct_ids at once."
+    person_query: QuerySet = Person.objects.filter(
+        team_id=team_id, persondistinctid__distinct_id__in=distinct_ids, persondistinctid__team_id=team_id,
+    )
+    person_fields = []
+
+    for feature_flag in feature_flags:
+        if feature_flag.aggregation_group_type_index is not None:
+            continue
+        try:
+            compiled = compiled_flags.get(feature_flag.pk) or CompiledFeatureFlag.from_feature_flag(feature_flag)
+        except Exception as err:
+            # Broken flags are skipped here, matching errors are reported per flag by the matcher
+            capture_exception(err)
+            continue
+        for index, compiled_condition in enumerate(compiled.conditions):
+            key = f"flag_{feature_flag.pk}_condition_{index}"
+            expr: Any = None
+            if len(compiled_condition.properties) > 0:
+                expr = properties_to_Q(list(compiled_condition.properties), team_id=team_id, is_direct_query=True)
+            person_query = person_query.annotate(
+                **{key: ExpressionWrapper(expr if expr else RawSQL("true", []), output_field=BooleanField())}
+            )
+            person_fields.append(key)
+
+    if len(person_fields) == 0:
+        return {}
+
+    conditions_by_distinct_id: Dict[str, Dict[str, bool]] = {}
+    for row in person_query.values("persondistinctid__distinct_id", *person_fields):
+        distinct_id = row.pop("persondistinctid__distinct_id")
+        conditions_by_distinct_id[distinct_id] = row
+    return conditions_by_distinct_id
+
 
 def set_feature_flag_hash_key_overrides(
-    feature_flags: QuerySet, team_id: int, person_id: int, hash_key_override: str
+    feature_flags: Iterable[FeatureFlag], team_id: int, person_id: int, hash_key_override: str
 ) -> None:
 
     existing_flag_overrides = set(
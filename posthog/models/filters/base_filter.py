@@ -1,10 +1,10 @@
-import inspect
 import json
 from typing import Any, Dict, Optional
 
 from rest_framework import request
 
 from posthog.models.filters.mixins.common import BaseParamMixin
+from posthog.models.filters.mixins.utils import clear_cached_properties, include_dict_methods
 from posthog.models.utils import sane_repr
 from posthog.utils import encode_get_request_params
 
@@ -29,13 +29,13 @@ class BaseFilter(BaseParamMixin):
         if "team" in kwargs and hasattr(self, "simplify") and not getattr(self, "is_simplified", False):
             simplified_filter = getattr(self, "simplify")(kwargs["team"])
             self._data = simplified_filter._data
+            clear_cached_properties(self)
 
     def to_dict(self) -> Dict[str, Any]:
         ret = {}
 
-        for _, func in inspect.getmembers(self, inspect.ismethod):
-            if hasattr(func, "include_dict"):  # provided by @include_dict decorator
-                ret.update(func())
+        for name in include_dict_methods(type(self)):  # provided by @include_dict decorator
+            ret.update(getattr(self, name)())
 
         return ret
 
@@ -43,7 +43,15 @@ class BaseFilter(BaseParamMixin):
         return encode_get_request_params(data=self.to_dict())
 
     def toJSON(self):
-        return json.dumps(self.to_dict(), default=lambda o: o.__dict__, sort_keys=True, indent=4)
+        # Filters aren't modified once created (see `with_data`), so the result is reused until `_data` is replaced
+        cached_json = getattr(self, "_cached_json", None)
+        if cached_json is None or cached_json[0] is not self._data:
+            cached_json = (
+                self._data,
+                json.dumps(self.to_dict(), default=lambda o: o.__dict__, sort_keys=True, indent=4),
+            )
+            self._cached_json = cached_json
+        return cached_json[1]
 
     def with_data(self, overrides: Dict[str, Any]):
         "Allow making copy of filter whilst preserving the class"
@@ -10,6 +10,7 @@ from posthog.models.filters.mixins.common import (
     BreakdownMixin,
     BreakdownValueMixin,
     CompareMixin,
+    CursorMixin,
     DateMixin,
     DisplayDerivedMixin,
     DistinctIdMixin,
@@ -47,6 +48,7 @@ from posthog.models.filters.mixins.groups import GroupsAggregationMixin
 from posthog.models.filters.mixins.interval import IntervalMixin
 from posthog.models.filters.mixins.property import PropertyMixin
 from posthog.models.filters.mixins.simplify import SimplifyFilterMixin
+from posthog.models.filters.mixins.utils import clear_cached_properties
 
 
 class Filter(
@@ -66,6 +68,7 @@ class Filter(
     FilterTestAccountsMixin,
     CompareMixin,
     InsightMixin,
+    CursorMixin,
     OffsetMixin,
     LimitMixin,
     DateMixin,
@@ -128,3 +131,4 @@ class Filter(
         if "team" in kwargs and not self.is_simplified:
             simplified_filter = self.simplify(kwargs["team"])
             self._data = simplified_filter._data
+            clear_cached_properties(self)
@@ -1,3 +1,5 @@
+import base64
+import binascii
 import datetime
 import json
 import re
@@ -22,6 +24,7 @@ from posthog.constants import (
     BREAKDOWN_VALUES_LIMIT_FOR_COUNTRIES,
     BREAKDOWNS,
     COMPARE,
+    CURSOR,
     DATE_FROM,
     DATE_TO,
     DISPLAY,
@@ -270,6 +273,37 @@ class OffsetMixin(BaseParamMixin):
         return {"offset": self.offset} if self.offset else {}
 
 
+def encode_cursor(position: Dict[str, Any]) -> str:
+    "Returns an opaque `cursor` param for the page starting after `position`, see `CursorMixin`"
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class CursorMixin(BaseParamMixin):
+    """
+    Keyset pagination: the cursor holds the sort key of the last row of the previous page, so that queries can skip
+    straight to the next page rather than reading and discarding every row before it like with `offset`.
+    """
+
+    @cached_property
+    def cursor(self) -> Optional[Dict[str, Any]]:
+        cursor_raw = self._data.get(CURSOR)
+        if not cursor_raw:
+            return None
+        if isinstance(cursor_raw, dict):
+            return cursor_raw
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor_raw.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise ValidationError(detail="cursor is invalid")
+        if not isinstance(cursor, dict):
+            raise ValidationError(detail="cursor is invalid")
+        return cursor
+
+    @include_dict
+    def cursor_to_dict(self):
+        return {"cursor": encode_cursor(self.cursor)} if self.cursor else {}
+
+
 class LimitMixin(BaseParamMixin):
     @cached_property
     def limit(self) -> int:
@@ -24,6 +24,7 @@ from posthog.constants import (
     FUNNEL_CORRELATION_PERSON_LIMIT,
     FUNNEL_CORRELATION_PERSON_OFFSET,
     FUNNEL_CORRELATION_PROPERTY_VALUES,
+    FUNNEL_CORRELATION_SAMPLE_RATE,
     FUNNEL_CORRELATION_TYPE,
     FUNNEL_CUSTOM_STEPS,
     FUNNEL_FROM_STEP,
@@ -320,6 +321,22 @@ class FunnelCorrelationMixin(BaseParamMixin):
             return json.loads(property_names)
         return property_names
 
+    @cached_property
+    def correlation_sample_rate(self) -> Optional[Union[float, Literal["auto"]]]:
+        # Share of actors to compute correlations over, or "auto" to pick one from the number of actors in the funnel
+        raw_rate = self._data.get(FUNNEL_CORRELATION_SAMPLE_RATE)
+        if raw_rate is None or raw_rate == "":
+            return None
+        if raw_rate == "auto":
+            return "auto"
+        try:
+            rate = float(raw_rate)
+        except (TypeError, ValueError):
+            rate = 0
+        if not 0 < rate <= 1:
+            raise ValidationError(f"{FUNNEL_CORRELATION_SAMPLE_RATE} must be auto or between 0 and 1")
+        return rate
+
     @include_dict
     def funnel_correlation_to_dict(self):
         result_dict: Dict = {}
@@ -335,6 +352,8 @@ class FunnelCorrelationMixin(BaseParamMixin):
             result_dict[FUNNEL_CORRELATION_EXCLUDE_EVENT_NAMES] = self.correlation_event_exclude_names
         if self.correlation_event_exclude_property_names:
             result_dict[FUNNEL_CORRELATION_EVENT_EXCLUDE_PROPERTY_NAMES] = self.correlation_event_exclude_property_names
+        if self.correlation_sample_rate:
+            result_dict[FUNNEL_CORRELATION_SAMPLE_RATE] = self.correlation_sample_rate
         return result_dict
 
 
@@ -1,3 +1,4 @@
+import json
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -9,7 +10,13 @@ from typing import (
     cast,
 )
 
-from posthog.constants import PropertyOperatorType
+from posthog.constants import (
+    EXCLUSIONS,
+    PROPERTIES,
+    TREND_FILTER_TYPE_ACTIONS,
+    TREND_FILTER_TYPE_EVENTS,
+    PropertyOperatorType,
+)
 from posthog.models.property import GroupTypeIndex, PropertyGroup
 
 if TYPE_CHECKING:  # Avoid circular import
@@ -33,6 +40,10 @@ class SimplifyFilterMixin:
         if self._data.get("is_simplified"):  # type: ignore
             return self
 
+        from posthog.models.cohort.util import prefetch_cohorts
+
+        prefetch_cohorts(self._referenced_cohort_ids())
+
         # :TRICKY: Make a copy to avoid caching issues
         result: Any = self.with_data({"is_simplified": True})  # type: ignore
 
@@ -115,10 +126,10 @@ class SimplifyFilterMixin:
     def _simplify_property(self, team: "Team", property: "Property", **kwargs) -> "PropertyGroup":
         if property.type == "cohort":
             from posthog.models import Cohort
-            from posthog.models.cohort.util import simplified_cohort_filter_properties
+            from posthog.models.cohort.util import get_cohort, simplified_cohort_filter_properties
 
             try:
-                cohort = Cohort.objects.get(pk=property.value, team_id=team.pk)
+                cohort = get_cohort(property.value, team_id=team.pk)
             except Cohort.DoesNotExist:
                 # :TODO: Handle non-existing resource in-query instead
                 return PropertyGroup(type=PropertyOperatorType.AND, values=[property])
@@ -128,6 +139,22 @@ class SimplifyFilterMixin:
         # PropertyOperatorType doesn't really matter here, since only one value.
         return PropertyGroup(type=PropertyOperatorType.AND, values=[property])
 
+    def _referenced_cohort_ids(self) -> List[Any]:
+        """
+        Ids of the cohorts in the properties of the filter and of its entities. Read from the raw data, as cached
+        properties read before simplifying would describe the unsimplified filter.
+        """
+        data: Dict[str, Any] = self._data  # type: ignore
+        cohort_ids: List[Any] = []
+        _collect_cohort_ids(data.get(PROPERTIES), cohort_ids)
+        for entity_type in (TREND_FILTER_TYPE_EVENTS, TREND_FILTER_TYPE_ACTIONS, EXCLUSIONS):
+            entities = _load_json(data.get(entity_type))
+            if isinstance(entities, list):
+                for entity in entities:
+                    if isinstance(entity, dict):
+                        _collect_cohort_ids(entity.get(PROPERTIES), cohort_ids)
+        return cohort_ids
+
     def _group_set_property(self, group_type_index: GroupTypeIndex) -> "Property":
         from posthog.models.property import Property
 
@@ -136,3 +163,25 @@ class SimplifyFilterMixin:
     @property
     def is_simplified(self) -> bool:
         return self._data.get("is_simplified", False)  # type: ignore
+
+
+def _collect_cohort_ids(properties: Any, cohort_ids: List[Any]) -> None:
+    "Walks raw properties, either a list of properties or nested property groups, possibly as JSON"
+    properties = _load_json(properties)
+    if isinstance(properties, list):
+        for prop in properties:
+            _collect_cohort_ids(prop, cohort_ids)
+    elif isinstance(properties, dict):
+        if properties.get("type") == "cohort":
+            cohort_ids.append(properties.get("value"))
+        elif isinstance(properties.get("values"), list):
+            _collect_cohort_ids(properties["values"], cohort_ids)
+
+
+def _load_json(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    return value
@@ -0,0 +1,133 @@
+from collections import Counter
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from posthog.models import Filter
+from posthog.models.filters.mixins.common import DateMixin, EntitiesMixin
+from posthog.models.filters.mixins.property import PropertyMixin
+from posthog.models.filters.mixins.utils import cached_property, clear_cached_properties
+from posthog.queries.funnels import ClickhouseFunnel
+from posthog.queries.trends.trends import Trends
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin
+
+
+class Counted:
+    def __init__(self, value: int) -> None:
+        self.value = value
+        self.calls = 0
+
+    @cached_property
+    def doubled(self) -> int:
+        self.calls += 1
+        return self.value * 2
+
+
+def test_cached_property_is_computed_once_per_instance():
+    first, second = Counted(1), Counted(2)
+
+    # Alternating between instances must not evict the other instance's value
+    for _ in range(3):
+        assert first.doubled == 2
+        assert second.doubled == 4
+
+    assert first.calls == 1
+    assert second.calls == 1
+
+
+def test_clear_cached_properties():
+    counted = Counted(1)
+    assert counted.doubled == 2
+
+    counted.value = 2
+    clear_cached_properties(counted)
+
+    assert counted.doubled == 4
+    assert counted.calls == 2
+
+
+class TestCachedPropertyRecomputation(ClickhouseTestMixin, APIBaseTest):
+    PROPERTIES = [
+        (PropertyMixin, "property_groups"),
+        (EntitiesMixin, "entities"),
+        (DateMixin, "date_from"),
+    ]
+
+    def _count_computations(self, build_query) -> Dict[str, Counter]:
+        computations: Dict[str, Counter] = {}
+        originals: List[Any] = []
+        for mixin, name in self.PROPERTIES:
+            descriptor = mixin.__dict__[name]
+            original = descriptor.func
+            counter: Counter = Counter()
+            computations[name] = counter
+
+            def counting(instance, original=original, counter=counter):
+                counter[id(instance)] += 1
+                return original(instance)
+
+            originals.append((descriptor, original))
+            descriptor.func = counting
+
+        try:
+            build_query()
+        finally:
+            for descriptor, original in originals:
+                descriptor.func = original
+        return computations
+
+    def _assert_computed_at_most_once(self, computations: Dict[str, Counter]):
+        for name, counter in computations.items():
+            self.assertTrue(counter, f"{name} was never computed")
+            self.assertEqual(max(counter.values()), 1, f"{name} was recomputed for the same instance")
+
+    def test_funnel_query_computes_properties_once_per_instance(self):
+        properties = [{"key": "$browser", "value": "Chrome"}, {"key": "email", "value": "x", "type": "person"}]
+        filter = Filter(
+            data={
+                "insight": "FUNNELS",
+                "events": [{"id": f"step {index}", "order": index, "properties": properties} for index in range(5)],
+                "properties": properties,
+                "date_from": "2021-01-01",
+                "date_to": "2021-01-10",
+            },
+            team=self.team,
+        )
+
+        computations = self._count_computations(lambda: ClickhouseFunnel(filter, self.team).get_query())
+
+        self._assert_computed_at_most_once(computations)
+
+    def test_trends_query_computes_properties_once_per_instance(self):
+        properties = [{"key": "$browser", "value": "Chrome"}]
+        filter = Filter(
+            data={
+                "events": [{"id": "$pageview", "properties": properties}, {"id": "$pageleave"}],
+                "properties": properties,
+                "date_from": "2021-01-01",
+                "date_to": "2021-01-10",
+            },
+            team=self.team,
+        )
+
+        def build_query():
+            for entity in filter.entities:
+                Trends()._get_sql_for_entity(filter, self.team, entity)
+
+        computations = self._count_computations(build_query)
+
+        self._assert_computed_at_most_once(computations)
+
+    def test_simplified_filter_does_not_keep_properties_read_before_simplifying(self):
+        self.team.test_account_filters = [{"key": "email", "value": "@posthog.com", "operator": "not_icontains"}]
+        self.team.save()
+        simplify = Filter.simplify
+
+        def read_properties_then_simplify(filter, team, **kwargs):
+            # Cached on the filter before its data is replaced with the simplified data
+            filter.property_groups
+            return simplify(filter, team, **kwargs)
+
+        with patch.object(Filter, "simplify", autospec=True, side_effect=read_properties_then_simplify):
+            filter = Filter(data={"events": [{"id": "$pageview"}], "filter_test_accounts": True}, team=self.team)
+
+        self.assertEqual([prop.key for prop in filter.property_groups.flat], ["email"])
@@ -1,13 +1,51 @@
+import inspect
 from functools import lru_cache
-from typing import Callable, Optional, TypeVar, Union
+from typing import Any, Callable, Optional, Tuple, TypeVar, Union
 
 from posthog.utils import str_to_bool
 
 T = TypeVar("T")
 
-# can't use cached_property directly from functools because of 3.7 compatibilty
+
+class _CachedProperty:
+    """
+    Computes the value once per instance and stores it in the instance `__dict__` under the property name, so later
+    lookups don't go through the descriptor at all.
+
+    Unlike `functools.cached_property` this doesn't take a lock shared by all instances on every first access.
+    """
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.attrname = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.attrname = name
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+        value = self.func(instance)
+        instance.__dict__[self.attrname] = value
+        return value
+
+
 def cached_property(func: Callable[..., T]) -> T:
-    return property(lru_cache(maxsize=1)(func))  # type: ignore
+    return _CachedProperty(func)  # type: ignore
+
+
+def clear_cached_properties(instance: Any) -> None:
+    "Forgets the values of the `cached_property`s of `instance`, e.g. after replacing the data they're computed from"
+    for name in cached_property_names(type(instance)):
+        instance.__dict__.pop(name, None)
+
+
+@lru_cache(maxsize=None)
+def cached_property_names(cls: type) -> Tuple[str, ...]:
+    return tuple(
+        value.attrname for klass in cls.__mro__ for value in vars(klass).values() if isinstance(value, _CachedProperty)
+    )
 
 
 def include_dict(f):
@@ -15,6 +53,12 @@ def include_dict(f):
     return f
 
 
+@lru_cache(maxsize=None)
+def include_dict_methods(cls: type) -> Tuple[str, ...]:
+    "Names of the @include_dict methods of `cls`, in the order `to_dict` applies them"
+    return tuple(name for name, func in inspect.getmembers(cls, inspect.isfunction) if hasattr(func, "include_dict"))
+
+
 def process_bool(bool_to_test: Optional[Union[str, bool]]) -> bool:
     if isinstance(bool_to_test, bool):
         return bool_to_test
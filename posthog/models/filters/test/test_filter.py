@@ -1,6 +1,8 @@
 import datetime
+import inspect
 import json
-from typing import Callable, Optional, cast
+from typing import Callable, Dict, Optional, cast
+from unittest.mock import patch
 
 from django.db.models import Q
 
@@ -47,6 +49,35 @@ class TestFilter(BaseTest):
             ],
         )
 
+    def test_to_dict_includes_every_include_dict_method(self):
+        filter = Filter(
+            data={
+                "insight": "FUNNELS",
+                "events": [{"id": "$pageview", "order": 0}, {"id": "$pageleave", "order": 1}],
+                "exclusions": [{"id": "$autocapture", "funnel_from_step": 0, "funnel_to_step": 1}],
+                "breakdown": "$browser",
+                "funnel_window_interval": 7,
+                "date_from": "-7d",
+            }
+        )
+        expected: Dict = {}
+        for _, func in inspect.getmembers(Filter, inspect.isfunction):
+            if hasattr(func, "include_dict"):
+                expected.update(func(filter))
+
+        self.assertEqual(filter.to_dict(), expected)
+        self.assertEqual(filter.to_dict(), Filter(data=filter.to_dict()).to_dict())
+
+    def test_to_json_is_reused_until_data_changes(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "date_from": "-7d"})
+
+        with patch.object(Filter, "to_dict", wraps=filter.to_dict) as to_dict:
+            self.assertIs(filter.toJSON(), filter.toJSON())
+            self.assertEqual(to_dict.call_count, 1)
+
+        self.assertEqual(json.loads(filter.toJSON()), filter.to_dict())
+        self.assertNotEqual(filter.with_data({"date_from": "-14d"}).toJSON(), filter.toJSON())
+
     def test_simplify_test_accounts(self):
         self.team.test_account_filters = [
             {"key": "email", "value": "@posthog.com", "operator": "not_icontains", "type": "person"}
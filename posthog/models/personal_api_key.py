@@ -1,8 +1,23 @@
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from sentry_sdk import capture_exception
+
+from posthog.redis import get_client
 
 from .utils import generate_random_token, generate_random_token_personal
 
+# Hash of key id to when it was last used, written on use and moved to postgres by `flush_personal_api_key_usage`
+PERSONAL_API_KEY_LAST_USED_REDIS_KEY = "PERSONAL_API_KEY_LAST_USED"
+MAX_TRACKED_KEYS = 10_000
+
+# When this process last recorded the use of each key
+_usage_recorded_at: Dict[str, float] = {}
+
 
 class PersonalAPIKey(models.Model):
     id: models.CharField = models.CharField(primary_key=True, max_length=50, default=generate_random_token)
@@ -18,3 +33,41 @@ class PersonalAPIKey(models.Model):
     team = models.ForeignKey(
         "posthog.Team", on_delete=models.SET_NULL, related_name="personal_api_keys+", null=True, blank=True
     )
+
+
+def record_personal_api_key_usage(key_id: str) -> None:
+    """
+    Buffers the use of a key in redis, at most once per key per PERSONAL_API_KEY_LAST_USED_INTERVAL_SECONDS per
+    process, so that authenticated requests don't each write to postgres.
+    """
+    now = time.monotonic()
+    recorded_at = _usage_recorded_at.get(key_id)
+    if recorded_at is not None and recorded_at > now - settings.PERSONAL_API_KEY_LAST_USED_INTERVAL_SECONDS:
+        return
+
+    if len(_usage_recorded_at) >= MAX_TRACKED_KEYS:
+        _usage_recorded_at.clear()
+    _usage_recorded_at[key_id] = now
+
+    try:
+        get_client().hset(PERSONAL_API_KEY_LAST_USED_REDIS_KEY, key_id, timezone.now().isoformat())
+    except Exception as e:
+        # Not important enough to fail the request on
+        capture_exception(e)
+
+
+def flush_personal_api_key_usage() -> int:
+    "Writes the buffered `last_used_at` of keys to postgres in bulk, returning how many keys were updated"
+    pipeline = get_client().pipeline()
+    pipeline.hgetall(PERSONAL_API_KEY_LAST_USED_REDIS_KEY)
+    pipeline.delete(PERSONAL_API_KEY_LAST_USED_REDIS_KEY)
+    last_used_at_by_key, _ = pipeline.execute()
+
+    last_used_at = {
+        key_id.decode(): datetime.fromisoformat(used_at.decode()) for key_id, used_at in last_used_at_by_key.items()
+    }
+    keys: List[PersonalAPIKey] = list(PersonalAPIKey.objects.filter(id__in=last_used_at.keys()).only("id"))
+    for key in keys:
+        key.last_used_at = last_used_at[key.id]
+    PersonalAPIKey.objects.bulk_update(keys, ["last_used_at"])
+    return len(keys)
@@ -24,7 +24,9 @@ from posthog.models.cohort.util import (
     format_filter_query,
     format_precalculated_cohort_query,
     format_static_cohort_query,
+    get_cohort,
     get_count_operator,
+    prefetch_cohorts,
 )
 from posthog.models.event import Selector
 from posthog.models.group.sql import GET_GROUP_IDS_BY_PROPERTY_SQL
@@ -145,10 +147,11 @@ def parse_prop_clauses(
     if table_name != "":
         table_name += "."
 
+    prefetch_cohorts(prop.value for prop in filters if prop.type == "cohort")
     for idx, prop in enumerate(filters):
         if prop.type == "cohort":
             try:
-                cohort = Cohort.objects.get(pk=prop.value)
+                cohort = get_cohort(prop.value)
             except Cohort.DoesNotExist:
                 final.append(
                     f"{property_operator} 0 = 13"
@@ -5,12 +5,15 @@ import posthoganalytics
 import pytz
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
 
 from posthog.constants import AvailableFeature
 from posthog.helpers.dashboard_templates import create_dashboard_from_template
 from posthog.models.dashboard import Dashboard
 from posthog.models.instance_setting import get_instance_setting
+from posthog.models.signals import mutable_receiver
+from posthog.models.team.token_cache import TeamTokenCache, invalidate_team_token_caches
 from posthog.models.utils import UUIDClassicModel, generate_random_token_project, sane_repr
 from posthog.settings.utils import get_list
 from posthog.utils import GenericEmails
@@ -78,6 +81,15 @@ class TeamManager(models.Manager):
         except Team.DoesNotExist:
             return None
 
+    def get_team_from_cache_or_token(self, token: Optional[str]) -> Optional["Team"]:
+        """
+        Like `get_team_from_token`, but reuses teams looked up recently by this process. The team returned may be
+        shared with other requests, so it must not be modified.
+        """
+        if not token:
+            return None
+        return team_token_cache.get(token)
+
 
 def get_default_data_attributes() -> List[str]:
     return ["data-attr"]
@@ -230,3 +242,15 @@ class Team(UUIDClassicModel):
         return str(self.pk)
 
     __repr__ = sane_repr("uuid", "name", "api_token")
+
+
+team_token_cache: TeamTokenCache[Team] = TeamTokenCache(
+    "team", load=Team.objects.get_team_from_token, get_team_id=lambda team: team.pk
+)
+
+
+@mutable_receiver([post_save, post_delete], sender=Team)
+def team_saved_or_deleted(sender, instance: Team, **kwargs):
+    team_id, api_token = instance.pk, instance.api_token
+    # Only once the change is visible to other processes, otherwise they could reload and cache the old team
+    transaction.on_commit(lambda: invalidate_team_token_caches(team_id, api_token))
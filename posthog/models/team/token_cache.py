@@ -0,0 +1,173 @@
+"""
+Process-local cache of projects looked up by their API token.
+
+Every capture and decide request needs the project its token belongs to, which made token lookups the biggest source
+of postgres load from the ingestion fleet. Lookups are cached per process for TEAM_TOKEN_CACHE_TTL_SECONDS (and unknown
+tokens for TEAM_TOKEN_CACHE_MISSING_TTL_SECONDS). Saving or deleting a `Team` evicts its entries from every process via
+redis pub/sub, so the TTL only bounds staleness when a broadcast is missed. Other process-local caches can have the
+same listener pass them their invalidations too, see `listen_for_invalidations`.
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import structlog
+from django.conf import settings
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
+
+from posthog.redis import get_client
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+RECONNECT_DELAY_SECONDS = 5
+
+_caches: List["TeamTokenCache"] = []
+_listener_lock = threading.Lock()
+_listener_pid: Optional[int] = None
+# Channel to (handler of its messages, reset for when messages may have been missed) of other caches
+_invalidation_listeners: Dict[str, Tuple[Callable[[bytes], None], Callable[[], None]]] = {}
+
+
+class TeamTokenCache(Generic[T]):
+    """
+    Caches the result of `load(token)` for each token, `None` meaning the token doesn't belong to any project.
+
+    When `load` fails (e.g. postgres is down), the last known value is returned even if it has expired.
+    """
+
+    def __init__(self, name: str, load: Callable[[str], Optional[T]], get_team_id: Callable[[T], int]) -> None:
+        self.name = name
+        self._load = load
+        self._get_team_id = get_team_id
+        self._entries: Dict[str, Tuple[float, Optional[T]]] = {}
+        # Bumped on every eviction, so that values loaded before one aren't stored after it
+        self._generation = 0
+        _caches.append(self)
+
+    def get(self, token: str) -> Optional[T]:
+        if settings.TEAM_TOKEN_CACHE_TTL_SECONDS <= 0:
+            return self._load(token)
+
+        ensure_listening()
+        now = time.monotonic()
+        entry = self._entries.get(token)
+        if entry is not None and entry[0] > now:
+            statsd.incr("team_token_cache", tags={"cache": self.name, "result": "hit"})
+            return entry[1]
+
+        generation = self._generation
+        try:
+            value = self._load(token)
+        except Exception:
+            if entry is None:
+                raise
+            statsd.incr("team_token_cache", tags={"cache": self.name, "result": "stale"})
+            return entry[1]
+
+        statsd.incr("team_token_cache", tags={"cache": self.name, "result": "miss"})
+        if generation == self._generation:
+            self._set(token, value, now)
+        return value
+
+    def evict(self, team_id: int, token: Optional[str] = None) -> None:
+        "Drops the entries of `team_id`, and the entry of `token` in case it was cached as unknown"
+        self._generation += 1
+        if token is not None:
+            self._entries.pop(token, None)
+        for cached_token, (_, value) in list(self._entries.items()):
+            if value is not None and self._get_team_id(value) == team_id:
+                self._entries.pop(cached_token, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    def _set(self, token: str, value: Optional[T], now: float) -> None:
+        ttl = (
+            settings.TEAM_TOKEN_CACHE_TTL_SECONDS
+            if value is not None
+            else settings.TEAM_TOKEN_CACHE_MISSING_TTL_SECONDS
+        )
+        self._entries.pop(token, None)
+        while len(self._entries) >= settings.TEAM_TOKEN_CACHE_MAX_SIZE:
+            # Entries are kept in insertion order, so this drops the oldest one
+            try:
+                self._entries.pop(next(iter(self._entries)), None)
+            except (StopIteration, RuntimeError):
+                break
+        self._entries[token] = (now + ttl, value)
+
+
+def invalidate_team_token_caches(team_id: int, token: Optional[str]) -> None:
+    "Evicts `team_id` from the token caches of this process right away, and of all other processes via redis"
+    for cache in _caches:
+        cache.evict(team_id, token)
+
+    try:
+        get_client().publish(
+            settings.TEAM_TOKEN_CACHE_INVALIDATION_CHANNEL, json.dumps({"team_id": team_id, "token": token})
+        )
+    except Exception as e:
+        # Other processes pick up the change once their entries expire
+        capture_exception(e)
+
+
+def handle_invalidation_message(data: bytes) -> None:
+    message = json.loads(data)
+    for cache in _caches:
+        cache.evict(message["team_id"], message.get("token"))
+
+
+def listen_for_invalidations(channel: str, handle: Callable[[bytes], None], reset: Callable[[], None]) -> None:
+    """
+    Passes the messages published to `channel` to `handle`, and calls `reset` whenever messages may have been missed.
+    Must be called before the listener starts, i.e. on import, which callers start with `ensure_listening`.
+    """
+    _invalidation_listeners[channel] = (handle, reset)
+
+
+def _clear_caches() -> None:
+    for cache in _caches:
+        cache.clear()
+
+
+def ensure_listening() -> None:
+    "Starts listening for invalidations in this process, unless already done. Threads don't survive forking."
+    global _listener_pid
+
+    if _listener_pid == os.getpid():
+        return
+
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name="team-token-cache-invalidation", daemon=True).start()
+
+
+def _listen() -> None:
+    while True:
+        try:
+            listeners = {
+                settings.TEAM_TOKEN_CACHE_INVALIDATION_CHANNEL: (handle_invalidation_message, _clear_caches),
+                **_invalidation_listeners,
+            }
+            pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*listeners)
+            # Whatever was cached while we weren't subscribed may have missed invalidations
+            for _, reset in listeners.values():
+                reset()
+
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    handle, _ = listeners[message["channel"].decode()]
+                    handle(message["data"])
+        except Exception as e:
+            logger.warning("team_token_cache_listener_failed", error=repr(e))
+            statsd.incr("team_token_cache_listener_failed")
+            time.sleep(RECONNECT_DELAY_SECONDS)
@@ -0,0 +1,137 @@
+import json
+from typing import Dict, List
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from posthog.api.utils import EventIngestionContext, get_event_ingestion_context_for_token
+from posthog.models import Team
+from posthog.models.team import token_cache
+from posthog.models.team.token_cache import TeamTokenCache, handle_invalidation_message
+from posthog.test.base import BaseTest
+
+loaded_tokens: List[str] = []
+teams_by_token: Dict[str, int] = {}
+
+
+def _load(token: str):
+    loaded_tokens.append(token)
+    if token == "broken":
+        raise Exception("postgres is down")
+    return teams_by_token.get(token)
+
+
+test_cache: TeamTokenCache[int] = TeamTokenCache("test", load=_load, get_team_id=lambda team_id: team_id)
+
+
+@override_settings(TEAM_TOKEN_CACHE_TTL_SECONDS=60, TEAM_TOKEN_CACHE_MISSING_TTL_SECONDS=10)
+@patch("posthog.models.team.token_cache.ensure_listening")
+class TestTeamTokenCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        for cache in token_cache._caches:
+            cache.clear()
+        loaded_tokens.clear()
+        teams_by_token.clear()
+        teams_by_token["token"] = 1
+
+    def test_ingestion_context_is_reused(self, _):
+        get_event_ingestion_context_for_token(self.team.api_token)
+
+        with self.assertNumQueries(0):
+            ingestion_context = get_event_ingestion_context_for_token(self.team.api_token)
+
+        self.assertEqual(ingestion_context, EventIngestionContext(team_id=self.team.pk, anonymize_ips=False))
+
+    def test_unknown_tokens_are_cached(self, _):
+        self.assertIsNone(get_event_ingestion_context_for_token("unknown"))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_event_ingestion_context_for_token("unknown"))
+
+    def test_saving_team_evicts_it(self, _):
+        Team.objects.get_team_from_cache_or_token(self.team.api_token)
+        get_event_ingestion_context_for_token(self.team.api_token)
+        old_token = self.team.api_token
+
+        self.team.anonymize_ips = True
+        self.team.session_recording_opt_in = True
+        self.team.api_token = "new_token_for_the_team"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.save()
+
+        self.assertIsNone(get_event_ingestion_context_for_token(old_token))
+        self.assertIsNone(Team.objects.get_team_from_cache_or_token(old_token))
+        self.assertEqual(
+            get_event_ingestion_context_for_token("new_token_for_the_team"),
+            EventIngestionContext(team_id=self.team.pk, anonymize_ips=True),
+        )
+        self.assertTrue(Team.objects.get_team_from_cache_or_token("new_token_for_the_team").session_recording_opt_in)  # type: ignore
+
+    def test_saving_team_evicts_it_once_committed(self, _):
+        get_event_ingestion_context_for_token(self.team.api_token)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.team.anonymize_ips = True
+            self.team.save()
+            # Other processes could still load the old team, which they would then keep
+            with self.assertNumQueries(0):
+                get_event_ingestion_context_for_token(self.team.api_token)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            get_event_ingestion_context_for_token(self.team.api_token),
+            EventIngestionContext(team_id=self.team.pk, anonymize_ips=True),
+        )
+
+    def test_entries_expire(self, _):
+        with patch("posthog.models.team.token_cache.time.monotonic", return_value=1000):
+            test_cache.get("token")
+            test_cache.get("missing")
+        with patch("posthog.models.team.token_cache.time.monotonic", return_value=1030):
+            test_cache.get("token")
+            test_cache.get("missing")
+        with patch("posthog.models.team.token_cache.time.monotonic", return_value=1070):
+            test_cache.get("token")
+
+        self.assertEqual(loaded_tokens, ["token", "missing", "missing", "token"])
+
+    def test_returns_expired_value_when_loading_fails(self, _):
+        test_cache._set("broken", 2, 1000)
+        with patch("posthog.models.team.token_cache.time.monotonic", return_value=2000):
+            self.assertEqual(test_cache.get("broken"), 2)
+
+        test_cache.clear()
+        with self.assertRaises(Exception):
+            test_cache.get("broken")
+
+    def test_invalidation_message_evicts_team(self, _):
+        test_cache.get("token")
+        test_cache.get("new_token")
+
+        handle_invalidation_message(json.dumps({"team_id": 1, "token": "new_token"}).encode())
+        teams_by_token["new_token"] = 1
+        test_cache.get("token")
+
+        self.assertEqual(test_cache.get("new_token"), 1)
+        self.assertEqual(loaded_tokens, ["token", "new_token", "token", "new_token"])
+
+    def test_value_loaded_during_eviction_is_not_stored(self, _):
+        def load_and_evict(token: str):
+            test_cache.evict(1)
+            return 1
+
+        with patch.object(test_cache, "_load", side_effect=load_and_evict):
+            test_cache.get("token")
+
+        test_cache.get("token")
+        self.assertEqual(loaded_tokens, ["token"])
+
+    @override_settings(TEAM_TOKEN_CACHE_MAX_SIZE=2)
+    def test_oldest_entries_are_dropped_when_full(self, _):
+        teams_by_token.update({"a": 1, "b": 2, "c": 3})
+        for token in ["a", "b", "c", "a"]:
+            test_cache.get(token)
+
+        self.assertEqual(loaded_tokens, ["a", "b", "c", "a"])
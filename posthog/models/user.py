@@ -1,20 +1,36 @@
+import copy
+import json
+import time
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models, transaction
 from django.db.models import Q
-from django.utils import timezone
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
+from sentry_sdk import capture_exception
 
 from posthog.constants import AvailableFeature
+from posthog.models.team.token_cache import ensure_listening, listen_for_invalidations
+from posthog.redis import get_client
 from posthog.utils import get_instance_realm
 
 from .organization import Organization, OrganizationMembership
-from .personal_api_key import PersonalAPIKey
+from .personal_api_key import PersonalAPIKey, record_personal_api_key_usage
+from .signals import mutable_receiver
 from .team import Team
 from .utils import UUIDClassicModel, generate_random_token, sane_repr
 
+MAX_CACHED_PERSONAL_API_KEYS = 10_000
+
+# Key value to (expiry, key id, user id, user field values) of keys looked up recently by this process, see
+# `get_from_personal_api_key`
+_personal_api_key_cache: Dict[str, Tuple[float, str, int, List[Any]]] = {}
+# Bumped on every invalidation, so that lookups made before one aren't stored after it
+_personal_api_key_cache_generation = 0
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -77,16 +93,42 @@ class UserManager(BaseUserManager):
             return user
 
     def get_from_personal_api_key(self, key_value: str) -> Optional["User"]:
+        """
+        Returns the active user the key belongs to, and records that the key was used.
+
+        Lookups are reused by this process for PERSONAL_API_KEY_CACHE_TTL_SECONDS. Deleting a key or saving its user
+        evicts them from every process via redis pub/sub, so the TTL only bounds staleness when a broadcast is missed.
+        """
+        if settings.PERSONAL_API_KEY_CACHE_TTL_SECONDS > 0:
+            ensure_listening()
+        cached = _personal_api_key_cache.get(key_value)
+        if cached is not None and cached[0] > time.monotonic():
+            _, key_id, _, values = cached
+            record_personal_api_key_usage(key_id)
+            # Each request gets its own instance, so that nothing set on it leaks into other requests
+            return self.model.from_db(self.db, _user_field_names(), copy.deepcopy(values))
+
+        generation = _personal_api_key_cache_generation
         try:
             personal_api_key: PersonalAPIKey = (
                 PersonalAPIKey.objects.select_related("user").filter(user__is_active=True).get(value=key_value)
             )
         except PersonalAPIKey.DoesNotExist:
+            _personal_api_key_cache.pop(key_value, None)
             return None
-        else:
-            personal_api_key.last_used_at = timezone.now()
-            personal_api_key.save()
-            return personal_api_key.user
+        user = personal_api_key.user
+        if settings.PERSONAL_API_KEY_CACHE_TTL_SECONDS > 0 and generation == _personal_api_key_cache_generation:
+            if len(_personal_api_key_cache) >= MAX_CACHED_PERSONAL_API_KEYS:
+                _personal_api_key_cache.clear()
+            _personal_api_key_cache[key_value] = (
+                time.monotonic() + settings.PERSONAL_API_KEY_CACHE_TTL_SECONDS,
+                personal_api_key.id,
+                user.pk,
+                copy.deepcopy([getattr(user, name) for name in _user_field_names()]),
+            )
+
+        record_personal_api_key_usage(personal_api_key.id)
+        return user
 
 
 def events_column_config_default() -> Dict[str, Any]:
@@ -247,3 +289,63 @@ class User(AbstractUser, UUIDClassicModel):
         }
 
     __repr__ = sane_repr("email", "first_name", "distinct_id")
+
+
+def _user_field_names() -> List[str]:
+    return [field.attname for field in User._meta.concrete_fields]
+
+
+def invalidate_personal_api_key_caches(user_id: Optional[int] = None, key_value: Optional[str] = None) -> None:
+    "Evicts the keys of `user_id` and `key_value` from this process right away, and from all others via redis"
+    _evict_personal_api_keys(user_id, key_value)
+    try:
+        get_client().publish(
+            settings.PERSONAL_API_KEY_CACHE_INVALIDATION_CHANNEL,
+            json.dumps({"user_id": user_id, "key_value": key_value}),
+        )
+    except Exception as e:
+        # Other processes pick up the change once their entries expire
+        capture_exception(e)
+
+
+def _evict_personal_api_keys(user_id: Optional[int], key_value: Optional[str]) -> None:
+    global _personal_api_key_cache_generation
+
+    _personal_api_key_cache_generation += 1
+    if key_value is not None:
+        _personal_api_key_cache.pop(key_value, None)
+    if user_id is not None:
+        for cached_key_value, (_, _, cached_user_id, _) in list(_personal_api_key_cache.items()):
+            if cached_user_id == user_id:
+                _personal_api_key_cache.pop(cached_key_value, None)
+
+
+def _handle_personal_api_key_invalidation_message(data: bytes) -> None:
+    message = json.loads(data)
+    _evict_personal_api_keys(message.get("user_id"), message.get("key_value"))
+
+
+def _clear_personal_api_key_cache() -> None:
+    global _personal_api_key_cache_generation
+
+    _personal_api_key_cache_generation += 1
+    _personal_api_key_cache.clear()
+
+
+listen_for_invalidations(
+    settings.PERSONAL_API_KEY_CACHE_INVALIDATION_CHANNEL,
+    _handle_personal_api_key_invalidation_message,
+    _clear_personal_api_key_cache,
+)
+
+
+@mutable_receiver(post_save, sender=User)
+def user_saved(sender, instance: User, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_personal_api_key_caches(user_id=user_id))
+
+
+@mutable_receiver(post_delete, sender=PersonalAPIKey)
+def personal_api_key_deleted(sender, instance: PersonalAPIKey, **kwargs):
+    key_value = instance.value
+    transaction.on_commit(lambda: invalidate_personal_api_key_caches(key_value=key_value))
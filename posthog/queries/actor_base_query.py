@@ -1,8 +1,10 @@
 import uuid
 from datetime import datetime
+from itertools import islice
 from typing import (
     Any,
     Dict,
+    Generator,
     List,
     Literal,
     Optional,
@@ -14,10 +16,12 @@ from typing import (
 )
 
 from django.db.models.query import Prefetch, QuerySet
+from rest_framework.exceptions import ValidationError
 
-from posthog.client import sync_execute
+from posthog.client import stream_execute, sync_execute
 from posthog.constants import INSIGHT_FUNNELS, INSIGHT_PATHS, INSIGHT_TRENDS
 from posthog.models import Entity, Filter, Team
+from posthog.models.filters.mixins.common import encode_cursor
 from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
@@ -63,13 +67,15 @@ SerializedActor = Union[SerializedGroup, SerializedPerson]
 class ActorBaseQuery:
     aggregating_by_groups = False
     entity: Optional[Entity] = None
+    # Whether actor_query orders actors by id and applies `_get_cursor_condition`, see `CursorMixin`
+    supports_cursor = False
 
     def __init__(
         self,
         team: Team,
         filter: Union[Filter, StickinessFilter, RetentionFilter],
         entity: Optional[Entity] = None,
-        **kwargs
+        **kwargs,
     ):
         self._team = team
         self.entity = entity
@@ -92,6 +98,27 @@ class ActorBaseQuery:
         self,
     ) -> Tuple[Union[QuerySet[Person], QuerySet[Group]], Union[List[SerializedGroup], List[SerializedPerson]]]:
         """ Get actors in data model and dict formats. Builds query and executes """
+        actors, serialized_actors, _ = self._query_actors()
+        return actors, serialized_actors
+
+    def get_actors_page(
+        self,
+    ) -> Tuple[
+        Union[QuerySet[Person], QuerySet[Group]], Union[List[SerializedGroup], List[SerializedPerson]], Optional[str]
+    ]:
+        """ Like get_actors, also returning the cursor of the next page if the query supports cursors """
+        if not self.supports_cursor:
+            actors, serialized_actors = self.get_actors()
+            return actors, serialized_actors, None
+
+        actors, serialized_actors, raw_result = self._query_actors()
+        next_cursor = None
+        if raw_result:
+            offset = int(self._cursor.get("offset", 0)) if self._cursor else self._filter.offset
+            next_cursor = encode_cursor({"actor_id": str(raw_result[-1][0]), "offset": offset + len(raw_result)})
+        return actors, serialized_actors, next_cursor
+
+    def _query_actors(self):
         query, params = self.actor_query()
         raw_result = sync_execute(query, params)
         actors, serialized_actors = self.get_actors_from_result(raw_result)
@@ -99,7 +126,40 @@ class ActorBaseQuery:
         if hasattr(self._filter, "include_recordings") and self._filter.include_recordings and self._filter.insight in [INSIGHT_PATHS, INSIGHT_TRENDS, INSIGHT_FUNNELS]:  # type: ignore
             serialized_actors = self.add_matched_recordings_to_serialized_actors(serialized_actors, raw_result)
 
-        return actors, serialized_actors
+        return actors, serialized_actors, raw_result
+
+    @property
+    def _cursor(self) -> Optional[Dict[str, Any]]:
+        return getattr(self._filter, "cursor", None) if self.supports_cursor else None
+
+    def _get_cursor_condition(self, actor_id_column: str) -> Tuple[str, Dict]:
+        """
+        Skips the actors before the cursor, for queries that support cursors. Actors must be ordered by `actor_id_column`,
+        and the offset ignored when there's a cursor.
+        """
+        if not self._cursor:
+            return "", {}
+        if "actor_id" not in self._cursor:
+            raise ValidationError(detail="cursor is invalid")
+        return f"AND {actor_id_column} > %(cursor_actor_id)s", {"cursor_actor_id": str(self._cursor["actor_id"])}
+
+    def stream_serialized_actors(self, batch_size: int = 1000) -> Generator[SerializedActor, None, None]:
+        """
+        Like get_actors, but for all actors rather than a page of them. Actors are read from clickhouse as a stream
+        and loaded `batch_size` at a time, so memory use doesn't depend on how many actors there are. Closing the
+        generator stops reading the rest of the result.
+        """
+        query, params = self.actor_query(limit_actors=False)
+        rows = stream_execute(query, params)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                _, serialized_actors = self.get_actors_from_result(batch)
+                yield from serialized_actors
+        finally:
+            rows.close()
 
     def query_for_session_ids_with_recordings(self, session_ids: Set[str]) -> Set[str]:
         """ Filters a list of session_ids to those that actually have recordings """
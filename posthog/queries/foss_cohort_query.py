@@ -5,7 +5,7 @@ from posthog.constants import PropertyOperatorType
 from posthog.models import Filter, Team
 from posthog.models.action import Action
 from posthog.models.cohort import Cohort
-from posthog.models.cohort.util import format_static_cohort_query, get_count_operator, get_entity_query
+from posthog.models.cohort.util import format_static_cohort_query, get_cohort, get_count_operator, get_entity_query
 from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.property import BehavioralPropertyType, OperatorInterval, Property, PropertyGroup, PropertyName
 from posthog.models.property.util import prop_filter_json_extract
@@ -194,7 +194,7 @@ class FOSSCohortQuery(EventQuery):
                         negation_value = not current_negation if negate_group else current_negation
                         if prop.type in ["cohort", "precalculated-cohort"]:
                             try:
-                                prop_cohort: Cohort = Cohort.objects.get(pk=prop.value, team_id=team_id)
+                                prop_cohort: Cohort = get_cohort(prop.value, team_id=team_id)
                                 if prop_cohort.is_static:
                                     new_property_group_list.append(
                                         PropertyGroup(
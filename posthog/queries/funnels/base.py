@@ -55,6 +55,7 @@ class ClickhouseFunnelBase(ABC):
         base_uri: str = "/",
         include_person_properties: Optional[bool] = None,
         include_group_properties: Optional[List[int]] = None,  # group_type_index for respective group type to get
+        actor_sample_hash_bound: Optional[int] = None,  # see `FunnelEventQuery`
     ) -> None:
         self._filter = filter
         self._team = team
@@ -68,6 +69,7 @@ class ClickhouseFunnelBase(ABC):
         self._include_preceding_timestamp = include_preceding_timestamp
         self._include_person_properties = include_person_properties
         self._include_group_properties = include_group_properties or []
+        self._actor_sample_hash_bound = actor_sample_hash_bound
 
         # handle default if window isn't provided
         if not self._filter.funnel_window_days and not self._filter.funnel_window_interval:
@@ -404,6 +406,7 @@ class ClickhouseFunnelBase(ABC):
             extra_fields=[*self._extra_event_fields, *extra_fields],
             extra_event_properties=self._extra_event_properties,
             using_person_on_events=self._team.actor_on_events_querying_enabled,
+            actor_sample_hash_bound=self._actor_sample_hash_bound,
         ).get_query(entities_to_use, entity_name, skip_entity_filter=skip_entity_filter)
 
         self.params.update(params)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from posthog.constants import TREND_FILTER_TYPE_ACTIONS
 from posthog.models.filters.filter import Filter
@@ -11,6 +11,11 @@ from posthog.queries.event_query import EventQuery
 class FunnelEventQuery(EventQuery):
     _filter: Filter
 
+    def __init__(self, *args, actor_sample_hash_bound: Optional[int] = None, **kwargs) -> None:
+        # Only keeps the events of actors whose `cityHash64` of their id is at most this, to sample them
+        self._actor_sample_hash_bound = actor_sample_hash_bound
+        super().__init__(*args, **kwargs)
+
     def get_query(self, entities=None, entity_name="events", skip_entity_filter=False) -> Tuple[str, Dict[str, Any]]:
 
         aggregation_target = (
@@ -100,6 +105,11 @@ class FunnelEventQuery(EventQuery):
 
         self.params.update(entity_params)
 
+        sample_query = ""
+        if self._actor_sample_hash_bound is not None:
+            sample_query = f"AND cityHash64(toString({aggregation_target})) <= %(actor_sample_hash_bound)s"
+            self.params["actor_sample_hash_bound"] = self._actor_sample_hash_bound
+
         person_query, person_params = self._get_person_query()
         self.params.update(person_params)
 
@@ -115,6 +125,7 @@ class FunnelEventQuery(EventQuery):
             {entity_query}
             {date_query}
             {prop_query}
+            {sample_query}
         """
         return query, self.params
 
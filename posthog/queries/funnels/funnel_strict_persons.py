@@ -9,6 +9,7 @@ from posthog.queries.funnels.sql import FUNNEL_PERSONS_BY_STEP_SQL
 
 class ClickhouseFunnelStrictActors(ClickhouseFunnelStrict, ActorBaseQuery):
     _filter: Filter
+    supports_cursor = True
 
     @cached_property
     def aggregation_group_type_index(self):
@@ -16,14 +17,16 @@ class ClickhouseFunnelStrictActors(ClickhouseFunnelStrict, ActorBaseQuery):
 
     def actor_query(self, limit_actors: Optional[bool] = True, extra_fields: Optional[List[str]] = None):
         extra_fields_string = ", ".join([self._get_timestamp_outer_select()] + (extra_fields or []))
+        cursor_condition, cursor_params = self._get_cursor_condition("aggregation_target") if limit_actors else ("", {})
+        self.params.update(cursor_params)
         return (
             FUNNEL_PERSONS_BY_STEP_SQL.format(
                 steps_per_person_query=self.get_step_counts_query(),
-                persons_steps=self._get_funnel_person_step_condition(),
+                persons_steps=" ".join(filter(None, [self._get_funnel_person_step_condition(), cursor_condition])),
                 matching_events_select_statement=self._get_funnel_person_step_events(),
                 extra_fields=extra_fields_string,
                 limit="LIMIT %(limit)s" if limit_actors else "",
-                offset="OFFSET %(offset)s" if limit_actors else "",
+                offset="OFFSET %(offset)s" if limit_actors and not cursor_condition else "",
             ),
             self.params,
         )
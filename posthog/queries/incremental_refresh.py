@@ -0,0 +1,228 @@
+"""
+Incremental refresh of time-series insights.
+
+Refreshing e.g. a 90 day trend on a dashboard scans 90 days of events, even though only the last few buckets can have
+changed since the previous refresh. Next to the regular cached result we keep the buckets of each series together with
+when they were calculated, and on the next refresh only recalculate the buckets from that point on (minus a late
+arrival window), splicing them into the stored ones. Every INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS the
+insight is calculated in full again, which bounds the effect of events arriving later than the late arrival window.
+The buckets are only kept until then, as they can't be reused afterwards.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytz
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from statshog.defaults.django import statsd
+
+from posthog.constants import (
+    INSIGHT_FUNNELS,
+    INSIGHT_LIFECYCLE,
+    INSIGHT_TRENDS,
+    NON_TIME_SERIES_DISPLAY_TYPES,
+    TRENDS_CUMULATIVE,
+    TRENDS_STICKINESS,
+    FunnelVizType,
+)
+from posthog.models.filters import Filter
+from posthog.models.team import Team
+from posthog.types import FilterType
+from posthog.utils import get_safe_cache
+
+# Fields of a series that hold one entry per bucket
+BUCKET_FIELDS = ("data", "days", "labels", "persons_urls")
+
+DEFAULT_FUNNEL_WINDOW_DAYS = 14
+
+
+def supports_incremental_refresh(filter: FilterType) -> bool:
+    """
+    Whether the result of `filter` is a set of series whose buckets can be calculated independently of each other.
+
+    Stickiness, cumulative and smoothed graphs, formulas and comparisons all depend on buckets outside of the ones
+    being recalculated, and histogram breakdowns depend on the value range of the whole period, so they're excluded.
+    """
+    if not settings.INCREMENTAL_INSIGHT_REFRESH_ENABLED or not isinstance(filter, Filter):
+        return False
+
+    if filter.insight == INSIGHT_FUNNELS:
+        return filter.funnel_viz_type == FunnelVizType.TRENDS and not filter.using_histogram
+
+    return (
+        filter.insight in (INSIGHT_TRENDS, INSIGHT_LIFECYCLE)
+        and filter.shown_as != TRENDS_STICKINESS
+        and filter.display not in NON_TIME_SERIES_DISPLAY_TYPES
+        and filter.display != TRENDS_CUMULATIVE
+        and filter.smoothing_intervals < 2
+        and not filter.formula
+        and not filter.compare
+        and not filter.using_histogram
+        and filter.breakdown != "$session_duration"
+        and all(entity.math_property != "$session_duration" for entity in filter.entities)
+    )
+
+
+def incremental_cache_key(cache_key: str) -> str:
+    return f"{cache_key}_incremental"
+
+
+def calculate_incrementally(
+    cache_key: str, filter: Filter, team: Team, calculate: Callable[[Filter], List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """
+    Calculates the result of `filter` via `calculate`, reusing the buckets stored for `cache_key` by the previous call.
+    """
+    if not supports_incremental_refresh(filter):
+        return calculate(filter)
+
+    calculated_at = timezone.now()
+    previous = get_safe_cache(incremental_cache_key(cache_key))
+    result: Optional[List[Dict[str, Any]]] = None
+    fully_calculated_at = calculated_at
+
+    recalculate_from = _recalculate_from(previous, filter, team) if previous else None
+    if recalculate_from:
+        fresh_result = calculate(filter.with_data({"date_from": recalculate_from}))
+        result = merge_time_series(previous["series"], fresh_result, recalculate_from, filter, team)
+        if result is not None:
+            fully_calculated_at = previous["fully_calculated_at"]
+
+    statsd.incr("incremental_insight_refresh", tags={"result": "full" if result is None else "incremental"})
+    if result is None:
+        result = calculate(filter)
+
+    full_recalculation_due_in = (
+        fully_calculated_at
+        + timedelta(hours=settings.INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS)
+        - calculated_at
+    )
+    cache.set(
+        incremental_cache_key(cache_key),
+        {"series": _stored_series(result), "calculated_at": calculated_at, "fully_calculated_at": fully_calculated_at},
+        max(int(full_recalculation_due_in.total_seconds()), 1),
+    )
+    return result
+
+
+def _stored_series(result: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    "The parts of each series that `merge_time_series` reuses, everything else comes with the recalculated buckets"
+    return [
+        {"key": _series_key(series), **{field: series[field] for field in BUCKET_FIELDS if field in series}}
+        for series in result
+    ]
+
+
+def merge_time_series(
+    cached_series: List[Dict[str, Any]],
+    fresh_result: List[Dict[str, Any]],
+    recalculated_from: str,
+    filter: Filter,
+    team: Team,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Replaces the buckets from `recalculated_from` onwards in `cached_series`, as stored by `calculate_incrementally`,
+    with the ones in `fresh_result`, dropping buckets that slid out of a relative date range.
+
+    Returns None when the two can't be merged, e.g. because the set of series changed.
+    """
+    cached_by_key = {series["key"]: series for series in cached_series}
+    fresh_keys = [_series_key(series) for series in fresh_result]
+    if len(cached_by_key) != len(cached_series) or set(fresh_keys) != set(cached_by_key):
+        return None
+
+    if filter.breakdown and filter.breakdown_type != "cohort":
+        # Breakdown values are the top N values of the queried period. When the recalculated period already has N
+        # values we can't tell whether they are still the top N of the whole range.
+        series_per_entity: Dict[Any, int] = {}
+        for key in fresh_keys:
+            series_per_entity[key[0]] = series_per_entity.get(key[0], 0) + 1
+        if max(series_per_entity.values(), default=0) >= filter.breakdown_limit_or_default:
+            return None
+
+    range_start = _range_start(filter, team)
+    merged_result = []
+    for series in fresh_result:
+        if not series["days"] or series["days"][0] != recalculated_from:
+            return None
+
+        previous = cached_by_key[_series_key(series)]
+        kept_buckets = len([day for day in previous["days"] if day < recalculated_from])
+
+        merged_series = {**series}
+        for field in BUCKET_FIELDS:
+            if field in series:
+                merged_series[field] = previous.get(field, [])[:kept_buckets] + series[field]
+
+        if range_start:
+            # A bucket is out of the range once the next one starts at or before the start of the range
+            days = merged_series["days"]
+            expired_buckets = len([index for index in range(len(days) - 1) if days[index + 1] <= range_start])
+            for field in BUCKET_FIELDS:
+                if field in merged_series:
+                    merged_series[field] = merged_series[field][expired_buckets:]
+
+        if filter.insight == INSIGHT_FUNNELS:
+            merged_series["count"] = len(merged_series["days"])
+        else:
+            merged_series["count"] = float(sum(merged_series["data"]))
+        if "filter" in series:
+            merged_series["filter"] = filter.to_dict()
+
+        merged_result.append(merged_series)
+
+    return merged_result
+
+
+def _recalculate_from(previous: Dict[str, Any], filter: Filter, team: Team) -> Optional[str]:
+    "The first bucket that could have changed since the previous calculation, or None when it must be done in full"
+    if not previous.get("series") or previous["fully_calculated_at"] < timezone.now() - timedelta(
+        hours=settings.INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS
+    ):
+        return None
+
+    days = previous["series"][0].get("days")
+    if not days or any(series.get("days") != days for series in previous["series"]):
+        return None
+
+    cutoff = previous["calculated_at"] - timedelta(minutes=settings.INCREMENTAL_INSIGHT_REFRESH_LATE_ARRIVAL_MINUTES)
+    if filter.insight == INSIGHT_FUNNELS:
+        # Conversions of a period keep coming in until the conversion window of its last entrant has passed
+        cutoff -= relativedelta(**_funnel_window(filter))  # type: ignore
+    formatted_cutoff = cutoff.astimezone(pytz.timezone(team.timezone)).strftime(_day_format(filter))
+
+    # Never recalculate from the first bucket, as that could start before the date range does
+    candidates = [day for day in days[1:] if day <= formatted_cutoff]
+    return candidates[-1] if candidates else None
+
+
+def _range_start(filter: Filter, team: Team) -> Optional[str]:
+    date_from: Optional[datetime] = filter.date_from
+    if date_from is None:
+        return None
+    if filter.date_from_has_explicit_time:
+        date_from = date_from.astimezone(pytz.timezone(team.timezone))
+    # Otherwise the date is already in the project's timezone, only labeled as UTC
+    return date_from.strftime(_day_format(filter))
+
+
+def _funnel_window(filter: Filter) -> Dict[str, int]:
+    if filter.funnel_window_interval:
+        return {f"{filter.funnel_window_interval_unit or 'day'}s": filter.funnel_window_interval}
+    return {"days": filter.funnel_window_days or DEFAULT_FUNNEL_WINDOW_DAYS}
+
+
+def _day_format(filter: Filter) -> str:
+    return "%Y-%m-%d{}".format(" %H:%M:%S" if filter.interval == "hour" else "")
+
+
+def _series_key(series: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        (series.get("action") or {}).get("order"),
+        series.get("label"),
+        series.get("status"),
+        json.dumps(series.get("breakdown_value"), sort_keys=True, default=str),
+    )
@@ -1,11 +1,14 @@
 from typing import Dict, List, Optional, Set, Tuple, Union
 
+from rest_framework.exceptions import ValidationError
+
 from posthog.clickhouse.materialized_columns import ColumnName
 from posthog.constants import PropertyOperatorType
 from posthog.models import Filter
 from posthog.models.cohort import Cohort
 from posthog.models.cohort.sql import GET_COHORTPEOPLE_BY_COHORT_ID, GET_STATIC_COHORTPEOPLE_BY_COHORT_ID
 from posthog.models.entity import Entity
+from posthog.models.filters.mixins.common import encode_cursor
 from posthog.models.filters.path_filter import PathFilter
 from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
@@ -30,6 +33,7 @@ class PersonQuery:
     """
 
     PERSON_PROPERTIES_ALIAS = "person_props"
+    CURSOR_CREATED_AT_ALIAS = "cursor_created_at"
     COHORT_TABLE_ALIAS = "cohort_persons"
     ALIASES = {"properties": "person_props"}
 
@@ -69,6 +73,10 @@ class PersonQuery:
         ).inner
 
     def get_query(self, prepend: str = "", paginate: bool = False) -> Tuple[str, Dict]:
+        """
+        When paginating, persons are ordered by when they were created and the last column is the sort key, which
+        `get_next_cursor` turns into the cursor of the next page
+        """
         fields = "id" + " ".join(
             f", argMax({column_name}, version) as {alias}" for column_name, alias in self._get_fields()
         )
@@ -76,10 +84,14 @@ class PersonQuery:
         person_filters, params = self._get_person_filters(prepend=prepend)
         cohort_query, cohort_params = self._get_cohort_query()
         if paginate:
+            fields += f", max(created_at) AS {self.CURSOR_CREATED_AT_ALIAS}"
             limit_offset, limit_params = self._get_limit_offset()
+            cursor_clause, cursor_params = self._get_cursor_clause()
         else:
             limit_offset = ""
             limit_params = {}
+            cursor_clause = ""
+            cursor_params = {}
         search_clause, search_params = self._get_search_clause(prepend=prepend)
         distinct_id_clause, distinct_id_params = self._get_distinct_id_clause()
         email_clause, email_params = self._get_email_clause()
@@ -92,7 +104,7 @@ class PersonQuery:
             WHERE team_id = %(team_id)s
             GROUP BY id
             HAVING max(is_deleted) = 0
-            {person_filters} {search_clause} {distinct_id_clause} {email_clause}
+            {person_filters} {search_clause} {distinct_id_clause} {email_clause} {cursor_clause}
             {"ORDER BY max(created_at) DESC, id" if paginate else ""}
             {limit_offset}
         """,
@@ -100,6 +112,7 @@ class PersonQuery:
                 **params,
                 **cohort_params,
                 **limit_params,
+                **cursor_params,
                 **search_params,
                 **distinct_id_params,
                 **email_params,
@@ -166,6 +179,37 @@ class PersonQuery:
         else:
             return "", {}
 
+    @staticmethod
+    def get_next_cursor(rows: List[Tuple], offset: int) -> Optional[str]:
+        "Returns the cursor of the page after the paginated `rows`, `offset` being the number of rows before that page"
+        if not rows:
+            return None
+        return encode_cursor(
+            {"created_at": rows[-1][-1].strftime("%Y-%m-%d %H:%M:%S.%f"), "id": str(rows[-1][0]), "offset": offset}
+        )
+
+    def _get_cursor_clause(self) -> Tuple[str, Dict]:
+        if not isinstance(self._filter, Filter) or not self._filter.cursor:
+            return "", {}
+
+        try:
+            params = {
+                "cursor_created_at": str(self._filter.cursor["created_at"]),
+                "cursor_id": str(self._filter.cursor["id"]),
+            }
+        except KeyError:
+            raise ValidationError(detail="cursor is invalid")
+
+        return (
+            """
+            AND (
+                max(created_at) < toDateTime64(%(cursor_created_at)s, 6, 'UTC')
+                OR (max(created_at) = toDateTime64(%(cursor_created_at)s, 6, 'UTC') AND id > toUUID(%(cursor_id)s))
+            )
+            """,
+            params,
+        )
+
     def _get_limit_offset(self) -> Tuple[str, Dict]:
 
         if not isinstance(self._filter, Filter):
@@ -182,7 +226,8 @@ class PersonQuery:
             clause += " LIMIT %(limit)s"
             params.update({"limit": self._filter.limit})
 
-        if self._filter.offset:
+        # The cursor already skips the previous pages
+        if self._filter.offset and not self._filter.cursor:
             clause += " OFFSET %(offset)s"
             params.update({"offset": self._filter.offset})
 
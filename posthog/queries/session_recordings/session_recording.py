@@ -1,8 +1,11 @@
 import dataclasses
 import json
-from datetime import datetime, timezone
-from typing import Dict, List, Optional, Tuple, cast
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, cast
 
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.request import Request
 
 from posthog.client import sync_execute
@@ -15,8 +18,27 @@ from posthog.helpers.session_recording import (
     decompress_chunked_snapshot_data,
     generate_inactive_segments_for_range,
     get_active_segments_from_event_list,
+    merge_active_segments,
 )
 from posthog.models import SessionRecordingEvent, Team
+from posthog.queries.util import format_ch_timestamp
+
+
+@dataclasses.dataclass
+class RecordingChunk:
+    chunk_id: str
+    first_timestamp: datetime
+    last_timestamp: datetime
+
+
+@dataclasses.dataclass
+class RecordingActivity:
+    "What recording metadata is computed from, kept to extend it with new chunks instead of reading all of them again"
+    distinct_id: Optional[str] = None
+    first_timestamp: Optional[datetime] = None
+    processed_chunk_ids: Set[str] = dataclasses.field(default_factory=set)
+    active_segments_by_window_id: Dict[WindowId, List[RecordingSegment]] = dataclasses.field(default_factory=dict)
+    start_and_end_times_by_window_id: Dict[WindowId, Dict] = dataclasses.field(default_factory=dict)
 
 
 @dataclasses.dataclass
@@ -45,10 +67,43 @@ class SessionRecording:
         ORDER BY timestamp
     """
 
-    def _query_recording_snapshots(self) -> List[SessionRecordingEvent]:
-        response = sync_execute(
-            self._recording_snapshot_query, {"team_id": self._team.id, "session_id": self._session_recording_id,},
-        )
+    _recording_chunk_index_query = """
+        SELECT
+            JSONExtractString(snapshot_data, 'chunk_id') AS chunk_id,
+            min(timestamp) AS first_timestamp,
+            max(timestamp) AS last_timestamp
+        FROM session_recording_events
+        PREWHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+        GROUP BY chunk_id
+        ORDER BY first_timestamp, chunk_id
+    """
+
+    _recording_chunks_query = """
+        SELECT session_id, window_id, distinct_id, timestamp, snapshot_data
+        FROM session_recording_events
+        PREWHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+            AND timestamp >= toDateTime(%(start_time)s, 'UTC')
+            AND timestamp < toDateTime(%(end_time)s, 'UTC')
+        WHERE JSONExtractString(snapshot_data, 'chunk_id') IN %(chunk_ids)s
+        ORDER BY timestamp
+    """
+
+    _recording_unchunked_snapshots_query = """
+        SELECT session_id, window_id, distinct_id, timestamp, snapshot_data
+        FROM session_recording_events
+        PREWHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+        ORDER BY timestamp
+        LIMIT %(limit)s
+        OFFSET %(offset)s
+    """
+
+    def _to_recording_events(self, response) -> List[SessionRecordingEvent]:
         return [
             SessionRecordingEvent(
                 session_id=session_id,
@@ -60,42 +115,182 @@ class SessionRecording:
             for session_id, window_id, distinct_id, timestamp, snapshot_data in response
         ]
 
-    def get_snapshots(self, limit, offset) -> DecompressedRecordingData:
-        all_snapshots = [
+    def _query_recording_snapshots(self) -> List[SessionRecordingEvent]:
+        response = sync_execute(
+            self._recording_snapshot_query, {"team_id": self._team.id, "session_id": self._session_recording_id,},
+        )
+        return self._to_recording_events(response)
+
+    def _get_chunk_index(self, limit: Optional[int], offset: int) -> List[RecordingChunk]:
+        """
+        Returns the chunks of the recording in playback order, without reading their data into python.
+
+        The index is cached for the duration a recording loads, so paging through it only queries the chunks of each
+        page. It is rebuilt whenever the end of the recording is requested, to pick up chunks of ongoing recordings.
+        """
+        cache_key = f"session_recording_chunk_index_{self._team.pk}_{self._session_recording_id}"
+        chunk_index: Optional[List[RecordingChunk]] = cache.get(cache_key)
+        if chunk_index is not None and limit is not None and offset + limit < len(chunk_index):
+            return chunk_index
+
+        response = sync_execute(
+            self._recording_chunk_index_query, {"team_id": self._team.id, "session_id": self._session_recording_id},
+        )
+        chunk_index = [
+            RecordingChunk(chunk_id=chunk_id, first_timestamp=first_timestamp, last_timestamp=last_timestamp)
+            for chunk_id, first_timestamp, last_timestamp in response
+        ]
+        cache.set(cache_key, chunk_index, settings.SESSION_RECORDING_TTL)
+        return chunk_index
+
+    def _query_chunks(self, chunks: List[RecordingChunk]) -> List[SessionRecordingEvent]:
+        response = sync_execute(
+            self._recording_chunks_query,
+            {
+                "team_id": self._team.id,
+                "session_id": self._session_recording_id,
+                "chunk_ids": [chunk.chunk_id for chunk in chunks],
+                # Timestamps are passed with second precision, so widen the range to whole seconds
+                "start_time": format_ch_timestamp(min(chunk.first_timestamp for chunk in chunks)),
+                "end_time": format_ch_timestamp(max(chunk.last_timestamp for chunk in chunks) + timedelta(seconds=1)),
+            },
+        )
+        return self._to_recording_events(response)
+
+    def _query_unchunked_snapshots(self, limit: int, offset: int) -> List[SessionRecordingEvent]:
+        response = sync_execute(
+            self._recording_unchunked_snapshots_query,
+            {"team_id": self._team.id, "session_id": self._session_recording_id, "limit": limit, "offset": offset},
+        )
+        return self._to_recording_events(response)
+
+    def get_snapshots(self, limit: Optional[int], offset: int) -> DecompressedRecordingData:
+        """
+        Returns `limit` chunks of the recording from `offset` onwards.
+
+        Only the rows of the requested chunks are loaded and decompressed, located via the chunk index.
+        """
+        offset = offset or 0
+        chunk_index = self._get_chunk_index(limit, offset)
+
+        # Recordings from before snapshots were chunked are paginated by snapshot instead
+        if any(chunk.chunk_id == "" for chunk in chunk_index):
+            if limit is None:
+                recording_events = self._query_recording_snapshots()[offset:]
+            else:
+                # Fetch an extra snapshot to know if there's a next page
+                recording_events = self._query_unchunked_snapshots(limit + 1, offset)
+            return decompress_chunked_snapshot_data(
+                self._team.pk, self._session_recording_id, self._tag_with_window_id(recording_events), limit
+            )
+
+        page = chunk_index[offset:] if limit is None else chunk_index[offset : offset + limit]
+        if len(page) == 0:
+            return DecompressedRecordingData(has_next=False, snapshot_data_by_window_id={})
+
+        decompressed_recording_data = decompress_chunked_snapshot_data(
+            self._team.pk, self._session_recording_id, self._tag_with_window_id(self._query_chunks(page))
+        )
+        return DecompressedRecordingData(
+            has_next=offset + len(page) < len(chunk_index),
+            snapshot_data_by_window_id=decompressed_recording_data.snapshot_data_by_window_id,
+        )
+
+    def _tag_with_window_id(
+        self, recording_events: List[SessionRecordingEvent]
+    ) -> List[SnapshotDataTaggedWithWindowId]:
+        return [
             SnapshotDataTaggedWithWindowId(
-                window_id=recording_snapshot.window_id, snapshot_data=recording_snapshot.snapshot_data
+                window_id=recording_event.window_id, snapshot_data=recording_event.snapshot_data
             )
-            for recording_snapshot in self._query_recording_snapshots()
+            for recording_event in recording_events
         ]
-        return decompress_chunked_snapshot_data(self._team.pk, self._session_recording_id, all_snapshots, limit, offset)
 
     def get_metadata(self) -> Optional[RecordingMetadata]:
-        all_snapshots: List[SnapshotDataTaggedWithWindowId] = []
-
-        distinct_id = None
-        for index, session_recording_event in enumerate(self._query_recording_snapshots()):
-            if index == 0:
-                distinct_id = session_recording_event.distinct_id
-            all_snapshots.append(
-                SnapshotDataTaggedWithWindowId(
-                    window_id=session_recording_event.window_id, snapshot_data=session_recording_event.snapshot_data
+        """
+        Metadata is computed from the activity of the recording, which is cached and extended with the chunks that
+        arrived since it was last computed, so opening a recording again doesn't read all of its snapshots again.
+        """
+        cache_key = f"session_recording_activity_{self._team.pk}_{self._session_recording_id}"
+        chunk_index = self._get_chunk_index(None, 0)
+
+        # Recordings from before snapshots were chunked can't be extended chunk by chunk
+        if any(chunk.chunk_id == "" for chunk in chunk_index):
+            activity = RecordingActivity()
+            self._add_to_activity(activity, self._query_recording_snapshots())
+        else:
+            activity = cache.get(cache_key) or RecordingActivity()
+            new_chunks = [chunk for chunk in chunk_index if chunk.chunk_id not in activity.processed_chunk_ids]
+            if new_chunks:
+                self._add_to_activity(activity, self._query_chunks(new_chunks))
+                cache.set(cache_key, activity, settings.SESSION_RECORDING_METADATA_TTL)
+
+        if len(activity.start_and_end_times_by_window_id) == 0:
+            return None
+
+        return RecordingMetadata(
+            segments=self._get_segments(activity),
+            start_and_end_times_by_window_id=activity.start_and_end_times_by_window_id,
+            distinct_id=cast(str, activity.distinct_id),
+        )
+
+    def _add_to_activity(self, activity: RecordingActivity, recording_events: List[SessionRecordingEvent]) -> None:
+        if len(recording_events) == 0:
+            return
+
+        first_event = min(recording_events, key=lambda recording_event: recording_event.timestamp)
+        if activity.first_timestamp is None or first_event.timestamp < activity.first_timestamp:
+            activity.first_timestamp = first_event.timestamp
+            activity.distinct_id = first_event.distinct_id
+
+        decompressed_recording_data = decompress_chunked_snapshot_data(
+            self._team.pk,
+            self._session_recording_id,
+            self._tag_with_window_id(recording_events),
+            return_only_activity_data=True,
+        )
+
+        for window_id, event_list in decompressed_recording_data.snapshot_data_by_window_id.items():
+            if len(event_list) == 0:
+                continue
+
+            events_with_processed_timestamps = [
+                EventActivityData(
+                    timestamp=datetime.fromtimestamp(event.get("timestamp", 0) / 1000, timezone.utc),
+                    is_active=event.get("is_active", False),
                 )
-            )
+                for event in event_list
+            ]
+            # Not sure why, but events are sometimes slightly out of order
+            events_with_processed_timestamps.sort(key=lambda x: cast(datetime, x.timestamp))
 
-        if len(all_snapshots) == 0:
-            return None
+            activity.active_segments_by_window_id[window_id] = merge_active_segments(
+                activity.active_segments_by_window_id.get(window_id, [])
+                + get_active_segments_from_event_list(events_with_processed_timestamps, window_id)
+            )
 
-        segments, start_and_end_times_by_window_id = self._process_snapshots_for_metadata(all_snapshots)
+            start_time = events_with_processed_timestamps[0].timestamp
+            end_time = events_with_processed_timestamps[-1].timestamp
+            if window_id in activity.start_and_end_times_by_window_id:
+                start_time = min(start_time, activity.start_and_end_times_by_window_id[window_id]["start_time"])
+                end_time = max(end_time, activity.start_and_end_times_by_window_id[window_id]["end_time"])
+            activity.start_and_end_times_by_window_id[window_id] = {"start_time": start_time, "end_time": end_time}
 
-        return RecordingMetadata(
-            segments=segments,
-            start_and_end_times_by_window_id=start_and_end_times_by_window_id,
-            distinct_id=cast(str, distinct_id),
+        # Chunks with missing rows were skipped, they're picked up once their other rows arrive
+        rows_by_chunk_id = Counter(
+            recording_event.snapshot_data.get("chunk_id") for recording_event in recording_events
+        )
+        activity.processed_chunk_ids.update(
+            recording_event.snapshot_data["chunk_id"]
+            for recording_event in recording_events
+            if "chunk_id" in recording_event.snapshot_data
+            and rows_by_chunk_id[recording_event.snapshot_data["chunk_id"]]
+            == recording_event.snapshot_data["chunk_count"]
         )
 
-    def _process_snapshots_for_metadata(self, all_snapshots) -> Tuple[List[RecordingSegment], Dict[WindowId, Dict]]:
+    def _get_segments(self, activity: RecordingActivity) -> List[RecordingSegment]:
         """
-        This function processes the recording events into metadata.
+        This function processes the recording activity into segments.
 
         A recording can be composed of events from multiple windows/tabs. Recording events are seperated by
         `window_id`, so the playback experience is consistent (changes in one tab don't impact the recording
@@ -117,37 +312,14 @@ class SessionRecording:
 
         (4) To complete the recording, we fill in the gaps between active segments with "inactive segments". In
         determining which window should be used for the inactive segment, we try to minimize the switching of windows.
-        """
-
-        decompressed_recording_data = decompress_chunked_snapshot_data(
-            self._team.pk, self._session_recording_id, all_snapshots, return_only_activity_data=True
-        )
 
-        start_and_end_times_by_window_id = {}
-
-        # Get the active segments for each window_id
-        all_active_segments: List[RecordingSegment] = []
-        for window_id, event_list in decompressed_recording_data.snapshot_data_by_window_id.items():
-            events_with_processed_timestamps = [
-                EventActivityData(
-                    timestamp=datetime.fromtimestamp(event.get("timestamp", 0) / 1000, timezone.utc),
-                    is_active=event.get("is_active", False),
-                )
-                for event in event_list
-            ]
-            # Not sure why, but events are sometimes slightly out of order
-            events_with_processed_timestamps.sort(key=lambda x: cast(datetime, x.timestamp))
-
-            active_segments_for_window_id = get_active_segments_from_event_list(
-                events_with_processed_timestamps, window_id
-            )
-
-            all_active_segments.extend(active_segments_for_window_id)
+        Steps (1) and (2) happen as chunks are added to the activity, see `_add_to_activity`.
+        """
+        start_and_end_times_by_window_id = activity.start_and_end_times_by_window_id
 
-            start_and_end_times_by_window_id[window_id] = {
-                "start_time": events_with_processed_timestamps[0].timestamp,
-                "end_time": events_with_processed_timestamps[-1].timestamp,
-            }
+        all_active_segments: List[RecordingSegment] = [
+            segment for segments in activity.active_segments_by_window_id.values() for segment in segments
+        ]
 
         # Sort the active segments by start time. This will interleave active segments
         # from different windows
@@ -193,4 +365,4 @@ class SessionRecording:
                 )
             )
 
-        return all_segments, start_and_end_times_by_window_id
+        return all_segments
@@ -1,13 +1,17 @@
 import math
 from typing import Tuple
+from unittest.mock import patch
 from urllib.parse import urlencode
 
 from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
 from django.http import HttpRequest
+from django.test import override_settings
 from django.utils.timezone import now
 from freezegun import freeze_time
 from rest_framework.request import Request
 
+from posthog.client import sync_execute
 from posthog.helpers.session_recording import ACTIVITY_THRESHOLD_SECONDS, DecompressedRecordingData, RecordingSegment
 from posthog.models import Filter
 from posthog.models.team import Team
@@ -160,6 +164,45 @@ def factory_session_recording_test(session_recording: SessionRecording):
                 self.assertEqual(recording.snapshot_data_by_window_id[""][0]["timestamp"], 1_600_000_300_000)
                 self.assertTrue(recording.has_next)
 
+        @override_settings(SESSION_RECORDING_TTL=30)
+        def test_paging_through_chunked_snapshots_reuses_chunk_index(self):
+            cache.clear()
+            with freeze_time("2020-09-13T12:26:40.000Z"):
+                for index in range(5):
+                    create_chunked_snapshots(
+                        snapshot_count=2,
+                        distinct_id="user",
+                        session_id="8",
+                        timestamp=now() + relativedelta(minutes=index),
+                        team_id=self.team.id,
+                        window_id=str(index % 2),
+                    )
+
+                req, _ = create_recording_request_and_filter("8")
+                recording = session_recording(team=self.team, session_recording_id="8", request=req)  # type: ignore
+                all_snapshots = recording.get_snapshots(None, 0).snapshot_data_by_window_id
+
+                pages = []
+                with patch(
+                    "posthog.queries.session_recordings.session_recording.sync_execute", wraps=sync_execute
+                ) as sync_execute_mock:
+                    for offset in range(0, 6, 2):
+                        pages.append(recording.get_snapshots(2, offset))
+
+                index_queries = [call for call in sync_execute_mock.call_args_list if "GROUP BY chunk_id" in call[0][0]]
+                # The index is rebuilt for the last page only
+                self.assertEqual(len(index_queries), 1)
+                self.assertEqual([page.has_next for page in pages], [True, True, False])
+                self.assertEqual(
+                    [len(page.snapshot_data_by_window_id.get(window_id, [])) for page in pages for window_id in "01"],
+                    [2, 2, 2, 2, 2, 0],
+                )
+                for window_id in "01":
+                    self.assertEqual(
+                        [snapshot for page in pages for snapshot in page.snapshot_data_by_window_id.get(window_id, [])],
+                        all_snapshots[window_id],
+                    )
+
         def test_get_metadata(self):
             with freeze_time("2020-09-13T12:26:40.000Z"):
                 timestamp = now()
@@ -355,6 +398,46 @@ def factory_session_recording_test(session_recording: SessionRecording):
                     ),
                 )
 
+        @override_settings(SESSION_RECORDING_METADATA_TTL=60)
+        def test_get_metadata_extends_cached_activity_with_new_chunks(self):
+            cache.clear()
+            with freeze_time("2020-09-13T12:26:40.000Z"):
+                for index in range(3):
+                    create_chunked_snapshots(
+                        team_id=self.team.id,
+                        snapshot_count=1,
+                        distinct_id="u",
+                        session_id="9",
+                        timestamp=now() + relativedelta(seconds=index * 5),
+                        window_id=str(index % 2),
+                        has_full_snapshot=False,
+                        source=3,
+                    )
+
+                req, _ = create_recording_request_and_filter("9")
+                recording = session_recording(team=self.team, session_recording_id="9", request=req)  # type: ignore
+                recording.get_metadata()
+
+                for index in range(3, 6):
+                    create_chunked_snapshots(
+                        team_id=self.team.id,
+                        snapshot_count=1,
+                        distinct_id="u",
+                        session_id="9",
+                        timestamp=now() + relativedelta(seconds=index * 30),
+                        window_id=str(index % 2),
+                        has_full_snapshot=index == 5,
+                        source=3,
+                    )
+
+                with patch.object(recording, "_query_chunks", wraps=recording._query_chunks) as query_chunks_mock:
+                    metadata = recording.get_metadata()
+                    self.assertEqual(len(query_chunks_mock.call_args[0][0]), 3)
+
+                    cache.clear()
+                    self.assertEqual(metadata, recording.get_metadata())
+                    self.assertEqual(len(query_chunks_mock.call_args[0][0]), 6)
+
         def test_get_metadata_for_non_existant_session_id(self):
             with freeze_time("2020-09-13T12:26:40.000Z"):
                 req, _ = create_recording_request_and_filter("99")
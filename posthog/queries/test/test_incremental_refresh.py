@@ -0,0 +1,130 @@
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from django.test import override_settings
+from freezegun import freeze_time
+
+from posthog.constants import TRENDS_CUMULATIVE
+from posthog.models import Filter
+from posthog.queries.incremental_refresh import BUCKET_FIELDS, calculate_incrementally, supports_incremental_refresh
+from posthog.queries.trends.trends import Trends
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin, _create_event, _create_person
+
+
+@override_settings(INCREMENTAL_INSIGHT_REFRESH_ENABLED=True, INCREMENTAL_INSIGHT_REFRESH_LATE_ARRIVAL_MINUTES=60)
+class TestIncrementalRefresh(ClickhouseTestMixin, APIBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.calculated_filters: List[Filter] = []
+        _create_person(team_id=self.team.pk, distinct_ids=["person"])
+
+    def _calculate(self, filter: Filter) -> List[Dict[str, Any]]:
+        self.calculated_filters.append(filter)
+        return Trends().run(filter, self.team)
+
+    def _pageview(self, timestamp: str, browser: str = "Chrome"):
+        _create_event(
+            team=self.team,
+            event="$pageview",
+            distinct_id="person",
+            timestamp=timestamp,
+            properties={"$browser": browser},
+        )
+
+    def _buckets(self, result: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {"label": series["label"], "data": series["data"], "days": series["days"], "count": series["count"]}
+            for series in result
+        ]
+
+    def test_recalculates_only_buckets_since_previous_calculation(self):
+        data = {"events": [{"id": "$pageview"}], "date_from": "-7d", "insight": "TRENDS"}
+        self._pageview("2021-06-05T10:00:00Z")
+        self._pageview("2021-06-09T10:00:00Z")
+
+        with freeze_time("2021-06-10T12:00:00Z"):
+            calculate_incrementally("cache_key", Filter(data=data), self.team, self._calculate)
+
+        self._pageview("2021-06-10T11:30:00Z")  # arrived after the previous calculation, but within the late window
+        self._pageview("2021-06-11T08:00:00Z")
+
+        with freeze_time("2021-06-11T09:00:00Z"):
+            # Filters are created per refresh, relative dates are resolved once per filter
+            filter = Filter(data=data)
+            result = calculate_incrementally("cache_key", filter, self.team, self._calculate)
+            full_result = Trends().run(filter, self.team)
+
+        self.assertEqual([calculated._date_from for calculated in self.calculated_filters], ["-7d", "2021-06-10"])
+        self.assertEqual(self._buckets(result), self._buckets(full_result))
+        self.assertEqual(result[0]["days"][0], "2021-06-04")
+        self.assertEqual(result[0]["count"], 4.0)
+
+    def test_calculates_in_full_when_breakdown_values_might_have_changed(self):
+        data = {
+            "events": [{"id": "$pageview"}],
+            "date_from": "-7d",
+            "insight": "TRENDS",
+            "breakdown": "$browser",
+            "breakdown_limit": 1,
+        }
+        self._pageview("2021-06-05T10:00:00Z", browser="Chrome")
+        self._pageview("2021-06-05T11:00:00Z", browser="Chrome")
+
+        with freeze_time("2021-06-10T12:00:00Z"):
+            calculate_incrementally("cache_key", Filter(data=data), self.team, self._calculate)
+
+        self._pageview("2021-06-10T13:00:00Z", browser="Safari")
+
+        with freeze_time("2021-06-10T14:00:00Z"):
+            filter = Filter(data=data)
+            result = calculate_incrementally("cache_key", filter, self.team, self._calculate)
+            full_result = Trends().run(filter, self.team)
+
+        self.assertEqual(
+            [calculated._date_from for calculated in self.calculated_filters], ["-7d", "2021-06-10", "-7d"]
+        )
+        self.assertEqual(self._buckets(result), self._buckets(full_result))
+
+    def test_calculates_in_full_without_previous_result(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "date_from": "-7d", "insight": "TRENDS"})
+
+        with freeze_time("2021-06-10T12:00:00Z"):
+            calculate_incrementally("cache_key", filter, self.team, self._calculate)
+            calculate_incrementally("other_cache_key", filter, self.team, self._calculate)
+
+        self.assertEqual([calculated._date_from for calculated in self.calculated_filters], ["-7d", "-7d"])
+
+    @override_settings(INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS=24)
+    def test_keeps_only_buckets_until_next_full_calculation(self):
+        data = {"events": [{"id": "$pageview"}], "date_from": "-7d", "insight": "TRENDS"}
+        self._pageview("2021-06-09T10:00:00Z")
+
+        with freeze_time("2021-06-10T12:00:00Z"):
+            calculate_incrementally("cache_key", Filter(data=data), self.team, self._calculate)
+
+        with freeze_time("2021-06-11T09:00:00Z"), patch("posthog.queries.incremental_refresh.cache") as mock_cache:
+            calculate_incrementally("cache_key", Filter(data=data), self.team, self._calculate)
+
+        self.assertEqual([calculated._date_from for calculated in self.calculated_filters], ["-7d", "2021-06-10"])
+        _, stored, timeout = mock_cache.set.call_args[0]
+        # The buckets are of no use once the insight is due to be calculated in full, 24 hours after the first time
+        self.assertEqual(timeout, 3 * 60 * 60)
+        self.assertLessEqual(set(stored["series"][0]), {"key", *BUCKET_FIELDS})
+        self.assertEqual(len(stored["series"][0]["days"]), 8)
+
+    def test_supports_incremental_refresh(self):
+        trends_data = {"events": [{"id": "$pageview"}], "insight": "TRENDS"}
+
+        self.assertTrue(supports_incremental_refresh(Filter(data=trends_data)))
+        self.assertTrue(supports_incremental_refresh(Filter(data={**trends_data, "breakdown": "$browser"})))
+        self.assertTrue(supports_incremental_refresh(Filter(data={**trends_data, "insight": "LIFECYCLE"})))
+        self.assertTrue(
+            supports_incremental_refresh(
+                Filter(data={**trends_data, "insight": "FUNNELS", "funnel_viz_type": "trends"})
+            )
+        )
+        self.assertFalse(supports_incremental_refresh(Filter(data={**trends_data, "display": TRENDS_CUMULATIVE})))
+        self.assertFalse(supports_incremental_refresh(Filter(data={**trends_data, "compare": True})))
+        self.assertFalse(supports_incremental_refresh(Filter(data={**trends_data, "formula": "A + B"})))
+        self.assertFalse(supports_incremental_refresh(Filter(data={**trends_data, "insight": "FUNNELS"})))
+        self.assertFalse(supports_incremental_refresh(Filter(data={**trends_data, "insight": "STICKINESS"})))
@@ -123,6 +123,23 @@ class TestPerson(ClickhouseTestMixin, APIBaseTest):
 
         self.assertEqual(serialized_actors[0].get("matched_recordings"), None)
 
+    @freeze_time("2021-01-21T20:00:00.000Z")
+    def test_stream_serialized_actors_returns_all_actors_in_batches(self):
+        for index in range(5):
+            _create_person(team_id=self.team.pk, distinct_ids=[f"u{index}"], properties={"email": f"{index}@x.com"})
+            _create_event(event="pageview", distinct_id=f"u{index}", team=self.team, timestamp=timezone.now())
+
+        event = {"id": "pageview", "name": "pageview", "type": "events", "order": 0}
+        filter = Filter(
+            data={"date_from": "2021-01-21T00:00:00Z", "date_to": "2021-01-22T00:00:00Z", "events": [event], "limit": 2}
+        )
+
+        serialized_actors = list(TrendsActors(self.team, Entity(event), filter).stream_serialized_actors(batch_size=2))
+
+        self.assertCountEqual(
+            [actor["distinct_ids"] for actor in serialized_actors], [[f"u{index}"] for index in range(5)]  # type: ignore
+        )
+
     @snapshot_clickhouse_queries
     @freeze_time("2021-01-21T20:00:00.000Z")
     def test_group_query_includes_recording_events(self):
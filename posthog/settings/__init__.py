@@ -41,6 +41,11 @@ from posthog.settings.utils import get_from_env, str_to_bool
 
 USE_PRECALCULATED_CH_COHORT_PEOPLE = not TEST
 CALCULATE_X_COHORTS_PARALLEL = get_from_env("CALCULATE_X_COHORTS_PARALLEL", 2, type_cast=int)
+# Cohorts matching on person properties alone are recalculated from the persons changed since their last calculation,
+# and from scratch at least this often
+COHORT_FULL_RECALCULATION_HOURS = get_from_env("COHORT_FULL_RECALCULATION_HOURS", 24, type_cast=int)
+# How many seconds of cohort calculations, going by how long each took last time, are started per scheduler run
+CALCULATE_COHORTS_BUDGET_SECONDS = get_from_env("CALCULATE_COHORTS_BUDGET_SECONDS", 300, type_cast=int)
 
 # Instance configuration preferences
 # https://posthog.com/docs/self-host/configure/environment-variables
@@ -105,7 +110,41 @@ MULTI_ORG_ENABLED = get_from_env("MULTI_ORG_ENABLED", False, type_cast=str_to_bo
 MULTI_TENANCY = False
 
 CACHED_RESULTS_TTL = 7 * 24 * 60 * 60  # how long to keep cached results for
-SESSION_RECORDING_TTL = 30  # how long to keep session recording cache. Relatively short because cached result is used throughout the duration a session recording loads.
+# How long to keep session recording cache. Relatively short because cached result is used throughout the duration a
+# session recording loads.
+SESSION_RECORDING_TTL = 0 if TEST else 30
+# How long to keep the activity recording metadata is computed from
+SESSION_RECORDING_METADATA_TTL = 0 if TEST else 24 * 60 * 60
+
+# How many dashboard tiles are refreshed at once per process, 0 refreshing them one after another in the request
+DASHBOARD_REFRESH_THREADS = get_from_env("DASHBOARD_REFRESH_THREADS", 0 if TEST else 8, type_cast=int)
+# How long a dashboard refresh waits for its tiles, slower tiles are returned from cache while they keep refreshing
+DASHBOARD_REFRESH_TIMEOUT_SECONDS = get_from_env("DASHBOARD_REFRESH_TIMEOUT_SECONDS", 30, type_cast=int)
+
+# Whether background insight refreshes recalculate only the most recent buckets of time-series insights
+INCREMENTAL_INSIGHT_REFRESH_ENABLED = get_from_env(
+    "INCREMENTAL_INSIGHT_REFRESH_ENABLED", not TEST, type_cast=str_to_bool
+)
+# How far before the previous calculation buckets are recalculated, to pick up events that were ingested late
+INCREMENTAL_INSIGHT_REFRESH_LATE_ARRIVAL_MINUTES = get_from_env(
+    "INCREMENTAL_INSIGHT_REFRESH_LATE_ARRIVAL_MINUTES", 60, type_cast=int
+)
+# How often an incrementally refreshed insight is still calculated in full, which bounds how stale it can get
+INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS = get_from_env(
+    "INCREMENTAL_INSIGHT_REFRESH_FULL_RECALCULATION_HOURS", 24, type_cast=int
+)
+
+# How often the last use of personal API keys is written to postgres, and how often each process records it
+PERSONAL_API_KEY_LAST_USED_INTERVAL_SECONDS = get_from_env(
+    "PERSONAL_API_KEY_LAST_USED_INTERVAL_SECONDS", 60, type_cast=int
+)
+# How long each process reuses a personal API key lookup, in case an invalidation broadcast is missed
+PERSONAL_API_KEY_CACHE_TTL_SECONDS = get_from_env(
+    "PERSONAL_API_KEY_CACHE_TTL_SECONDS", 0 if TEST else 10, type_cast=int
+)
+PERSONAL_API_KEY_CACHE_INVALIDATION_CHANNEL = os.getenv(
+    "PERSONAL_API_KEY_CACHE_INVALIDATION_CHANNEL", "reload-personal-api-key"
+)
 
 AUTO_LOGIN = get_from_env("AUTO_LOGIN", False, type_cast=str_to_bool)
 
@@ -136,6 +136,12 @@ KAFKA_SASL_MECHANISM = os.getenv("KAFKA_SASL_MECHANISM", None)
 KAFKA_SASL_USER = os.getenv("KAFKA_SASL_USER", None)
 KAFKA_SASL_PASSWORD = os.getenv("KAFKA_SASL_PASSWORD", None)
 
+# Bytes the producer may buffer before `produce` blocks, and how long it blocks before giving up with a queue full error
+KAFKA_PRODUCER_BUFFER_MEMORY_BYTES = get_from_env("KAFKA_PRODUCER_BUFFER_MEMORY_BYTES", 32 * 1024 * 1024, type_cast=int)
+KAFKA_PRODUCER_MAX_BLOCK_MS = get_from_env("KAFKA_PRODUCER_MAX_BLOCK_MS", 10_000, type_cast=int)
+# How long the capture endpoint waits for delivery reports of a request's messages
+KAFKA_PRODUCE_BATCH_TIMEOUT_SECONDS = get_from_env("KAFKA_PRODUCE_BATCH_TIMEOUT_SECONDS", 10, type_cast=float)
+
 SUFFIX = "_test" if TEST else ""
 
 KAFKA_EVENTS_PLUGIN_INGESTION: str = (
@@ -144,6 +144,11 @@ CONSTANCE_CONFIG = {
         "user to determine how many insight cache updates to run at a time",
         int,
     ),
+    "PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM": (
+        get_from_env("PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM", default=5),
+        "used to limit how many insight cache updates of a single project can run at a time",
+        int,
+    ),
 }
 
 SETTINGS_ALLOWING_API_OVERRIDE = (
@@ -172,6 +177,7 @@ SETTINGS_ALLOWING_API_OVERRIDE = (
     "SLACK_APP_CLIENT_SECRET",
     "SLACK_APP_SIGNING_SECRET",
     "PARALLEL_DASHBOARD_ITEM_CACHE",
+    "PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM",
 )
 
 # SECRET_SETTINGS can only be updated but will never be exposed through the API (we do store them plain text in the DB)
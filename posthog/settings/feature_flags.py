@@ -1,6 +1,7 @@
 import os
 
-from posthog.settings.utils import get_list
+from posthog.settings.base_variables import TEST
+from posthog.settings.utils import get_from_env, get_list, str_to_bool
 
 # These flags will be force-enabled on the frontend
 # The features here are released, but the flags are just not yet removed from the code
@@ -9,3 +10,9 @@ PERSISTED_FEATURE_FLAGS = get_list(os.getenv("PERSISTED_FEATURE_FLAGS", "")) + [
     "insight-legends",
     "simplify-actions",
 ]
+
+# Compiled per-team flag sets used by /decide are cached in-process and invalidated through a version stamp in redis
+DECIDE_FLAG_SET_CACHE_ENABLED = get_from_env("DECIDE_FLAG_SET_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+DECIDE_FLAG_SET_CACHE_SIZE = get_from_env("DECIDE_FLAG_SET_CACHE_SIZE", 1000, type_cast=int)
+# Upper bound on staleness, should a version bump ever get lost
+DECIDE_FLAG_SET_CACHE_MAX_AGE_SECONDS = get_from_env("DECIDE_FLAG_SET_CACHE_MAX_AGE_SECONDS", 300, type_cast=int)
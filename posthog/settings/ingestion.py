@@ -1,8 +1,17 @@
 import os
 
+from posthog.settings.base_variables import TEST
 from posthog.settings.utils import get_from_env, get_list
 
 INGESTION_LAG_METRIC_TEAM_IDS = get_list(os.getenv("INGESTION_LAG_METRIC_TEAM_IDS", ""))
 
 # KEEP IN SYNC WITH plugin-server/src/config/config.ts
 BUFFER_CONVERSION_SECONDS = get_from_env("BUFFER_CONVERSION_SECONDS", default=60, type_cast=int)
+
+# How long capture and decide processes reuse a project looked up by its token before asking postgres again.
+# Changes to a project are also broadcast over redis, this bounds staleness if a broadcast is missed. 0 disables caching.
+TEAM_TOKEN_CACHE_TTL_SECONDS = get_from_env("TEAM_TOKEN_CACHE_TTL_SECONDS", 0 if TEST else 60, type_cast=int)
+# Same for tokens that don't belong to any project
+TEAM_TOKEN_CACHE_MISSING_TTL_SECONDS = get_from_env("TEAM_TOKEN_CACHE_MISSING_TTL_SECONDS", 10, type_cast=int)
+TEAM_TOKEN_CACHE_MAX_SIZE = get_from_env("TEAM_TOKEN_CACHE_MAX_SIZE", 10_000, type_cast=int)
+TEAM_TOKEN_CACHE_INVALIDATION_CHANNEL = os.getenv("TEAM_TOKEN_CACHE_INVALIDATION_CHANNEL", "reload-team-token")
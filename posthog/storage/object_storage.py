@@ -1,5 +1,5 @@
 import abc
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 
 import structlog
 from boto3 import client
@@ -9,6 +9,9 @@ from sentry_sdk import capture_exception
 
 logger = structlog.get_logger(__name__)
 
+# S3 rejects smaller parts, except for the last part of an upload
+MULTIPART_UPLOAD_MIN_PART_SIZE = 5 * 1024 * 1024
+
 
 class ObjectStorageError(Exception):
     pass
@@ -33,6 +36,10 @@ class ObjectStorageClient(metaclass=abc.ABCMeta):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    @abc.abstractmethod
+    def write_parts(self, bucket: str, key: str, parts: Iterable[bytes]) -> None:
+        pass
+
 
 class UnavailableStorage(ObjectStorageClient):
     def head_bucket(self, bucket: str):
@@ -47,6 +54,9 @@ class UnavailableStorage(ObjectStorageClient):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    def write_parts(self, bucket: str, key: str, parts: Iterable[bytes]) -> None:
+        pass
+
 
 class ObjectStorage(ObjectStorageClient):
     def __init__(self, aws_client) -> None:
@@ -85,6 +95,42 @@ class ObjectStorage(ObjectStorageClient):
             capture_exception(e)
             raise ObjectStorageError("write failed") from e
 
+    def write_parts(self, bucket: str, key: str, parts: Iterable[bytes]) -> None:
+        """
+        Writes the object with a multipart upload, so it never has to be held in memory as a whole.
+
+        Every part except the last must be at least MULTIPART_UPLOAD_MIN_PART_SIZE bytes.
+        """
+        upload_id = None
+        try:
+            upload_id = self.aws_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+            uploaded_parts = []
+            for part in parts:
+                part_number = len(uploaded_parts) + 1
+                s3_response = self.aws_client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=part
+                )
+                uploaded_parts.append({"ETag": s3_response["ETag"], "PartNumber": part_number})
+
+            if not uploaded_parts:
+                s3_response = self.aws_client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=1, Body=b""
+                )
+                uploaded_parts.append({"ETag": s3_response["ETag"], "PartNumber": 1})
+
+            self.aws_client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": uploaded_parts}
+            )
+        except Exception as e:
+            logger.error("object_storage.write_failed", bucket=bucket, file_name=key, error=e)
+            capture_exception(e)
+            if upload_id is not None:
+                try:
+                    self.aws_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+                except Exception as abort_error:
+                    capture_exception(abort_error)
+            raise ObjectStorageError("write failed") from e
+
 
 _client: ObjectStorageClient = UnavailableStorage()
 
@@ -113,6 +159,10 @@ def write(file_name: str, content: Union[str, bytes]) -> None:
     return object_storage_client().write(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, content=content)
 
 
+def write_parts(file_name: str, parts: Iterable[bytes]) -> None:
+    return object_storage_client().write_parts(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, parts=parts)
+
+
 def read(file_name: str) -> Optional[str]:
     return object_storage_client().read(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name)
 
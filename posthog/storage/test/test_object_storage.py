@@ -10,7 +10,7 @@ from posthog.settings import (
     OBJECT_STORAGE_ENDPOINT,
     OBJECT_STORAGE_SECRET_ACCESS_KEY,
 )
-from posthog.storage.object_storage import health_check, read, write
+from posthog.storage.object_storage import MULTIPART_UPLOAD_MIN_PART_SIZE, health_check, read, write, write_parts
 from posthog.test.base import APIBaseTest
 
 TEST_BUCKET = "test_storage_bucket"
@@ -52,3 +52,15 @@ class TestStorage(APIBaseTest):
             file_name = f"{TEST_BUCKET}/test_write_and_read_works_with_known_content/{name}"
             write(file_name, "my content".encode("utf-8"))
             self.assertEqual(read(file_name), "my content")
+
+    def test_write_parts_and_read_works(self) -> None:
+        with self.settings(OBJECT_STORAGE_ENABLED=True):
+            file_name = f"{TEST_BUCKET}/test_write_parts_and_read_works/{uuid.uuid4()}"
+            write_parts(file_name, iter([b"a" * MULTIPART_UPLOAD_MIN_PART_SIZE, b"my content"]))
+            self.assertEqual(read(file_name), "a" * MULTIPART_UPLOAD_MIN_PART_SIZE + "my content")
+
+    def test_write_parts_without_parts_writes_empty_object(self) -> None:
+        with self.settings(OBJECT_STORAGE_ENABLED=True):
+            file_name = f"{TEST_BUCKET}/test_write_parts_without_parts_writes_empty_object/{uuid.uuid4()}"
+            write_parts(file_name, iter([]))
+            self.assertEqual(read(file_name), None)
@@ -1,5 +1,6 @@
 import time
-from typing import Any, Dict, List
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Set
 
 import structlog
 from celery import shared_task
@@ -7,19 +8,29 @@ from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.db.models import F
 from django.utils import timezone
+from statshog.defaults.django import statsd
 
+from posthog.client import sync_execute
 from posthog.models import Cohort
 from posthog.models.cohort import get_and_update_pending_version
+from posthog.models.cohort.sql import GET_LAST_INGESTED_AT_BY_TEAM
+from posthog.models.cohort.util import _to_cohort_pk
+from posthog.tasks.cohorts_in_feature_flag import get_cohort_ids_in_feature_flags
 
 logger = structlog.get_logger(__name__)
 
 MAX_AGE_MINUTES = 15
+# How many due cohorts are considered per cohort calculated, to fill the slots of those skipped or waiting
+CANDIDATES_PER_SLOT = 5
+# Assumed duration of cohorts that were never calculated, against CALCULATE_COHORTS_BUDGET_SECONDS
+DEFAULT_CALCULATION_DURATION_MS = 60_000
 
 
 def calculate_cohorts() -> None:
     # This task will be run every minute
-    # Every minute, grab a few cohorts off the list and execute them
-    for cohort in (
+    # Every minute, grab a few cohorts off the list and execute them, the ones used in feature flags and by the other
+    # cohorts first, as long as they fit in CALCULATE_COHORTS_BUDGET_SECONDS
+    candidates = list(
         Cohort.objects.filter(
             deleted=False,
             is_calculating=False,
@@ -27,22 +38,139 @@ def calculate_cohorts() -> None:
             errors_calculating__lte=20,
         )
         .exclude(is_static=True)
-        .order_by(F("last_calculation").asc(nulls_first=True))[0 : settings.CALCULATE_X_COHORTS_PARALLEL]
-    ):
-
+        .order_by(F("last_calculation").asc(nulls_first=True))[
+            0 : settings.CALCULATE_X_COHORTS_PARALLEL * CANDIDATES_PER_SLOT
+        ]
+    )
+    report_cohort_staleness(candidates)
+
+    skipped = get_cohorts_without_new_data(candidates)
+    if skipped:
+        # Their people can't have changed, so they're as good as calculated now
+        Cohort.objects.filter(pk__in=[cohort.pk for cohort in skipped]).update(last_calculation=timezone.now())
+
+    ids_in_feature_flags = set(get_cohort_ids_in_feature_flags())
+    candidates = sorted(
+        (cohort for cohort in candidates if cohort not in skipped),
+        key=lambda cohort: cohort.pk not in ids_in_feature_flags,
+    )
+
+    for cohort in schedule_cohorts(candidates):
         cohort = Cohort.objects.filter(pk=cohort.pk).get()
-        update_cohort(cohort)
+        # Periodic recalculations only need to catch up with the persons that changed, see `can_calculate_incrementally`
+        update_cohort(cohort, incremental=True)
+
+
+def schedule_cohorts(candidates: List[Cohort]) -> List[Cohort]:
+    """
+    Picks the candidates to calculate now, in order, within CALCULATE_COHORTS_BUDGET_SECONDS. Cohorts depending on
+    cohorts being calculated, or due and yet to be calculated, wait for a later run so they're calculated after them.
+    """
+    candidates_by_id = {cohort.pk: cohort for cohort in candidates}
+    dependency_ids = {cohort.pk: get_dependency_ids(cohort) for cohort in candidates}
+    calculating_ids = set(
+        Cohort.objects.filter(
+            pk__in=set().union(*dependency_ids.values()) - candidates_by_id.keys(), is_calculating=True
+        ).values_list("pk", flat=True)
+    )
+
+    scheduled: List[Cohort] = []
+    waiting_ids: Set[int] = set()
+    visited_ids: Set[int] = set()
+    budget_ms = settings.CALCULATE_COHORTS_BUDGET_SECONDS * 1000
+
+    def visit(cohort: Cohort) -> None:
+        nonlocal budget_ms
+
+        if cohort.pk in visited_ids:
+            # Already handled, or a loop back to a cohort whose dependencies are still being visited
+            return
+        visited_ids.add(cohort.pk)
+
+        for dependency_id in dependency_ids[cohort.pk]:
+            if dependency_id in candidates_by_id:
+                visit(candidates_by_id[dependency_id])
+
+        scheduled_ids = {scheduled_cohort.pk for scheduled_cohort in scheduled}
+        duration_ms = cohort.last_calculation_duration_ms or DEFAULT_CALCULATION_DURATION_MS
+        if dependency_ids[cohort.pk] & (calculating_ids | waiting_ids | scheduled_ids):
+            waiting_ids.add(cohort.pk)
+        elif len(scheduled) >= settings.CALCULATE_X_COHORTS_PARALLEL or (scheduled and duration_ms > budget_ms):
+            # The first cohort is always calculated, however long it takes
+            waiting_ids.add(cohort.pk)
+        else:
+            scheduled.append(cohort)
+            budget_ms -= duration_ms
+
+    for cohort in candidates:
+        visit(cohort)
+
+    return scheduled
+
+
+def get_dependency_ids(cohort: Cohort) -> Set[int]:
+    dependency_ids = {_to_cohort_pk(property.value) for property in cohort.properties.flat if property.type == "cohort"}
+    # Malformed cohort properties don't refer to any cohort
+    return {dependency_id for dependency_id in dependency_ids if dependency_id is not None}
+
+
+def get_cohorts_without_new_data(cohorts: List[Cohort]) -> Set[Cohort]:
+    """
+    Returns the cohorts whose team hasn't ingested any events or persons since their last calculation started (their
+    `calculation_watermark`), and that were fully calculated in the last COHORT_FULL_RECALCULATION_HOURS, as cohorts of
+    relative dates change over time anyway. Cohorts referencing other cohorts change with them, so they're never skipped.
+    """
+    full_calculation_cutoff = timezone.now() - timedelta(hours=settings.COHORT_FULL_RECALCULATION_HOURS)
+    cohorts = [
+        cohort
+        for cohort in cohorts
+        if cohort.calculation_watermark
+        and cohort.last_full_calculation
+        and cohort.last_full_calculation > full_calculation_cutoff
+        and not get_dependency_ids(cohort)
+    ]
+    if not cohorts:
+        return set()
+
+    ingested_since = min(cohort.calculation_watermark for cohort in cohorts)
+    last_ingested_at: Dict[int, datetime] = {}
+    for team_id, ingested_at in sync_execute(
+        GET_LAST_INGESTED_AT_BY_TEAM,
+        {
+            "team_ids": list({cohort.team_id for cohort in cohorts}),
+            "ingested_since": ingested_since,
+            # Events can arrive a while after they happened
+            "since": ingested_since - timedelta(days=1),
+        },
+    ):
+        ingested_at = ingested_at.replace(tzinfo=timezone.utc)
+        last_ingested_at[team_id] = max(ingested_at, last_ingested_at.get(team_id, ingested_at))
+
+    return {
+        cohort
+        for cohort in cohorts
+        if cohort.team_id not in last_ingested_at or last_ingested_at[cohort.team_id] < cohort.calculation_watermark
+    }
+
+
+def report_cohort_staleness(cohorts: List[Cohort]) -> None:
+    now = timezone.now()
+    for cohort in cohorts:
+        staleness = (now - cohort.last_calculation).total_seconds() if cohort.last_calculation else 0
+        statsd.gauge(
+            "cohort_calculation_staleness_seconds", staleness, tags={"cohort_id": cohort.pk, "team_id": cohort.team_id}
+        )
 
 
-def update_cohort(cohort: Cohort) -> None:
+def update_cohort(cohort: Cohort, incremental: bool = False) -> None:
     pending_version = get_and_update_pending_version(cohort)
-    calculate_cohort_ch.delay(cohort.id, pending_version)
+    calculate_cohort_ch.delay(cohort.id, pending_version, incremental)
 
 
 @shared_task(ignore_result=True, max_retries=2)
-def calculate_cohort_ch(cohort_id: int, pending_version: int) -> None:
+def calculate_cohort_ch(cohort_id: int, pending_version: int, incremental: bool = False) -> None:
     cohort: Cohort = Cohort.objects.get(pk=cohort_id)
-    cohort.calculate_people_ch(pending_version)
+    cohort.calculate_people_ch(pending_version, incremental=incremental)
 
 
 @shared_task(ignore_result=True, max_retries=1)
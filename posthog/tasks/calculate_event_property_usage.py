@@ -1,8 +1,9 @@
 from collections import defaultdict
-from dataclasses import asdict, dataclass, field
-from typing import DefaultDict, Dict, Tuple
+from dataclasses import asdict, dataclass, field, fields
+from typing import DefaultDict, Dict, List, Tuple
 
 from celery.app import shared_task
+from django.db import models
 from django.utils import timezone
 
 from posthog.models import Team
@@ -11,9 +12,16 @@ from posthog.models.insight import Insight
 from posthog.models.property_definition import PropertyDefinition
 
 
+# Teams are processed in parallel, this many teams per task
+TEAMS_PER_TASK = 100
+BATCH_SIZE = 1000
+
+
 def calculate_event_property_usage() -> None:
-    for team in Team.objects.all():
-        calculate_event_property_usage_for_team(team_id=team.pk)
+    team_ids = Team.objects.order_by("id").values_list("id", flat=True)
+    calculate_event_property_usage_for_team.chunks(
+        ((team_id,) for team_id in team_ids), TEAMS_PER_TASK
+    ).group().apply_async()
 
 
 @dataclass
@@ -26,20 +34,19 @@ class EventDefinitionPayload:
 @shared_task(ignore_result=True, max_retries=1)
 def calculate_event_property_usage_for_team(team_id: int) -> None:
     team = Team.objects.get(pk=team_id)
+    event_definitions = {event.name: event for event in EventDefinition.objects.filter(team_id=team_id)}
     event_definition_payloads: DefaultDict[str, EventDefinitionPayload] = defaultdict(
-        EventDefinitionPayload,
-        {event.name: EventDefinitionPayload() for event in EventDefinition.objects.filter(team_id=team_id)},
-    )
-    property_insight_usage: DefaultDict[str, int] = defaultdict(
-        int, {key.name: 0 for key in PropertyDefinition.objects.filter(team_id=team_id)}
+        EventDefinitionPayload, {name: EventDefinitionPayload() for name in event_definitions},
     )
+    property_definitions = {prop.name: prop for prop in PropertyDefinition.objects.filter(team_id=team_id)}
+    property_insight_usage: DefaultDict[str, int] = defaultdict(int, {name: 0 for name in property_definitions})
 
     since = timezone.now() - timezone.timedelta(days=30)
 
-    for item in Insight.objects.filter(team=team, created_at__gt=since):
-        for event in item.filters.get("events", []):
+    for filters in Insight.objects.filter(team=team, created_at__gt=since).values_list("filters", flat=True):
+        for event in filters.get("events", []):
             event_definition_payloads[event["id"]].query_usage_30_day += 1
-        for prop in item.filters.get("properties", []):
+        for prop in filters.get("properties", []):
             if isinstance(prop, dict) and prop.get("key"):
                 property_insight_usage[prop["key"]] += 1
 
@@ -47,13 +54,49 @@ def calculate_event_property_usage_for_team(team_id: int) -> None:
         event_definition_payloads[event].volume_30_day = volume
         event_definition_payloads[event].last_seen_at = last_seen_at
 
+    event_definitions_to_update: List[EventDefinition] = []
+    event_definitions_to_create: List[EventDefinition] = []
     for event, event_definition_payload in event_definition_payloads.items():
-        EventDefinition.objects.update_or_create(name=event, team_id=team_id, defaults=asdict(event_definition_payload))
-
+        event_definition = event_definitions.get(event)
+        if event_definition is None:
+            event_definitions_to_create.append(
+                EventDefinition(name=event, team_id=team_id, **asdict(event_definition_payload))
+            )
+        elif _update_fields(event_definition, asdict(event_definition_payload)):
+            event_definitions_to_update.append(event_definition)
+
+    property_definitions_to_update: List[PropertyDefinition] = []
+    property_definitions_to_create: List[PropertyDefinition] = []
     for property_name, usage in property_insight_usage.items():
-        PropertyDefinition.objects.update_or_create(
-            name=property_name, team_id=team_id, defaults={"query_usage_30_day": usage or 0}
-        )
+        property_definition = property_definitions.get(property_name)
+        if property_definition is None:
+            property_definitions_to_create.append(
+                PropertyDefinition(name=property_name, team_id=team_id, query_usage_30_day=usage or 0)
+            )
+        elif _update_fields(property_definition, {"query_usage_30_day": usage or 0}):
+            property_definitions_to_update.append(property_definition)
+
+    EventDefinition.objects.bulk_update(
+        event_definitions_to_update,
+        fields=[payload_field.name for payload_field in fields(EventDefinitionPayload)],
+        batch_size=BATCH_SIZE,
+    )
+    # Conflicts are definitions created by ingestion in the meantime, they're picked up on the next run
+    EventDefinition.objects.bulk_create(event_definitions_to_create, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    PropertyDefinition.objects.bulk_update(
+        property_definitions_to_update, fields=["query_usage_30_day"], batch_size=BATCH_SIZE
+    )
+    PropertyDefinition.objects.bulk_create(property_definitions_to_create, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def _update_fields(instance: models.Model, values: Dict) -> bool:
+    "Sets `values` on `instance`, returning whether any of them changed"
+    changed = False
+    for field_name, value in values.items():
+        if getattr(instance, field_name) != value:
+            setattr(instance, field_name, value)
+            changed = True
+    return changed
 
 
 def _get_events_volume(team: Team, since: timezone.datetime) -> Dict[str, Tuple[int, timezone.datetime]]:
@@ -1,16 +1,28 @@
+import csv
 import datetime
-from typing import Any, Dict, List, Optional
-from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+import io
+import json
+import re
+import tempfile
+from itertools import islice
+from typing import IO, Any, Dict, Generator, Iterator, List, Optional, Set
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse, urlunparse
 
 import requests
 import structlog
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_csv import renderers as csvrenderers
 from sentry_sdk import capture_exception, push_scope
 from statshog.defaults.django import statsd
 
+from posthog.api.utils import get_target_entity
 from posthog.jwt import PosthogJwtAudience, encode_jwt
 from posthog.logging.timing import timed
-from posthog.models.exported_asset import ExportedAsset, save_content
+from posthog.models.event.query_event_list import parse_order_by, stream_serialized_events
+from posthog.models.exported_asset import ExportedAsset, save_content_parts
+from posthog.models.filters.filter import Filter
+from posthog.queries.trends.person import TrendsActors
+from posthog.storage.object_storage import MULTIPART_UPLOAD_MIN_PART_SIZE
 from posthog.utils import absolute_uri
 
 logger = structlog.get_logger(__name__)
@@ -35,10 +47,13 @@ logger = structlog.get_logger(__name__)
 
 # HOW DOES THIS WORK
 # 1. We receive an export task with a given resource uri (identical to the API)
-# 2. We call the actual API to load the data with the given params so that we receive a paginateable response
-# 3. We save the response to a chunk in object storage and then load the `next` page of results
-# 4. Repeat until exhausted or limit reached
-# 5. We save the final blob output and update the ExportedAsset
+# 2. Trends persons and events are read from the query layer as a stream, the same rows the API would return.
+#    Anything else is loaded by calling the actual API with the given params, one page of results after the other
+# 3. We spool the rows to a temporary file until exhausted or limit reached
+# 4. We render the spooled rows to CSV part by part, writing each part to object storage, and update the ExportedAsset
+
+# Resources that are read from the query layer rather than the API, so that their exports aren't bound by API pages
+STREAMED_RESOURCE_PATH = re.compile(r"^/?api/projects/(?P<project_id>\d+)/(?P<resource>actions/people|events)/?$")
 
 
 def _modifiy_query(url: str, params: Dict[str, List[str]]) -> str:
@@ -135,7 +150,34 @@ def _convert_response_to_csv_data(data: Any) -> List[Any]:
     return []
 
 
-def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit: int = 3_500,) -> None:
+def _get_csv_rows(exported_asset: ExportedAsset, limit: int) -> Generator[Dict[str, Any], None, None]:
+    resource = exported_asset.export_context
+    parsed_path = urlparse(resource["path"])
+    streamed_resource = STREAMED_RESOURCE_PATH.match(parsed_path.path)
+    # Only for the asset's own project, as the API would check access to any other one
+    if (
+        resource.get("method", "GET") == "GET"
+        and streamed_resource
+        and int(streamed_resource.group("project_id")) == exported_asset.team_id
+    ):
+        team = exported_asset.team
+        query_params = dict(parse_qsl(parsed_path.query))
+        # `Filter` needs some data, and a query without any means no filtering
+        filter = Filter(data=query_params or {"properties": "[]"}, team=team)
+        if streamed_resource.group("resource") == "events":
+            return stream_serialized_events(
+                filter=filter,
+                team=team,
+                request_get_query_dict=query_params,
+                order_by=parse_order_by(query_params.get("orderBy")),
+                action_id=query_params.get("action_id"),
+            )
+        return TrendsActors(team, get_target_entity(filter), filter).stream_serialized_actors()
+
+    return _get_csv_rows_from_api(exported_asset, limit)
+
+
+def _get_csv_rows_from_api(exported_asset: ExportedAsset, limit: int) -> Generator[Dict[str, Any], None, None]:
     resource = exported_asset.export_context
 
     path: str = resource["path"]
@@ -148,9 +190,7 @@ def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit:
     )
 
     next_url = None
-    all_csv_rows: List[Any] = []
-
-    while len(all_csv_rows) < max_limit:
+    while True:
         url = _modifiy_query(next_url or absolute_uri(path), {"limit": [str(limit)]})
 
         response = requests.request(
@@ -162,29 +202,71 @@ def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit:
         # Figure out how to handle funnel polling....
         data = response.json()
         csv_rows = _convert_response_to_csv_data(data)
-
-        all_csv_rows = all_csv_rows + csv_rows
+        yield from csv_rows
 
         if not data.get("next") or not csv_rows:
             break
 
         next_url = data.get("next")
 
-    renderer = csvrenderers.CSVRenderer()
 
-    # NOTE: This is not ideal as some rows _could_ have different keys
-    # Ideally we would extend the csvrenderer to supported keeping the order in place
-    if len(all_csv_rows):
-        if not [x for x in all_csv_rows[0].values() if isinstance(x, dict) or isinstance(x, list)]:
-            # If values are serialised then keep the order of the keys, else allow it to be unordered
-            renderer.header = all_csv_rows[0].keys()
+def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit: int = 10_000,) -> None:
+    renderer = csvrenderers.CSVRenderer()
 
-    rendered_csv_content = renderer.render(all_csv_rows)
-    save_content(exported_asset, rendered_csv_content)
+    # The header can only be known once every row has been seen, so rows are kept on disk rather than in memory
+    with tempfile.TemporaryFile() as spooled_rows:
+        row_count = 0
+        header: Optional[List[str]] = None
+        header_fields: Set[str] = set()
+
+        csv_rows = _get_csv_rows(exported_asset, limit)
+        try:
+            for csv_row in islice(csv_rows, max_limit):
+                # NOTE: This is not ideal as some rows _could_ have different keys
+                if row_count == 0 and not [x for x in csv_row.values() if isinstance(x, dict) or isinstance(x, list)]:
+                    # If values are serialised then keep the order of the keys, else allow it to be unordered
+                    header = list(csv_row.keys())
+
+                flat_row = renderer.flatten_item(csv_row)
+                header_fields.update(flat_row.keys())
+                # Encoded the way the API encodes its responses, so rows read from the query layer come out the same
+                spooled_rows.write(json.dumps(flat_row, cls=JSONEncoder).encode("utf-8") + b"\n")
+                row_count += 1
+        finally:
+            csv_rows.close()
+
+        if row_count and header is None:
+            header = sorted(header_fields)
+
+        def get_content_parts() -> Iterator[bytes]:
+            spooled_rows.seek(0)
+            return _render_csv_parts(header, spooled_rows)
+
+        save_content_parts(exported_asset, get_content_parts)
+
+
+def _render_csv_parts(header: Optional[List[str]], spooled_rows: IO[bytes]) -> Iterator[bytes]:
+    "Renders spooled rows the way `CSVRenderer` does, in parts large enough to upload each"
+    if header is None:
+        return
+
+    csv_buffer = io.StringIO()
+    csv_writer = csv.writer(csv_buffer)
+    csv_writer.writerow(header)
+    for line in spooled_rows:
+        flat_row = json.loads(line)
+        csv_writer.writerow([flat_row.get(key) for key in header])
+        if csv_buffer.tell() >= MULTIPART_UPLOAD_MIN_PART_SIZE:
+            yield csv_buffer.getvalue().encode("utf-8")
+            csv_buffer.seek(0)
+            csv_buffer.truncate()
+
+    if csv_buffer.tell():
+        yield csv_buffer.getvalue().encode("utf-8")
 
 
 @timed("csv_exporter")
-def export_csv(exported_asset: ExportedAsset, limit: Optional[int] = None, max_limit: int = 3_500,) -> None:
+def export_csv(exported_asset: ExportedAsset, limit: Optional[int] = None, max_limit: int = 10_000,) -> None:
     if not limit:
         limit = 1000
 
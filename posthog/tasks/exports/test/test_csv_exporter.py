@@ -1,4 +1,7 @@
+import json
+from typing import List
 from unittest.mock import MagicMock, Mock, patch
+from urllib.parse import urlencode
 
 import pytest
 from boto3 import resource
@@ -14,7 +17,7 @@ from posthog.settings import (
 from posthog.storage import object_storage
 from posthog.storage.object_storage import ObjectStorageError
 from posthog.tasks.exports import csv_exporter
-from posthog.test.base import APIBaseTest
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin, _create_event, _create_person
 
 TEST_BUCKET = "Test-Exports"
 
@@ -130,7 +133,30 @@ class TestCSVExporter(APIBaseTest):
             assert exported_asset.content is None
 
     @patch("posthog.models.exported_asset.UUIDT")
-    @patch("posthog.models.exported_asset.object_storage.write")
+    @patch("posthog.tasks.exports.csv_exporter.MULTIPART_UPLOAD_MIN_PART_SIZE", 100)
+    @patch("posthog.models.exported_asset.object_storage.write_parts")
+    def test_csv_exporter_writes_to_object_storage_in_parts(
+        self, mocked_object_storage_write_parts, mocked_uuidt
+    ) -> None:
+        exported_asset = self._create_asset()
+        mocked_uuidt.return_value = "a-guid"
+        written_parts: List[bytes] = []
+        mocked_object_storage_write_parts.side_effect = lambda file_name, parts: written_parts.extend(parts)
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            csv_exporter.export_csv(exported_asset)
+
+            assert (
+                exported_asset.content_location
+                == f"/{TEST_BUCKET}/csv/team-{self.team.id}/task-{exported_asset.id}/a-guid"
+            )
+            assert written_parts == [
+                b"distinct_id,elements_chain,event,id,person,properties.$browser,timestamp\r\n2,,event_name,e9ca132e-400f-4854-a83c-16c151b2f145,,Safari,2022-07-06T19:37:43.095295+00:00\r\n",
+                b"2,,event_name,1624228e-a4f1-48cd-aabc-6baa3ddb22e4,,Safari,2022-07-06T19:37:43.095279+00:00\r\n2,,event_name,66d45914-bdf5-4980-a54a-7dc699bdcce9,,Safari,2022-07-06T19:37:43.095262+00:00\r\n",
+            ]
+
+    @patch("posthog.models.exported_asset.UUIDT")
+    @patch("posthog.models.exported_asset.object_storage.write_parts")
     def test_csv_exporter_writes_to_asset_when_object_storage_write_fails(
         self, mocked_object_storage_write, mocked_uuidt
     ) -> None:
@@ -160,3 +186,81 @@ class TestCSVExporter(APIBaseTest):
 
             with pytest.raises(Exception, match="export API call failed with status_code: 403"):
                 csv_exporter.export_csv(exported_asset)
+
+
+class TestCSVExporterFromQueryLayer(ClickhouseTestMixin, APIBaseTest):
+    def _export(self, path: str) -> bytes:
+        exported_asset = ExportedAsset.objects.create(
+            team=self.team,
+            created_by=self.user,
+            export_format=ExportedAsset.ExportFormat.CSV,
+            export_context={"path": path},
+        )
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+        return exported_asset.content
+
+    def _export_from_api(self, path: str) -> bytes:
+        "Exports what the API returns for `path`, from a path that isn't read from the query layer"
+        with patch("posthog.tasks.exports.csv_exporter.requests.request") as patched_request:
+            patched_request.return_value = Mock(status_code=200)
+            patched_request.return_value.json.return_value = self.client.get(path).json()
+            return self._export("/api/literally/anything")
+
+    def _create_events(self) -> None:
+        _create_person(team_id=self.team.pk, distinct_ids=["1"], properties={"email": "one@posthog.com"})
+        _create_person(team_id=self.team.pk, distinct_ids=["2"], properties={"email": "two@posthog.com"})
+        for distinct_id, timestamp in [("1", "19:37:43"), ("2", "19:38:43"), ("2", "19:39:43")]:
+            _create_event(
+                team=self.team,
+                event="$pageview",
+                distinct_id=distinct_id,
+                timestamp=f"2022-07-06T{timestamp}Z",
+                properties={"$browser": "Safari"},
+            )
+
+    @patch("posthog.tasks.exports.csv_exporter.requests.request")
+    def test_events_are_exported_from_the_query_layer(self, patched_request) -> None:
+        self._create_events()
+        path = f"/api/projects/{self.team.id}/events?orderBy=%5B%22-timestamp%22%5D"
+
+        content = self._export(path)
+
+        patched_request.assert_not_called()
+        self.assertEqual(len(content.splitlines()), 4)
+        self.assertEqual(content, self._export_from_api(path))
+
+    @patch("posthog.tasks.exports.csv_exporter.requests.request")
+    def test_trends_actors_are_exported_from_the_query_layer(self, patched_request) -> None:
+        self._create_events()
+        query = urlencode(
+            {
+                "date_from": "2022-07-06",
+                "date_to": "2022-07-06",
+                "entity_type": "events",
+                "entity_id": "$pageview",
+                "events": json.dumps([{"id": "$pageview", "type": "events"}]),
+            }
+        )
+        path = f"/api/projects/{self.team.id}/actions/people?{query}"
+
+        content = self._export(path)
+
+        patched_request.assert_not_called()
+        self.assertEqual(len(content.splitlines()), 3)
+        self.assertEqual(content, self._export_from_api(path))
+
+    @patch("posthog.tasks.exports.csv_exporter.requests.request")
+    def test_export_from_the_query_layer_is_limited(self, patched_request) -> None:
+        self._create_events()
+        exported_asset = ExportedAsset.objects.create(
+            team=self.team,
+            created_by=self.user,
+            export_format=ExportedAsset.ExportFormat.CSV,
+            export_context={"path": f"/api/projects/{self.team.id}/events"},
+        )
+
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset, max_limit=2)
+
+        self.assertEqual(len(exported_asset.content.splitlines()), 3)
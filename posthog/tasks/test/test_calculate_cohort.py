@@ -1,6 +1,8 @@
+from datetime import timedelta
 from typing import Callable
 from unittest.mock import MagicMock, patch
 
+from django.utils import timezone
 from freezegun import freeze_time
 
 from posthog.models.cohort import Cohort
@@ -97,4 +99,105 @@ def calculate_cohort_test_factory(event_factory: Callable, person_factory: Calla
 
             calculate_cohorts()
 
+        def _create_due_cohort(self, name: str, hours_since_calculation: int = 1, **kwargs) -> Cohort:
+            return Cohort.objects.create(
+                team=self.team,
+                name=name,
+                groups=[{"properties": [{"key": "$some_prop", "value": "something", "type": "person"}]}],
+                last_calculation=timezone.now() - timedelta(hours=hours_since_calculation),
+                **kwargs,
+            )
+
+        @patch("posthog.tasks.calculate_cohort.update_cohort")
+        def test_calculate_cohorts_calculates_dependencies_first(self, update_cohort: MagicMock) -> None:
+            dependency = self._create_due_cohort("dependency")
+            cohort = Cohort.objects.create(
+                team=self.team,
+                name="cohort",
+                filters={
+                    "properties": {"type": "AND", "values": [{"key": "id", "value": dependency.pk, "type": "cohort"}]}
+                },
+                last_calculation=timezone.now() - timedelta(hours=2),
+            )
+
+            calculate_cohorts()
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [dependency])
+
+            Cohort.objects.filter(pk=dependency.pk).update(last_calculation=timezone.now())
+            update_cohort.reset_mock()
+
+            calculate_cohorts()
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [cohort])
+
+        @patch("posthog.tasks.calculate_cohort.update_cohort")
+        def test_calculate_cohorts_with_malformed_cohort_property(self, update_cohort: MagicMock) -> None:
+            malformed = Cohort.objects.create(
+                team=self.team,
+                name="malformed",
+                filters={"properties": {"type": "AND", "values": [{"key": "id", "value": "abc", "type": "cohort"}]}},
+                last_calculation=timezone.now() - timedelta(hours=2),
+            )
+            cohort = self._create_due_cohort("cohort")
+
+            calculate_cohorts()
+
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [malformed, cohort])
+
+        @patch("posthog.tasks.calculate_cohort.update_cohort")
+        def test_calculate_cohorts_within_budget(self, update_cohort: MagicMock) -> None:
+            slow_cohort = self._create_due_cohort(
+                "slow", hours_since_calculation=3, last_calculation_duration_ms=80_000
+            )
+            self._create_due_cohort("medium", hours_since_calculation=2, last_calculation_duration_ms=50_000)
+            fast_cohort = self._create_due_cohort(
+                "fast", hours_since_calculation=1, last_calculation_duration_ms=10_000
+            )
+
+            with self.settings(CALCULATE_COHORTS_BUDGET_SECONDS=100, CALCULATE_X_COHORTS_PARALLEL=5):
+                calculate_cohorts()
+
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [slow_cohort, fast_cohort])
+
+        @patch("posthog.tasks.calculate_cohort.update_cohort")
+        def test_calculate_cohorts_skips_teams_without_new_data(self, update_cohort: MagicMock) -> None:
+            cohort = self._create_due_cohort(
+                "cohort",
+                calculation_watermark=timezone.now() - timedelta(hours=1),
+                last_full_calculation=timezone.now() - timedelta(hours=1),
+            )
+
+            calculate_cohorts()
+
+            update_cohort.assert_not_called()
+            cohort.refresh_from_db()
+            self.assertGreater(cohort.last_calculation, timezone.now() - timedelta(minutes=1))
+
+            Cohort.objects.filter(pk=cohort.pk).update(last_calculation=timezone.now() - timedelta(hours=1))
+            person_factory(team_id=self.team.pk, distinct_ids=["blabla"])
+
+            calculate_cohorts()
+
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [cohort])
+
+        @patch("posthog.tasks.calculate_cohort.update_cohort")
+        def test_calculate_cohorts_does_not_skip_data_ingested_during_calculation(
+            self, update_cohort: MagicMock
+        ) -> None:
+            ingested_at = timezone.now()
+            with freeze_time(ingested_at):
+                person_factory(team_id=self.team.pk, distinct_ids=["blabla"])
+            # The person was ingested after the last calculation started, but before it finished
+            cohort = self._create_due_cohort(
+                "cohort",
+                hours_since_calculation=0,
+                calculation_watermark=ingested_at - timedelta(hours=1),
+                last_full_calculation=ingested_at - timedelta(hours=1),
+            )
+            Cohort.objects.filter(pk=cohort.pk).update(last_calculation=ingested_at + timedelta(minutes=40))
+
+            with freeze_time(ingested_at + timedelta(hours=1)):
+                calculate_cohorts()
+
+            self.assertEqual([call[0][0] for call in update_cohort.call_args_list], [cohort])
+
     return TestCalculateCohort
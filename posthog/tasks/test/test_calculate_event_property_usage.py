@@ -1,13 +1,18 @@
 import random
 from typing import Callable
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
 from posthog.models import Insight, Organization
 from posthog.models.event_definition import EventDefinition
 from posthog.models.property_definition import PropertyDefinition
 from posthog.models.team import Team
-from posthog.tasks.calculate_event_property_usage import calculate_event_property_usage_for_team
+from posthog.tasks.calculate_event_property_usage import (
+    calculate_event_property_usage,
+    calculate_event_property_usage_for_team,
+)
 from posthog.test.base import BaseTest
 
 
@@ -167,4 +172,40 @@ def calculate_event_property_usage_test_factory(create_event: Callable) -> Calla
             self.assertEqual(1, PropertyDefinition.objects.get(team=self.team, name="team_id").query_usage_30_day)
             self.assertEqual(0, PropertyDefinition.objects.get(team=self.team, name="value").query_usage_30_day)
 
+        def test_number_of_queries_does_not_grow_with_definitions(self) -> None:
+            def create_definitions(names):
+                for name in names:
+                    EventDefinition.objects.create(team=self.team, name=f"event {name}")
+                    PropertyDefinition.objects.create(team=self.team, name=f"property {name}")
+                Insight.objects.create(
+                    team=self.team,
+                    filters={
+                        "events": [{"id": f"new event {names[0]}"}],
+                        "properties": [{"key": f"new property {names[0]}", "value": "x"}],
+                    },
+                )
+
+            create_definitions(range(3))
+            with CaptureQueriesContext(connection) as few_definitions_queries:
+                calculate_event_property_usage_for_team(self.team.pk)
+
+            create_definitions(range(3, 50))
+            with CaptureQueriesContext(connection) as many_definitions_queries:
+                calculate_event_property_usage_for_team(self.team.pk)
+
+            self.assertEqual(len(few_definitions_queries), len(many_definitions_queries))
+            self.assertEqual(EventDefinition.objects.get(team=self.team, name="new event 3").query_usage_30_day, 1)
+            self.assertEqual(PropertyDefinition.objects.get(team=self.team, name="property 49").query_usage_30_day, 0)
+
+        def test_calculate_usage_for_all_teams(self) -> None:
+            team2 = Organization.objects.bootstrap(None)[2]
+            for team in [self.team, team2]:
+                PropertyDefinition.objects.create(team=team, name="$browser")
+                Insight.objects.create(team=team, filters={"properties": [{"key": "$browser", "value": "Safari"}]})
+
+            calculate_event_property_usage()
+
+            for team in [self.team, team2]:
+                self.assertEqual(PropertyDefinition.objects.get(team=team, name="$browser").query_usage_30_day, 1)
+
     return Test
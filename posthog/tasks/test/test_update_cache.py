@@ -18,7 +18,15 @@ from posthog.models.instance_setting import set_instance_setting
 from posthog.models.sharing_configuration import SharingConfiguration
 from posthog.models.team.team import Team
 from posthog.queries.util import get_earliest_timestamp
-from posthog.tasks.update_cache import synchronously_update_insight_cache, update_cache_item, update_cached_items
+from posthog.tasks.update_cache import (
+    REFRESH_LEASE_SECONDS,
+    _refreshes_in_flight_per_team,
+    _start_refresh_lease,
+    insight_update_task_params,
+    synchronously_update_insight_cache,
+    update_cache_item,
+    update_cached_items,
+)
 from posthog.test.base import APIBaseTest
 from posthog.types import FilterType
 from posthog.utils import generate_cache_key, get_safe_cache
@@ -773,7 +781,8 @@ class TestUpdateCache(APIBaseTest):
 
         tasks, queue_length = update_cached_items()
 
-        assert tasks == 5
+        # all insights share a cache key, so they're refreshed by a single task
+        assert tasks == 1
         assert queue_length == parallel_insight_cache + 5
 
         for call_item in patch_update_cache_item.call_args_list:
@@ -899,6 +908,85 @@ class TestUpdateCache(APIBaseTest):
         ]
         assert len(lag_calls) == 2
 
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_tiles_sharing_a_cache_key_are_refreshed_by_one_task(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        filters = {"events": [{"id": "$pageview"}]}
+        tile_one = _a_dashboard_tile_with_known_last_refresh(self.team, None, filters)
+        tile_two = _a_dashboard_tile_with_known_last_refresh(self.team, None, filters)
+
+        tasks, queue_length = update_cached_items()
+
+        assert (tasks, queue_length) == (1, 2)
+        update_cache_item(*patch_update_cache_item.call_args[0])
+        tile_one.refresh_from_db()
+        tile_two.refresh_from_db()
+        assert tile_one.last_refresh is not None
+        assert tile_two.last_refresh is not None
+
+    @freeze_time("2022-12-01T13:54:00.000Z")
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_recently_viewed_dashboards_are_refreshed_first(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        set_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE", 1)
+        _a_dashboard_tile_with_known_last_refresh(
+            self.team, now() - timedelta(minutes=90), {"events": [{"id": "$pageview"}]}
+        )
+        viewed_insight = Insight.objects.create(team=self.team, filters={"events": [{"id": "$autocapture"}]})
+        viewed_dashboard = Dashboard.objects.create(team=self.team, last_accessed_at=now())
+        DashboardTile.objects.create(
+            insight=viewed_insight, dashboard=viewed_dashboard, last_refresh=now() - timedelta(minutes=60)
+        )
+
+        tasks, _ = update_cached_items()
+
+        assert tasks == 1
+        assert patch_update_cache_item.call_args[0][2]["dashboard_id"] == viewed_dashboard.id
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_refreshes_per_team_are_limited(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        set_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM", 2)
+        _start_refresh_lease(self.team.pk, "some other cache key")
+        _a_dashboard_tile_with_known_last_refresh(self.team, None, {"events": [{"id": "two"}]})
+        _a_dashboard_tile_with_known_last_refresh(self.team, None, {"events": [{"id": "three"}]})
+
+        tasks, _ = update_cached_items()
+
+        # one refresh is already running, so only one more can start
+        assert tasks == 1
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_refreshes_that_never_finished_stop_counting_against_team_limit(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        set_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM", 1)
+        with freeze_time(now() - timedelta(seconds=REFRESH_LEASE_SECONDS + 1)):
+            # its worker was killed, so it never ended its lease
+            _start_refresh_lease(self.team.pk, "some other cache key")
+        _a_dashboard_tile_with_known_last_refresh(self.team, None, {"events": [{"id": "two"}]})
+
+        tasks, _ = update_cached_items()
+
+        assert tasks == 1
+
+    @patch("posthog.tasks.update_cache._calculate_by_filter", side_effect=Exception("failed"))
+    def test_failed_refreshes_end_their_lease(self, _patch_calculate_by_filter: MagicMock) -> None:
+        insight = _create_insight_with_known_cache_key(self.team, None)
+        cache_key, cache_type, payload = insight_update_task_params(insight)
+
+        with self.assertRaises(Exception):
+            update_cache_item(cache_key, cache_type, payload)
+
+        assert _refreshes_in_flight_per_team({self.team.pk})[self.team.pk] == 0
+
     @patch("posthog.tasks.update_cache._calculate_by_filter", return_value={"not": "None"})
     @patch("posthog.tasks.update_cache.group.apply_async")
     @patch("posthog.celery.update_cache_item_task.s")
@@ -1,14 +1,20 @@
 import datetime
 import json
-from typing import Any, Dict, List, Optional, Tuple, Union
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import structlog
 from celery import group
-from celery.canvas import Signature
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Q
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
 from django.db.models.expressions import F
 from django.db.models.query import QuerySet
 from django.utils import timezone
@@ -29,11 +35,14 @@ from posthog.constants import (
 from posthog.decorators import CacheType
 from posthog.logging.timing import timed
 from posthog.models import Dashboard, DashboardTile, Filter, Insight, Team
+from posthog.models.cohort.util import cohort_lookup_scope
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.utils import get_filter
 from posthog.models.instance_setting import get_instance_setting
+from posthog.models.sharing_configuration import SharingConfiguration
 from posthog.queries.funnels import ClickhouseFunnelTimeToConvert, ClickhouseFunnelTrends
 from posthog.queries.funnels.utils import get_funnel_order_class
+from posthog.queries.incremental_refresh import calculate_incrementally
 from posthog.queries.paths import Paths
 from posthog.queries.retention import Retention
 from posthog.queries.stickiness import Stickiness
@@ -43,6 +52,18 @@ from posthog.types import FilterType
 from posthog.utils import generate_cache_key
 
 RECENTLY_ACCESSED_TEAMS_REDIS_KEY = "INSIGHT_CACHE_UPDATE_RECENTLY_ACCESSED_TEAMS"
+INSIGHT_CACHE_UPDATE_DURATION_REDIS_KEY = "INSIGHT_CACHE_UPDATE_DURATION:{}"
+# Sorted set of the cache keys being refreshed for a team, scored by when their lease expires
+INSIGHT_CACHE_UPDATE_IN_FLIGHT_REDIS_KEY = "INSIGHT_CACHE_UPDATE_IN_FLIGHT:{}"
+
+# How many more candidates than can be refreshed are considered when prioritizing
+CANDIDATES_PER_PARALLEL_REFRESH = 10
+RECENTLY_VIEWED_INTERVAL = datetime.timedelta(hours=1)
+NEVER_REFRESHED_STALENESS_SECONDS = 7 * 86_400
+PRIORITY_CLASS_WEIGHTS = {"viewed": 4, "shared": 2, "background": 1}
+# Refreshes running for longer than this are assumed to have died with their worker, and no longer count against the
+# team's PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM
+REFRESH_LEASE_SECONDS = 30 * 60
 
 logger = structlog.get_logger(__name__)
 
@@ -89,10 +110,9 @@ def active_teams() -> List[int]:
 
 def update_cached_items() -> Tuple[int, int]:
     PARALLEL_INSIGHT_CACHE = get_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE")
+    PARALLEL_INSIGHT_CACHE_PER_TEAM = get_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE_PER_TEAM")
     recent_teams = active_teams()
 
-    tasks: List[Optional[Signature]] = []
-
     dashboard_tiles = (
         DashboardTile.objects.filter(insight__team_id__in=recent_teams)
         .filter(
@@ -113,9 +133,6 @@ def update_cached_items() -> Tuple[int, int]:
         .order_by(F("last_refresh").asc(nulls_first=True), F("refresh_attempt").asc())
     )
 
-    for dashboard_tile in dashboard_tiles[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(dashboard_tile))
-
     shared_insights = (
         Insight.objects.filter(team_id__in=recent_teams)
         .filter(sharingconfiguration__enabled=True)
@@ -126,17 +143,71 @@ def update_cached_items() -> Tuple[int, int]:
         .order_by(F("last_refresh").asc(nulls_first=True))
     )
 
-    for insight in shared_insights[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(insight))
+    # Look further than the items we can refresh, so that priority isn't only decided by staleness
+    candidates_to_consider = PARALLEL_INSIGHT_CACHE * CANDIDATES_PER_PARALLEL_REFRESH
+    candidates: List[Union[DashboardTile, Insight]] = [
+        *dashboard_tiles.annotate(
+            is_shared=Exists(SharingConfiguration.objects.filter(dashboard_id=OuterRef("dashboard_id"), enabled=True))
+        )[0:candidates_to_consider],
+        *shared_insights[0:candidates_to_consider],
+    ]
+    updates = prioritize_cache_updates(
+        collapse_cache_update_candidates(candidates), PARALLEL_INSIGHT_CACHE, PARALLEL_INSIGHT_CACHE_PER_TEAM
+    )
+    tasks = [update_cache_item_task.s(update.cache_key, update.cache_type, update.payload) for update in updates]
 
     gauge_cache_update_candidates(dashboard_tiles, shared_insights)
 
-    tasks = list(filter(None, tasks))
     group(tasks).apply_async()
     return len(tasks), dashboard_tiles.count() + shared_insights.count()
 
 
-def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) -> Optional[Signature]:
+@dataclass
+class CacheUpdate:
+    """All dashboard tiles and shared insights that share a cache key, as they're refreshed by a single task"""
+
+    cache_key: str
+    cache_type: CacheType
+    payload: Dict[str, Any]
+    team_id: int
+    last_refresh: Optional[datetime.datetime]
+    last_viewed_at: Optional[datetime.datetime]
+    is_shared: bool
+
+    @property
+    def staleness(self) -> float:
+        if self.last_refresh is None:
+            return NEVER_REFRESHED_STALENESS_SECONDS
+        return (timezone.now() - self.last_refresh).total_seconds()
+
+    @property
+    def priority_class(self) -> str:
+        if self.last_viewed_at and self.last_viewed_at > timezone.now() - RECENTLY_VIEWED_INTERVAL:
+            return "viewed"
+        return "shared" if self.is_shared else "background"
+
+    def merge(self, other: "CacheUpdate") -> None:
+        if self.last_refresh is not None and (other.last_refresh is None or other.last_refresh < self.last_refresh):
+            self.last_refresh = other.last_refresh
+        if other.last_viewed_at and (self.last_viewed_at is None or other.last_viewed_at > self.last_viewed_at):
+            self.last_viewed_at = other.last_viewed_at
+        self.is_shared = self.is_shared or other.is_shared
+
+
+def collapse_cache_update_candidates(candidates: List[Union[DashboardTile, Insight]]) -> List[CacheUpdate]:
+    updates: Dict[str, CacheUpdate] = {}
+    for candidate in candidates:
+        update = cache_update_for_candidate(candidate)
+        if update is None:
+            continue
+        if update.cache_key in updates:
+            updates[update.cache_key].merge(update)
+        else:
+            updates[update.cache_key] = update
+    return list(updates.values())
+
+
+def cache_update_for_candidate(candidate: Union[DashboardTile, Insight]) -> Optional[CacheUpdate]:
     candidate_tile: Optional[DashboardTile] = None if isinstance(candidate, Insight) else candidate
     candidate_insight: Insight = candidate if isinstance(candidate, Insight) else candidate.insight
     candidate_dashboard: Optional[Dashboard] = None if isinstance(candidate, Insight) else candidate.dashboard
@@ -144,7 +215,15 @@ def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) ->
     try:
         cache_key, cache_type, payload = insight_update_task_params(candidate_insight, candidate_dashboard)
         update_filters_hash(cache_key, candidate_dashboard, candidate_insight)
-        return update_cache_item_task.s(cache_key, cache_type, payload)
+        return CacheUpdate(
+            cache_key=cache_key,
+            cache_type=cache_type,
+            payload=payload,
+            team_id=candidate_insight.team_id,
+            last_refresh=candidate.last_refresh,
+            last_viewed_at=candidate_dashboard.last_accessed_at if candidate_dashboard else None,
+            is_shared=getattr(candidate, "is_shared", True),
+        )
     except Exception as e:
         candidate_insight.refresh_attempt = (candidate_insight.refresh_attempt or 0) + 1
         candidate_insight.save(update_fields=["refresh_attempt"])
@@ -155,6 +234,87 @@ def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) ->
         return None
 
 
+def prioritize_cache_updates(updates: List[CacheUpdate], limit: int, limit_per_team: int) -> List[CacheUpdate]:
+    """
+    Picks the `limit` most urgent updates, without exceeding `limit_per_team` refreshes running at once per team.
+
+    Urgency grows with staleness and is weighted by whether someone is looking at the insight, and divided by how long
+    the insight took to calculate last time so that cheap refreshes aren't stuck behind expensive ones of big teams.
+    """
+    durations = _previous_durations([update.cache_key for update in updates])
+    urgency = {
+        update.cache_key: PRIORITY_CLASS_WEIGHTS[update.priority_class]
+        * update.staleness
+        / (1 + durations.get(update.cache_key, 0))
+        for update in updates
+    }
+    updates = sorted(updates, key=lambda update: urgency[update.cache_key], reverse=True)
+
+    refreshes_per_team = _refreshes_in_flight_per_team({update.team_id for update in updates})
+    prioritized: List[CacheUpdate] = []
+    for update in updates:
+        if len(prioritized) >= limit:
+            break
+        if refreshes_per_team[update.team_id] >= limit_per_team:
+            continue
+        refreshes_per_team[update.team_id] += 1
+        prioritized.append(update)
+
+    _gauge_priority_classes(updates, prioritized)
+    return prioritized
+
+
+def _previous_durations(cache_keys: List[str]) -> Dict[str, float]:
+    if not cache_keys:
+        return {}
+    durations = get_client().mget([INSIGHT_CACHE_UPDATE_DURATION_REDIS_KEY.format(key) for key in cache_keys])
+    return {key: float(duration) for key, duration in zip(cache_keys, durations) if duration is not None}
+
+
+def _refreshes_in_flight_per_team(team_ids: Set[int]) -> Counter:
+    """
+    Counts the refreshes holding a lease per team. Unlike the `refreshing` flags of insights and tiles, leases expire
+    if their refresh never finishes, e.g. because its worker was killed.
+    """
+    team_ids_list = list(team_ids)
+    now = timezone.now().timestamp()
+    pipeline = get_client().pipeline(transaction=False)
+    for team_id in team_ids_list:
+        pipeline.zcount(INSIGHT_CACHE_UPDATE_IN_FLIGHT_REDIS_KEY.format(team_id), f"({now}", "+inf")
+    return Counter(dict(zip(team_ids_list, pipeline.execute())))
+
+
+def _start_refresh_lease(team_id: int, cache_key: str) -> None:
+    in_flight_key = INSIGHT_CACHE_UPDATE_IN_FLIGHT_REDIS_KEY.format(team_id)
+    now = timezone.now().timestamp()
+    pipeline = get_client().pipeline(transaction=False)
+    pipeline.zremrangebyscore(in_flight_key, "-inf", now)
+    pipeline.zadd(in_flight_key, {cache_key: now + REFRESH_LEASE_SECONDS})
+    pipeline.expire(in_flight_key, REFRESH_LEASE_SECONDS)
+    pipeline.execute()
+
+
+def _end_refresh_lease(team_id: int, cache_key: str) -> None:
+    get_client().zrem(INSIGHT_CACHE_UPDATE_IN_FLIGHT_REDIS_KEY.format(team_id), cache_key)
+
+
+def _gauge_priority_classes(updates: List[CacheUpdate], prioritized: List[CacheUpdate]) -> None:
+    for priority_class in PRIORITY_CLASS_WEIGHTS:
+        waiting = [update for update in updates if update.priority_class == priority_class]
+        tags = {"priority": priority_class}
+        statsd.gauge("update_cache_queue_depth_by_priority", len(waiting), tags=tags)
+        statsd.gauge(
+            "update_cache_queue_lag_by_priority",
+            round(max((update.staleness for update in waiting), default=0)),
+            tags=tags,
+        )
+        statsd.gauge(
+            "update_cache_queue_scheduled_by_priority",
+            len([update for update in prioritized if update.priority_class == priority_class]),
+            tags=tags,
+        )
+
+
 def gauge_cache_update_candidates(dashboard_tiles: QuerySet, shared_insights: QuerySet) -> None:
     statsd.gauge("update_cache_queue.never_refreshed", dashboard_tiles.filter(last_refresh=None).count())
     oldest_previously_refreshed_tiles: List[DashboardTile] = list(dashboard_tiles.exclude(last_refresh=None)[0:10])
@@ -181,6 +341,7 @@ def gauge_cache_update_candidates(dashboard_tiles: QuerySet, shared_insights: Qu
 
 
 @timed("update_cache_item_timer")
+@cohort_lookup_scope()
 def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> List[Dict[str, Any]]:
     dashboard_id = payload.get("dashboard_id", None)
     insight_id = payload.get("insight_id", "unknown")
@@ -194,11 +355,18 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> List[Di
     insights_queryset.update(refreshing=True)
     dashboard_tiles_queryset = DashboardTile.objects.filter(insight__team_id=team_id, filters_hash=key)
     dashboard_tiles_queryset.update(refreshing=True)
+    _start_refresh_lease(team_id, key)
 
     result = None
     try:
         if (dashboard_id and dashboard_tiles_queryset.exists()) or insights_queryset.exists():
+            start_time = time.monotonic()
             result = _update_cache_for_queryset(cache_type, filter, key, team)
+            get_client().set(
+                INSIGHT_CACHE_UPDATE_DURATION_REDIS_KEY.format(key),
+                time.monotonic() - start_time,
+                ex=settings.CACHED_RESULTS_TTL,
+            )
     except Exception as e:
         statsd.incr("update_cache_item_error", tags={"team": team.id})
         _mark_refresh_attempt_for(insights_queryset)
@@ -211,6 +379,8 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> List[Di
             capture_exception(e)
         logger.error("update_cache_item_error", exc=e, exc_info=True, team_id=team.id, cache_key=key)
         raise e
+    finally:
+        _end_refresh_lease(team_id, key)
 
     if result:
         statsd.incr("update_cache_item_success", tags={"team": team.id})
@@ -260,9 +430,11 @@ def _update_cache_for_queryset(
 ) -> Optional[List[Dict[str, Any]]]:
 
     if cache_type == CacheType.FUNNEL:
-        result = _calculate_funnel(filter, key, team)
+        result = calculate_incrementally(key, filter, team, lambda filter: _calculate_funnel(filter, key, team))
     else:
-        result = _calculate_by_filter(filter, key, team, cache_type)
+        result = calculate_incrementally(
+            key, filter, team, lambda filter: _calculate_by_filter(filter, key, team, cache_type)
+        )
 
     cache.set(key, {"result": result, "type": cache_type, "last_refresh": timezone.now()}, settings.CACHED_RESULTS_TTL)
 
@@ -282,6 +454,96 @@ def synchronously_update_insight_cache(insight: Insight, dashboard: Optional[Das
     return result
 
 
+def update_dashboard_insight_caches(dashboard: Dashboard, insights: List[Insight]) -> Set[int]:
+    """
+    Updates the cache of the insights on the dashboard in parallel, waiting up to DASHBOARD_REFRESH_TIMEOUT_SECONDS
+    for them, so that refreshing a dashboard takes as long as its slowest insight rather than all of them together.
+    Insights already being updated for the dashboard, e.g. by an earlier refresh, are waited for rather than updated
+    again.
+
+    Returns the ids of the insights that are still being updated, which carry on in the background. Updates that
+    haven't started by then are cancelled. Errors of the insights updated in time are raised, same as when refreshing
+    them one by one.
+    """
+    if settings.DASHBOARD_REFRESH_THREADS <= 0:
+        for insight in insights:
+            synchronously_update_insight_cache(insight, dashboard)
+        return set()
+
+    futures = {_submit_dashboard_insight_cache_update(insight, dashboard): insight.pk for insight in insights}
+    done, not_done = wait(futures, timeout=settings.DASHBOARD_REFRESH_TIMEOUT_SECONDS)
+    if not_done:
+        statsd.incr("update_dashboard_insight_caches_timed_out", count=len(not_done), tags={"dashboard": dashboard.pk})
+        for future in not_done:
+            # Nobody is waiting for these anymore, so they're only worth running if they already started
+            if not future.cancel():
+                future.add_done_callback(partial(_report_dashboard_insight_cache_error, futures[future]))
+    for future in done:
+        if not future.cancelled():
+            future.result()
+    return {futures[future] for future in not_done if not future.cancelled()}
+
+
+# Updates submitted to the pool and not done yet, by insight and dashboard ids
+_dashboard_insight_cache_updates: Dict[Tuple[int, int], "Future[None]"] = {}
+_dashboard_insight_cache_updates_lock = threading.RLock()
+
+
+def _submit_dashboard_insight_cache_update(insight: Insight, dashboard: Dashboard) -> "Future[None]":
+    key = (insight.pk, dashboard.pk)
+    with _dashboard_insight_cache_updates_lock:
+        future = _dashboard_insight_cache_updates.get(key)
+        if future is None or future.done():
+            future = _get_dashboard_refresh_pool().submit(_update_dashboard_insight_cache_in_pool, insight, dashboard)
+            _dashboard_insight_cache_updates[key] = future
+            future.add_done_callback(partial(_forget_dashboard_insight_cache_update, key))
+        return future
+
+
+def _forget_dashboard_insight_cache_update(key: Tuple[int, int], future: "Future[None]") -> None:
+    with _dashboard_insight_cache_updates_lock:
+        if _dashboard_insight_cache_updates.get(key) is future:
+            del _dashboard_insight_cache_updates[key]
+
+
+_dashboard_refresh_pool: Optional[ThreadPoolExecutor] = None
+_dashboard_refresh_pool_size = 0
+_dashboard_refresh_pool_lock = threading.Lock()
+
+
+def _get_dashboard_refresh_pool() -> ThreadPoolExecutor:
+    "Shared by all requests, so that the number of insights refreshed at once is bounded per process"
+    global _dashboard_refresh_pool, _dashboard_refresh_pool_size
+
+    with _dashboard_refresh_pool_lock:
+        if _dashboard_refresh_pool is None or _dashboard_refresh_pool_size != settings.DASHBOARD_REFRESH_THREADS:
+            if _dashboard_refresh_pool is not None:
+                # DASHBOARD_REFRESH_THREADS changed, the insights already submitted still finish
+                _dashboard_refresh_pool.shutdown(wait=False)
+            _dashboard_refresh_pool_size = settings.DASHBOARD_REFRESH_THREADS
+            _dashboard_refresh_pool = ThreadPoolExecutor(
+                max_workers=_dashboard_refresh_pool_size, thread_name_prefix="dashboard-refresh"
+            )
+        return _dashboard_refresh_pool
+
+
+def _update_dashboard_insight_cache_in_pool(insight: Insight, dashboard: Dashboard) -> None:
+    try:
+        synchronously_update_insight_cache(insight, dashboard)
+    finally:
+        # Django only closes the connections of request threads
+        connection.close()
+
+
+def _report_dashboard_insight_cache_error(insight_id: int, future: "Future[None]") -> None:
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error("update_dashboard_insight_cache_error", exc=error, exc_info=error, insight_id=insight_id)
+        capture_exception(error)
+
+
 def update_filters_hash(cache_key: str, dashboard: Optional[Dashboard], insight: Insight) -> None:
     """ check if the cache key has changed, usually because of a new default filter
     # there are three possibilities
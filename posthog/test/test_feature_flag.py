@@ -1,6 +1,7 @@
 from typing import cast
 
 from django.db import connection
+from django.test import override_settings
 
 from posthog.models import Cohort, FeatureFlag, GroupTypeMapping, Person
 from posthog.models.feature_flag import (
@@ -8,7 +9,10 @@ from posthog.models.feature_flag import (
     FeatureFlagMatch,
     FeatureFlagMatcher,
     FlagsMatcherCache,
+    flag_set_cache,
     get_active_feature_flags,
+    get_active_feature_flags_for_distinct_ids,
+    get_compiled_flag_set,
     hash_key_overrides,
     set_feature_flag_hash_key_overrides,
 )
@@ -623,6 +627,95 @@ class TestFeatureFlagHashKeyOverrides(BaseTest, QueryMatchingTest):
         flags = get_active_feature_flags(self.team.pk, "other_id", {}, "example_id")
         self.assertEqual(flags, {"beta-feature": True, "multivariate-flag": "first-variant", "default-flag": True,})
 
+    def test_batch_flags_match_single_distinct_id_flags(self):
+        set_feature_flag_hash_key_overrides(
+            FeatureFlag.objects.filter(team_id=self.team.pk),
+            team_id=self.team.pk,
+            person_id=self.person.id,
+            hash_key_override="other_id",
+        )
+        distinct_ids = ["example_id", "other_id", "unknown_id"]
+
+        with self.assertNumQueries(4):
+            batch_flags = get_active_feature_flags_for_distinct_ids(self.team.pk, distinct_ids)
+
+        self.assertEqual(
+            batch_flags,
+            {distinct_id: get_active_feature_flags(self.team.pk, distinct_id) for distinct_id in distinct_ids},
+        )
+
+
+@override_settings(DECIDE_FLAG_SET_CACHE_ENABLED=True)
+class TestCompiledFlagSetCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        flag_set_cache.clear()
+
+    def test_flag_set_is_reused_between_calls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_feature_flag(filters={"groups": [{"rollout_percentage": 100}]})
+
+        with self.assertNumQueries(1):
+            first = get_compiled_flag_set(self.team.pk)
+        with self.assertNumQueries(0):
+            second = get_compiled_flag_set(self.team.pk)
+
+        self.assertIs(first, second)
+        self.assertEqual([flag.key for flag in second.feature_flags], ["beta-feature"])
+
+    def test_saving_a_flag_invalidates_the_flag_set(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            feature_flag = self.create_feature_flag(filters={"groups": [{"rollout_percentage": 100}]})
+        self.assertEqual(get_active_feature_flags(self.team.pk, "example_id"), {"beta-feature": True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feature_flag.filters = {"groups": [{"rollout_percentage": 0}]}
+            feature_flag.save()
+        self.assertEqual(get_active_feature_flags(self.team.pk, "example_id"), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feature_flag.delete()
+        self.assertEqual(get_compiled_flag_set(self.team.pk).feature_flags, ())
+
+    def test_compiled_conditions_match_like_raw_flags(self):
+        Person.objects.create(team=self.team, distinct_ids=["test_id"], properties={"email": "test@posthog.com"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_feature_flag(
+                filters={
+                    "groups": [
+                        {
+                            "properties": [
+                                {"key": "email", "type": "person", "value": "test@posthog.com", "operator": "exact"}
+                            ],
+                            "rollout_percentage": 100,
+                        }
+                    ],
+                    "multivariate": {
+                        "variants": [
+                            {"key": "first-variant", "name": "First Variant", "rollout_percentage": 50},
+                            {"key": "second-variant", "name": "Second Variant", "rollout_percentage": 50},
+                        ],
+                    },
+                }
+            )
+
+        flag_set = get_compiled_flag_set(self.team.pk)
+        feature_flag = flag_set.feature_flags[0]
+        compiled_match = FeatureFlagMatcher(
+            list(flag_set.feature_flags), "test_id", compiled_flags=flag_set.compiled_flags
+        ).get_match(feature_flag)
+
+        self.assertEqual(compiled_match, FeatureFlagMatcher([feature_flag], "test_id").get_match(feature_flag))
+        self.assertIsNotNone(compiled_match)
+        self.assertIsNone(
+            FeatureFlagMatcher(
+                list(flag_set.feature_flags), "another_id", compiled_flags=flag_set.compiled_flags
+            ).get_match(feature_flag)
+        )
+
+    def create_feature_flag(self, key="beta-feature", **kwargs):
+        return FeatureFlag.objects.create(team=self.team, name="Beta feature", key=key, created_by=self.user, **kwargs)
+
 
 class TestFeatureFlagMatcherConsistency(BaseTest):
     # These tests are common between all libraries doing local evaluation of feature flags.
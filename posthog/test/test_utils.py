@@ -1,3 +1,6 @@
+import base64
+import gzip
+import json
 from unittest.mock import call, patch
 
 from django.core.handlers.wsgi import WSGIRequest
@@ -13,6 +16,7 @@ from posthog.models import EventDefinition
 from posthog.settings.utils import get_from_env
 from posthog.test.base import BaseTest
 from posthog.utils import (
+    decompress,
     format_query_params_absolute_url,
     get_available_timezones_with_offsets,
     get_default_event_name,
@@ -223,23 +227,55 @@ class TestLoadDataFromRequest(TestCase):
             str(ctx.exception),
         )
 
-    @patch("posthog.utils.gzip")
-    def test_can_decompress_gzipped_body_received_with_no_compression_flag(self, patched_gzip):
+    def test_can_decompress_gzipped_body_received_with_no_compression_flag(self):
         # see https://sentry.io/organizations/posthog2/issues/3136510367
         # one organization is causing a request parsing error by sending an encoded body
         # but the empty string for the compression value
         # this accounts for a large majority of our Sentry errors
 
-        patched_gzip.decompress.return_value = '{"what is it": "the decompressed value"}'
-
         rf = RequestFactory()
         # a request with no compression set
-        post_request = rf.post("/s/", "the gzip compressed string", "text/plain")
+        post_request = rf.post("/s/", gzip.compress(b'{"what is it": "the decompressed value"}'), "text/plain")
 
         data = load_data_from_request(post_request)
         self.assertEqual({"what is it": "the decompressed value"}, data)
 
 
+class TestDecompress(TestCase):
+    payload = {"event": "$pageview", "properties": {"distinct_id": 123, "text": "💻 Writing code", "$set": {}}}
+
+    def test_decodes_every_encoding(self):
+        raw = json.dumps(self.payload).encode()
+
+        self.assertEqual(decompress(raw, ""), self.payload)
+        self.assertEqual(decompress(b"  \n" + raw, ""), self.payload)
+        self.assertEqual(decompress(base64.b64encode(raw).decode(), ""), self.payload)
+        self.assertEqual(decompress(gzip.compress(raw), "gzip-js"), self.payload)
+        self.assertEqual(decompress(gzip.compress(base64.b64encode(raw)), "gzip"), self.payload)
+        self.assertEqual(decompress(b"123", ""), 123)
+
+    def test_combines_separately_encoded_surrogates_in_base64(self):
+        # Like posthog-js, encode the surrogate pair of the emoji as two separate UTF-8 sequences
+        encoded = '{"text": "\ud83d\udcbb Writing code"}'.encode("utf8", "surrogatepass")
+
+        self.assertEqual(decompress(base64.b64encode(encoded), ""), {"text": "💻 Writing code"})
+
+    def test_decodes_the_same_with_and_without_orjson(self):
+        payloads = [
+            b'{"value": NaN, "other": Infinity}',
+            b'{"distinct_id": 123456789012345678901234567890}',
+            json.dumps(self.payload).encode(),
+        ]
+
+        for payload in payloads:
+            with patch("posthog.utils.orjson", None):
+                expected = decompress(payload, "")
+            self.assertEqual(decompress(payload, ""), expected)
+
+        self.assertEqual(decompress(payloads[0], ""), {"value": None, "other": None})
+        self.assertEqual(decompress(payloads[1], ""), {"distinct_id": 123456789012345678901234567890})
+
+
 class TestShouldRefresh(TestCase):
     def test_should_refresh_with_refresh_true(self):
         request = HttpRequest()
@@ -18,6 +18,7 @@ from typing import (
     Any,
     Dict,
     Generator,
+    Iterable,
     List,
     Mapping,
     Optional,
@@ -47,6 +48,12 @@ from posthog.constants import AvailableFeature
 from posthog.exceptions import RequestParsingError
 from posthog.redis import get_client
 
+try:
+    # Optional, speeds up parsing capture payloads
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 if TYPE_CHECKING:
     from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
 
@@ -453,11 +460,26 @@ def base64_decode(data):
     return data.decode("utf8", "surrogatepass").encode("utf-16", "surrogatepass")
 
 
+GZIP_MAGIC = b"\x1f\x8b"
+# Characters JSON payloads can start with that base64 can't, so they are parsed without trying to decode base64 first.
+# Anything outside of ASCII (e.g. a BOM) can't be base64 either.
+JSON_START_CHARACTERS = frozenset('{["')
+SURROGATES = re.compile("[\ud800-\udfff]")
+LONG_DIGIT_RUN = re.compile(r"\d{19}")
+LONG_DIGIT_RUN_BYTES = re.compile(rb"\d{19}")
+
+
 def decompress(data: Any, compression: str):
+    """
+    Decodes a payload sent by a client library into JSON.
+
+    Rather than trying each encoding in turn, the payload is sniffed to pick the decoding: gzip by its magic bytes,
+    JSON by its first character, and otherwise base64 (falling back to JSON when that doesn't decode).
+    """
     if not data:
         return None
 
-    if compression == "gzip" or compression == "gzip-js":
+    if compression == "gzip" or compression == "gzip-js" or (compression == "" and _is_gzipped(data)):
         if data == b"undefined":
             raise RequestParsingError(
                 "data being loaded from the request body for decompression is the literal string 'undefined'"
@@ -480,32 +502,62 @@ def decompress(data: Any, compression: str):
 
         data = data.encode("utf-16", "surrogatepass").decode("utf-16")
 
-    base64_decoded = None
+    if not _looks_like_json(data):
+        base64_decoded = _base64_decode_to_str(data)
+        if base64_decoded:
+            try:
+                return _json_loads(base64_decoded)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # Happened to be valid base64, e.g. a short plain string
+                pass
+
     try:
-        base64_decoded = base64_decode(data)
-    except Exception:
-        pass
+        # TODO: data can also be an array, function assumes it's either None or a dictionary.
+        return _json_loads(data)
+    except (json.JSONDecodeError, UnicodeDecodeError) as error:
+        raise RequestParsingError("Invalid JSON: %s" % (str(error)))
+
+
+def _is_gzipped(data: Any) -> bool:
+    return isinstance(data, bytes) and data[:2] == GZIP_MAGIC
+
+
+def _looks_like_json(data: Any) -> bool:
+    start = data[:64].lstrip() or data.lstrip()
+    if not start:
+        return False
+    first = chr(start[0]) if isinstance(start, bytes) else start[0]
+    return first in JSON_START_CHARACTERS or not first.isascii()
 
-    if base64_decoded:
-        data = base64_decoded
 
+def _base64_decode_to_str(data: Any) -> Optional[str]:
+    "Like `base64_decode`, but skips the UTF-16 round-trip when there are no surrogates to combine into pairs"
     try:
-        # parse_constant gets called in case of NaN, Infinity etc
-        # default behaviour is to put those into the DB directly
-        # but we just want it to return None
-        data = json.loads(data, parse_constant=lambda x: None)
-    except (json.JSONDecodeError, UnicodeDecodeError) as error_main:
-        if compression == "":
-            try:
-                return decompress(data, "gzip")
-            except Exception as inner:
-                # re-trying with compression set didn't succeed, throw original error
-                raise RequestParsingError("Invalid JSON: %s" % (str(error_main))) from inner
-        else:
-            raise RequestParsingError("Invalid JSON: %s" % (str(error_main)))
+        if not isinstance(data, str):
+            data = data.decode()
+        decoded = base64.b64decode(data.replace(" ", "+") + "===").decode("utf8", "surrogatepass")
+    except Exception:
+        return None
+
+    if SURROGATES.search(decoded):
+        # Clients encode characters outside the BMP as separately encoded surrogates, this combines them again
+        decoded = decoded.encode("utf-16", "surrogatepass").decode("utf-16", "surrogatepass")
+    return decoded
 
-    # TODO: data can also be an array, function assumes it's either None or a dictionary.
-    return data
+
+def _json_loads(data: Union[str, bytes]) -> Any:
+    # orjson parses integers that don't fit in 64 bits as floats, losing precision
+    if orjson is not None and not (LONG_DIGIT_RUN_BYTES if isinstance(data, bytes) else LONG_DIGIT_RUN).search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN, Infinity and lone surrogates, which the standard library handles
+            pass
+
+    # parse_constant gets called in case of NaN, Infinity etc
+    # default behaviour is to put those into the DB directly
+    # but we just want it to return None
+    return json.loads(data, parse_constant=lambda x: None)
 
 
 # Used by non-DRF endpoints from capture.py and decide.py (/decide, /batch, /capture, etc)
@@ -791,6 +843,16 @@ def get_safe_cache(cache_key: str):
     return None
 
 
+def get_safe_cache_many(cache_keys: Iterable[str]) -> Dict[str, Any]:
+    "Like `get_safe_cache` for many keys in one round-trip, keys without a cached value map to `None`"
+    cache_keys = list(cache_keys)
+    try:
+        cached_results = cache.get_many(cache_keys)
+    except Exception:  # one of them is probably corrupted, fall back to getting them one by one
+        cached_results = {cache_key: get_safe_cache(cache_key) for cache_key in cache_keys}
+    return {cache_key: cached_results.get(cache_key) for cache_key in cache_keys}
+
+
 def is_anonymous_id(distinct_id: str) -> bool:
     # Our anonymous ids are _not_ uuids, but a random collection of strings
     return bool(re.match(ANONYMOUS_REGEX, distinct_id))